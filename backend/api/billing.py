@@ -0,0 +1,33 @@
+from flask import Blueprint, request, jsonify, current_app
+from datetime import date
+from utils.shops import ShopAuthError, authenticated_shop
+from utils.usage import usage_day
+
+billing_bp = Blueprint('billing', __name__)
+
+def parse_day(value):
+    """YYYY-MM-DD query value, validated; None when absent"""
+    if not value:
+        return None
+    return date.fromisoformat(value).isoformat()
+
+@billing_bp.route('/api/billing/usage', methods=['GET'])
+def get_usage():
+    """Daily usage counters of a shop (documents, pages, model tokens, rejections) and their totals"""
+    try:
+        shop = authenticated_shop(
+            request.args,
+            request.headers.get('Authorization'),
+            current_app.config['SHOPIFY_SECRET'],
+            current_app.config['SHOPIFY_API_KEY']
+        )
+    except ShopAuthError as e:
+        return jsonify({'error': str(e)}), 401
+    try:
+        since = parse_day(request.args.get('since'))
+        until = parse_day(request.args.get('until'))
+    except ValueError:
+        return jsonify({'error': 'since and until must be YYYY-MM-DD dates'}), 400
+
+    report = current_app.extensions['usage'].report(shop, since, until)
+    return jsonify({'shop': shop, 'since': since, 'until': until or usage_day(), **report})
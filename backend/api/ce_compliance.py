@@ -1,78 +1,113 @@
 # 4. Create a new API endpoint for CE-specific features
 # Create: api/ce_compliance.py
 
-from flask import Blueprint, request, jsonify
-from utils.ce_analyzer import CEAnalyzer
+from flask import Blueprint, request, jsonify, current_app
+import hashlib
+import json
+from functools import lru_cache
+from utils.ce_registry import (
+    CHECKLIST_ITEM_DOCUMENT_TYPES, CHECKLISTS, DIRECTIVE_CATEGORIES, DIRECTIVE_MAPPING, DOCUMENT_TYPES,
+    PRODUCT_CATEGORIES, REGISTRY_VERSION
+)
+from utils.consistency import check_consistency
+from utils.shops import is_valid_shopify_shop
 
 ce_bp = Blueprint('ce_compliance', __name__)
 
+# Reference data only changes with a deploy
+METADATA_MAX_AGE = 3600
+
+@lru_cache(maxsize=256)
+def _encode(kind, key=None):
+    """
+    Serialized body and ETag of one metadata payload, built once per process. The
+    ETag is the registry version plus the payload's identity, so every cached copy
+    is invalidated together when the reference data changes.
+    """
+    if kind == 'document_types':
+        payload = dict(DOCUMENT_TYPES)
+    elif kind == 'product_categories':
+        payload = dict(PRODUCT_CATEGORIES)
+    elif kind == 'directives':
+        payload = {'directives': {directive: list(categories) for directive, categories in DIRECTIVE_CATEGORIES.items()}}
+    elif kind == 'checklist_items':
+        payload = {'checklist_items': {item: list(types) for item, types in CHECKLIST_ITEM_DOCUMENT_TYPES.items()}}
+    elif kind == 'category_directives':
+        payload = {
+            'product_category': key,
+            'applicable_directives': list(DIRECTIVE_MAPPING.get(key, ()))
+        }
+    else:
+        payload = {
+            'document_type': key,
+            'checklist_items': list(CHECKLISTS.get(key, ()))
+        }
+    body = json.dumps(payload)
+    identity = hashlib.sha256(json.dumps([kind, key]).encode('utf-8')).hexdigest()[:16]
+    return body, f'{REGISTRY_VERSION}-{identity}'
+
+def metadata_response(kind, key=None):
+    """JSON response with ETag/Cache-Control; answers 304 when the client copy is current"""
+    body, etag = _encode(kind, key)
+    response = current_app.response_class(body, mimetype='application/json')
+    response.set_etag(etag)
+    response.headers['Cache-Control'] = f'public, max-age={METADATA_MAX_AGE}'
+    return response.make_conditional(request)
+
 @ce_bp.route('/api/ce/document-types', methods=['GET'])
 def get_document_types():
     """Get available CE document types"""
-    document_types = {
-        'technical_file': 'Technical File',
-        'declaration_of_conformity': 'Declaration of Conformity',
-        'test_reports': 'Test Reports & Certificates',
-        'risk_assessment': 'Risk Assessment',
-        'user_manual': 'User Manual'
-    }
-    return jsonify(document_types)
+    return metadata_response('document_types')
 
 @ce_bp.route('/api/ce/product-categories', methods=['GET'])
 def get_product_categories():
     """Get available product categories"""
-    categories = {
-        'electronics': 'Electronics & Electrical',
-        'machinery': 'Machinery & Equipment',
-        'toys': 'Toys & Children Products',
-        'medical_devices': 'Medical Devices',
-        'radio_equipment': 'Radio & Telecom Equipment',
-        'ppe': 'Personal Protective Equipment',
-        'cosmetics': 'Cosmetics & Beauty Products'
-    }
-    return jsonify(categories)
+    return metadata_response('product_categories')
+
+@ce_bp.route('/api/ce/directives', methods=['GET'])
+def get_directives():
+    """Get every known directive with the product categories it applies to"""
+    return metadata_response('directives')
 
 @ce_bp.route('/api/ce/directives/<product_category>', methods=['GET'])
 def get_applicable_directives(product_category):
     """Get applicable EU directives for a product category"""
-    analyzer = CEAnalyzer()
-    directives = analyzer.directive_mapping.get(product_category, [])
-    return jsonify({
-        'product_category': product_category,
-        'applicable_directives': directives
-    })
+    return metadata_response('category_directives', product_category)
+
+@ce_bp.route('/api/ce/checklist-items', methods=['GET'])
+def get_checklist_items():
+    """Get every checklist item with the document types expected to cover it"""
+    return metadata_response('checklist_items')
 
 @ce_bp.route('/api/ce/compliance-checklist/<document_type>', methods=['GET'])
 def get_compliance_checklist(document_type):
     """Get compliance checklist for document type"""
-    checklists = {
-        'technical_file': [
-            'Manufacturer identification and address',
-            'Product description and intended use',
-            'Design drawings and specifications',
-            'Applicable EU directives listed',
-            'Essential requirements analysis',
-            'Risk assessment documentation',
-            'Test reports from accredited bodies',
-            'Declaration of Conformity reference',
-            'User instructions included'
-        ],
-        'declaration_of_conformity': [
-            'Manufacturer name and address',
-            'Product identification details',
-            'Sole responsibility statement',
-            'Applicable EU legislation cited',
-            'Essential requirements compliance',
-            'Conformity assessment procedures',
-            'Notified body details (if required)',
-            'Place and date of issue',
-            'Authorized signature present'
-        ]
-        # Add more checklists as needed
-    }
-    
-    checklist = checklists.get(document_type, [])
-    return jsonify({
-        'document_type': document_type,
-        'checklist_items': checklist
-    })
+    return metadata_response('checklist', document_type)
+
+@ce_bp.route('/api/ce/consistency', methods=['POST'])
+def check_technical_file_consistency():
+    """Cross-check stored analyses of one product's documents, given as {"file_ids": [...], "product_category": ...}"""
+    shop = request.args.get('shop', '')
+    if shop and not is_valid_shopify_shop(shop):
+        return jsonify({'error': 'Invalid shop'}), 400
+    body = request.get_json(silent=True) or {}
+    file_ids = body.get('file_ids') or []
+    if not isinstance(file_ids, list) or len(file_ids) < 2:
+        return jsonify({'error': 'file_ids must list at least two analyzed documents'}), 400
+    max_files = current_app.config['BATCH_MAX_FILES']
+    if len(file_ids) > max_files:
+        return jsonify({'error': f'At most {max_files} documents per check'}), 400
+
+    results_store = current_app.extensions['results_store']
+    documents, missing = [], []
+    for file_id in file_ids:
+        report = results_store.get(str(file_id), shop)
+        if report is None:
+            missing.append(file_id)
+        else:
+            documents.append(report)
+    if missing:
+        return jsonify({'error': 'Reports not found', 'file_ids': missing}), 404
+
+    product_category = body.get('product_category') or documents[0].get('product_category')
+    return jsonify({'product_category': product_category, **check_consistency(documents, product_category)})
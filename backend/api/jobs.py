@@ -0,0 +1,42 @@
+from flask import Blueprint, jsonify, current_app
+from utils.job_queue import QUEUED, RUNNING, SUCCEEDED, FAILED
+
+jobs_bp = Blueprint('jobs', __name__)
+
+def job_status(job):
+    return {
+        'job_id': job['id'],
+        'kind': job['kind'],
+        'status': job['status'],
+        'attempts': job['attempts'],
+        'created_at': job['created_at'],
+        'started_at': job['started_at'],
+        'finished_at': job['finished_at'],
+        'error': job['error']
+    }
+
+@jobs_bp.route('/api/jobs/<job_id>', methods=['GET'])
+def get_job(job_id):
+    """Get the status of an analysis job"""
+    job = current_app.extensions['job_queue'].get(job_id)
+    if job is None:
+        return jsonify({'error': 'Job not found'}), 404
+    return jsonify(job_status(job))
+
+@jobs_bp.route('/api/jobs/<job_id>/result', methods=['GET'])
+def get_job_result(job_id):
+    """Get the result of a finished analysis job"""
+    job = current_app.extensions['job_queue'].get(job_id)
+    if job is None:
+        return jsonify({'error': 'Job not found'}), 404
+
+    if job['status'] in (QUEUED, RUNNING):
+        response = jsonify(job_status(job))
+        response.headers['Retry-After'] = '2'
+        return response, 202
+    if job['status'] == FAILED:
+        return jsonify({**job_status(job), 'error': job['error']}), 500
+    if job['status'] == SUCCEEDED:
+        return jsonify(job['result'])
+
+    return jsonify({'error': f"Unknown job status '{job['status']}'"}), 500
@@ -0,0 +1,24 @@
+from flask import Blueprint, jsonify, current_app, request, send_file
+
+profiles_bp = Blueprint('profiles', __name__)
+
+def is_admin_request():
+    return current_app.extensions['profiler'].is_admin(request.headers.get('X-Admin-Token'))
+
+@profiles_bp.route('/api/admin/profiles', methods=['GET'])
+def list_profiles():
+    """List captured request profiles, newest first"""
+    if not is_admin_request():
+        return jsonify({'error': 'Forbidden'}), 403
+    profiles = current_app.extensions['profiler'].list()
+    return jsonify({'profiles': profiles, 'count': len(profiles)})
+
+@profiles_bp.route('/api/admin/profiles/<name>', methods=['GET'])
+def download_profile(name):
+    """Download one profile in pstats format (open with snakeviz or python -m pstats)"""
+    if not is_admin_request():
+        return jsonify({'error': 'Forbidden'}), 403
+    path = current_app.extensions['profiler'].path_for(name)
+    if path is None:
+        return jsonify({'error': 'Profile not found'}), 404
+    return send_file(path, mimetype='application/octet-stream', as_attachment=True, download_name=f'{name}.prof')
@@ -0,0 +1,123 @@
+from flask import Blueprint, Response, request, jsonify, current_app, stream_with_context
+import csv
+import io
+import json
+from datetime import datetime, timezone
+from utils.shops import ShopAuthError, authenticated_shop
+
+report_bp = Blueprint('report', __name__)
+
+CSV_COLUMNS = [
+    'file_id', 'filename', 'document_type', 'product_category', 'risk_level',
+    'confidence_score', 'compliance_gaps', 'summary', 'created_at'
+]
+
+def report_shop():
+    """Shop the caller is verified for, by session token or signed query; ShopAuthError otherwise"""
+    return authenticated_shop(
+        request.args,
+        request.headers.get('Authorization'),
+        current_app.config['SHOPIFY_SECRET'],
+        current_app.config['SHOPIFY_API_KEY']
+    )
+
+def parse_time(value):
+    """Epoch seconds from an ISO date/datetime query value (UTC unless an offset is given)"""
+    if not value:
+        return None
+    parsed = datetime.fromisoformat(value)
+    if parsed.tzinfo is None:
+        parsed = parsed.replace(tzinfo=timezone.utc)
+    return parsed.timestamp()
+
+def report_filters():
+    return {
+        'document_type': request.args.get('document_type'),
+        'risk_level': (request.args.get('risk_level') or '').upper() or None,
+        'since': parse_time(request.args.get('since')),
+        'until': parse_time(request.args.get('until'))
+    }
+
+@report_bp.route('/api/reports', methods=['GET'])
+def list_reports():
+    """Stored analysis summaries for a shop, newest first, one cursor page at a time"""
+    try:
+        shop = report_shop()
+    except ShopAuthError as e:
+        return jsonify({'error': str(e)}), 401
+    try:
+        filters = report_filters()
+        limit = min(max(1, int(request.args.get('limit', 50))), current_app.config['REPORTS_PAGE_MAX'])
+        reports, next_cursor = current_app.extensions['results_store'].query(
+            shop, cursor=request.args.get('cursor'), limit=limit, **filters
+        )
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+
+    return jsonify({'reports': reports, 'next_cursor': next_cursor})
+
+@report_bp.route('/api/reports/<file_id>', methods=['GET'])
+def get_report(file_id):
+    """The full stored analysis of one upload"""
+    try:
+        shop = report_shop()
+    except ShopAuthError as e:
+        return jsonify({'error': str(e)}), 401
+
+    report = current_app.extensions['results_store'].get(file_id, shop)
+    if report is None:
+        return jsonify({'error': 'Report not found'}), 404
+    return jsonify(report)
+
+def csv_row(report):
+    analysis = report.get('analysis', {})
+    return [
+        report.get('file_id'),
+        report.get('filename'),
+        report.get('document_type'),
+        report.get('product_category'),
+        analysis.get('risk_level'),
+        analysis.get('confidence_score'),
+        '; '.join(gap.get('issue', '') for gap in analysis.get('compliance_gaps', [])),
+        analysis.get('summary'),
+        datetime.fromtimestamp(report['created_at'], timezone.utc).isoformat()
+    ]
+
+@report_bp.route('/api/reports/export', methods=['GET'])
+def export_reports():
+    """Stream every matching stored result as NDJSON (default) or CSV"""
+    try:
+        shop = report_shop()
+    except ShopAuthError as e:
+        return jsonify({'error': str(e)}), 401
+    try:
+        filters = report_filters()
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+
+    export_format = request.args.get('format', 'ndjson').lower()
+    if export_format not in ('ndjson', 'csv'):
+        return jsonify({'error': "format must be 'ndjson' or 'csv'"}), 400
+    reports = current_app.extensions['results_store'].export(shop, **filters)
+
+    def generate_ndjson():
+        for report in reports:
+            yield json.dumps(report) + '\n'
+
+    def generate_csv():
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+        writer.writerow(CSV_COLUMNS)
+        for report in reports:
+            writer.writerow(csv_row(report))
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+        yield buffer.getvalue()
+
+    if export_format == 'csv':
+        response = Response(stream_with_context(generate_csv()), mimetype='text/csv')
+        response.headers['Content-Disposition'] = 'attachment; filename="reports.csv"'
+    else:
+        response = Response(stream_with_context(generate_ndjson()), mimetype='application/x-ndjson')
+    return response
@@ -1,70 +1,349 @@
 # 2. Now let's modify your existing upload.py to handle CE documents
 # Modify: api/upload.py
 
-from flask import Blueprint, request, jsonify
-import os
+from flask import Blueprint, Response, g, request, jsonify, current_app, stream_with_context
+import json
 import uuid
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from werkzeug.utils import secure_filename
-from utils.pdf_parser import PDFParser
-from utils.ce_analyzer import CEAnalyzer  # Import our new CE analyzer
+from utils.pipeline import (
+    UPLOAD_FOLDER, cache_key_for, cached_response, meter_usage, process_upload, record_result, stream_upload,
+    aggregate_product_risk
+)
+from utils.admission import Overloaded
+from utils.consistency import check_consistency
+from utils.job_queue import QueueFull
+from utils.metrics import UPLOAD_BYTES, begin_document, current_labels, propagate, set_labels, stage
+from utils.revisions import lineage_for
+from utils.shops import ShopAuthError, authenticated_shop
+from utils.upload_buffer import UploadBuffer
 
 upload_bp = Blueprint('upload', __name__)
 
-UPLOAD_FOLDER = 'temp_uploads'
 ALLOWED_EXTENSIONS = {'pdf'}
 
 def allowed_file(filename):
     return '.' in filename and filename.rsplit('.', 1)[1].lower() in ALLOWED_EXTENSIONS
 
+def read_upload(file):
+    """Buffer an uploaded file in memory, spooling to disk only above the size threshold"""
+    with stage('upload_receive'):
+        upload = UploadBuffer.from_stream(
+            file.stream,
+            current_app.config['UPLOAD_SPOOL_THRESHOLD'],
+            current_app.config['UPLOAD_SPOOL_DIR']
+        )
+    UPLOAD_BYTES.inc(upload.size, **current_labels())
+    if g.get('traffic') is not None:
+        current_app.extensions['traffic_recorder'].add_upload(g.traffic, file.filename, upload.sha256, upload.size)
+    return upload
+
+def upload_lineage(filename, shop):
+    """
+    Document family of an upload by the verified shop, from an explicit parent_file_id,
+    the supplier or the file name; None when there is none, so nothing is recorded
+    """
+    if not current_app.config['REVISIONS_ENABLED']:
+        return None
+    lineage = lineage_for(
+        filename,
+        supplier=request.form.get('supplier'),
+        parent_file_id=request.form.get('parent_file_id'),
+        shop=shop
+    )
+    return None if lineage.empty else lineage
+
+def upload_shop():
+    """
+    Shop the caller is verified for, by session token or signed query, as for reports and
+    billing. Unverified uploads are anonymous (None): a bare ?shop= names no shop to admit,
+    meter or record them under.
+    """
+    try:
+        return authenticated_shop(
+            request.args,
+            request.headers.get('Authorization'),
+            current_app.config['SHOPIFY_SECRET'],
+            current_app.config['SHOPIFY_API_KEY']
+        )
+    except ShopAuthError:
+        return None
+
+def too_many_requests(message, retry_after):
+    response = jsonify({'error': message, 'retry_after': retry_after})
+    response.headers['Retry-After'] = str(retry_after)
+    return response, 429
+
+def wants_async():
+    flag = request.args.get('async', request.form.get('async'))
+    if flag is None:
+        return current_app.config['UPLOAD_ASYNC_DEFAULT']
+    return flag.lower() in ('1', 'true', 'yes')
+
 @upload_bp.route('/api/upload', methods=['POST'])
 def upload_file():
     try:
         if 'file' not in request.files:
             return jsonify({'error': 'No file provided'}), 400
-        
+
         file = request.files['file']
         document_type = request.form.get('document_type', 'general')  # New parameter
         product_category = request.form.get('product_category', None)  # New parameter
-        
+
         if file.filename == '':
             return jsonify({'error': 'No file selected'}), 400
-        
+
+        shop = upload_shop()
+
         if file and allowed_file(file.filename):
-            # Generate unique filename
-            file_id = str(uuid.uuid4())
-            filename = f"{file_id}.pdf"
-            filepath = os.path.join(UPLOAD_FOLDER, filename)
-            
-            # Save file
-            file.save(filepath)
-            
-            # Parse PDF
-            pdf_parser = PDFParser()
-            text_content = pdf_parser.extract_text(filepath)
-            
-            # Analyze with CE-specific analyzer
-            if document_type in ['technical_file', 'declaration_of_conformity', 'test_reports', 'risk_assessment', 'user_manual']:
-                ce_analyzer = CEAnalyzer()
-                analysis_result = ce_analyzer.analyze_ce_document(
-                    text_content, 
-                    document_type, 
-                    product_category
-                )
-            else:
-                # Fallback to your original analyzer for non-CE documents
-                from utils.gpt_analyzer import GPTAnalyzer
-                analyzer = GPTAnalyzer()
-                analysis_result = analyzer.analyze(text_content)  # Your original method
-            
-            return jsonify({
+            original_filename = secure_filename(file.filename)
+            cache = current_app.extensions['analysis_cache']
+            admission = current_app.extensions['admission']
+            usage = current_app.extensions['usage']
+            queue = current_app.extensions['job_queue']
+            lineage = upload_lineage(original_filename, shop)
+            set_labels(document_type, product_category)
+
+            # Decided before any extraction or model work is spent on the upload
+            run_async = wants_async()
+            decision = admission.admit(shop, queue_depth=queue.pending() if run_async else None, inline=not run_async)
+            if not decision.allowed:
+                return too_many_requests(decision.reason, decision.retry_after)
+
+            with read_upload(file) as upload:
+                if not run_async:
+                    # Parse and analyze inline, straight from the request buffer
+                    try:
+                        with admission.scheduler.slot(shop, timeout=admission.slot_timeout):
+                            response = process_upload(
+                                upload, original_filename, document_type, product_category, cache=cache,
+                                lineage=lineage, revisions=current_app.extensions['revision_store'],
+                                near_duplicates=current_app.extensions['near_duplicates'], shop=shop
+                            )
+                    except Overloaded as e:
+                        decision = admission.reject(shop, e.retry_after, str(e))
+                        return too_many_requests(decision.reason, decision.retry_after)
+                    record_result(current_app.extensions['results_store'], shop, response)
+                    meter_usage(usage, shop, response, upload.size)
+                    return jsonify(response), 200
+
+                # Identical uploads are served from the content-addressed cache
+                cache_key = cache_key_for(upload.sha256, document_type, product_category)
+                cached = cache.get(cache_key)
+                if cached is not None:
+                    response = cached_response(cached, original_filename)
+                    record_result(current_app.extensions['results_store'], shop, response)
+                    meter_usage(usage, shop, response, upload.size)
+                    return jsonify(response), 200
+
+                # Job mode: the worker needs the file on disk
+                file_id = str(uuid.uuid4())
+                with stage('save'):
+                    filepath = upload.persist(UPLOAD_FOLDER, f"{file_id}.pdf")
+                try:
+                    job_id = queue.enqueue('analyze_upload', {
+                        'file_id': file_id,
+                        'filepath': filepath,
+                        'filename': original_filename,
+                        'document_type': document_type,
+                        'product_category': product_category,
+                        'cache_key': cache_key,
+                        'lineage_key': lineage.key if lineage else None,
+                        'parent_file_id': lineage.parent_file_id if lineage else None,
+                        'shop': shop,
+                        'size': upload.size,
+                        'sha256': upload.sha256
+                    }, shop=shop, weight=admission.weight(shop))
+                except QueueFull:
+                    decision = admission.reject(shop, admission.retry_after, 'Analysis queue is full, try again later')
+                    return too_many_requests(decision.reason, decision.retry_after)
+                upload.detach()
+
+            response = jsonify({
+                'job_id': job_id,
                 'file_id': file_id,
-                'filename': secure_filename(file.filename),
-                'analysis': analysis_result,
-                'document_type': document_type,
-                'product_category': product_category
-            }), 200
-            
+                'status': 'queued',
+                'status_url': f'/api/jobs/{job_id}',
+                'result_url': f'/api/jobs/{job_id}/result'
+            })
+            response.headers['Location'] = f'/api/jobs/{job_id}'
+            return response, 202
+
         return jsonify({'error': 'Invalid file type'}), 400
-        
+
     except Exception as e:
-        return jsonify({'error': str(e)}), 500
\ No newline at end of file
+        return jsonify({'error': str(e)}), 500
+
+
+@upload_bp.route('/api/upload/batch', methods=['POST'])
+def upload_batch():
+    """
+    Analyze every document of a technical file concurrently. Each file may carry its
+    own document type via a parallel `document_types` list. Results stream back as
+    NDJSON lines as they finish, followed by a product-level summary line.
+    """
+    files = request.files.getlist('files')
+    if not files:
+        return jsonify({'error': 'No files provided'}), 400
+
+    default_type = request.form.get('document_type', 'general')
+    document_types = request.form.getlist('document_types')
+    product_category = request.form.get('product_category', None)
+    max_files = current_app.config['BATCH_MAX_FILES']
+    if len(files) > max_files:
+        return jsonify({'error': f'At most {max_files} files per batch'}), 400
+
+    shop = upload_shop()
+    admission = current_app.extensions['admission']
+    decision = admission.admit(shop, cost=len(files), inline=True)
+    if not decision.allowed:
+        return too_many_requests(decision.reason, decision.retry_after)
+
+    # Read everything up front; the request stream is gone once the response starts
+    documents = []
+    for index, file in enumerate(files):
+        document_type = document_types[index] if index < len(document_types) else default_type
+        set_labels(document_type, product_category)
+        documents.append({
+            'index': index,
+            'filename': secure_filename(file.filename or ''),
+            'document_type': document_type,
+            'lineage': upload_lineage(secure_filename(file.filename or ''), shop),
+            'upload': read_upload(file) if allowed_file(file.filename or '') else None
+        })
+
+    cache = current_app.extensions['analysis_cache']
+    revisions = current_app.extensions['revision_store']
+    near_duplicates = current_app.extensions['near_duplicates']
+    results_store = current_app.extensions['results_store']
+    usage = current_app.extensions['usage']
+    concurrency = current_app.config['BATCH_CONCURRENCY']
+
+    @propagate
+    def analyze(document):
+        # Own labels and usage per document; stage times still count towards the request
+        begin_document()
+        if document['upload'] is None:
+            return {'error': 'Invalid file type'}
+        # Process-wide cap on in-flight analyses, shared fairly between shops' batches
+        try:
+            with admission.scheduler.slot(shop, timeout=admission.slot_timeout):
+                response = process_upload(
+                    document['upload'], document['filename'], document['document_type'],
+                    product_category, cache=cache, lineage=document['lineage'], revisions=revisions,
+                    near_duplicates=near_duplicates, shop=shop
+                )
+        except Overloaded as e:
+            decision = admission.reject(shop, e.retry_after, str(e))
+            return {'error': decision.reason, 'retry_after': decision.retry_after}
+        record_result(results_store, shop, response)
+        meter_usage(usage, shop, response, document['upload'].size)
+        return response
+
+    def generate():
+        results = []
+        try:
+            with ThreadPoolExecutor(max_workers=max(1, min(concurrency, len(documents)))) as pool:
+                futures = {pool.submit(analyze, document): document for document in documents}
+                for future in as_completed(futures):
+                    document = futures[future]
+                    try:
+                        result = future.result()
+                    except Exception as e:
+                        result = {'error': str(e)}
+                    result = {
+                        'index': document['index'],
+                        'filename': document['filename'],
+                        'document_type': document['document_type'],
+                        **result
+                    }
+                    results.append(result)
+                    yield json.dumps({'event': 'document', **result}) + '\n'
+        finally:
+            for document in documents:
+                if document['upload'] is not None:
+                    document['upload'].close()
+
+        yield json.dumps({
+            'event': 'summary',
+            'product_category': product_category,
+            **aggregate_product_risk(results),
+            # Cross-checks model, manufacturer, standards and dates between the documents
+            'consistency': check_consistency(results, product_category)
+        }) + '\n'
+
+    return Response(stream_with_context(generate()), mimetype='application/x-ndjson')
+
+
+def sse_event(event, data):
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+
+@upload_bp.route('/api/upload/stream', methods=['POST'])
+def upload_stream():
+    """
+    Server-Sent Events variant of /api/upload: status updates, model tokens and
+    partial fields as they arrive, then a `result` event with the full analysis
+    """
+    if 'file' not in request.files:
+        return jsonify({'error': 'No file provided'}), 400
+
+    file = request.files['file']
+    document_type = request.form.get('document_type', 'general')
+    product_category = request.form.get('product_category', None)
+
+    if file.filename == '':
+        return jsonify({'error': 'No file selected'}), 400
+    if not allowed_file(file.filename):
+        return jsonify({'error': 'Invalid file type'}), 400
+
+    shop = upload_shop()
+    admission = current_app.extensions['admission']
+    decision = admission.admit(shop, inline=True)
+    if not decision.allowed:
+        return too_many_requests(decision.reason, decision.retry_after)
+
+    set_labels(document_type, product_category)
+    upload = read_upload(file)
+    filename = secure_filename(file.filename)
+    cache = current_app.extensions['analysis_cache']
+    lineage = upload_lineage(filename, shop)
+    revisions = current_app.extensions['revision_store']
+    near_duplicates = current_app.extensions['near_duplicates']
+    results_store = current_app.extensions['results_store']
+    usage = current_app.extensions['usage']
+
+    def generate():
+        # Flush something immediately so proxies and the browser see the first byte
+        yield sse_event('status', {'stage': 'received', 'filename': filename})
+        try:
+            with admission.scheduler.slot(shop, timeout=admission.slot_timeout):
+                for event, data in stream_upload(upload, filename, document_type, product_category, cache=cache,
+                                                 lineage=lineage, revisions=revisions,
+                                                 near_duplicates=near_duplicates, shop=shop):
+                    if event == 'result':
+                        record_result(results_store, shop, data)
+                        meter_usage(usage, shop, data, upload.size)
+                    yield sse_event(event, data)
+        except Overloaded as e:
+            decision = admission.reject(shop, e.retry_after, str(e))
+            yield sse_event('error', {'error': decision.reason, 'retry_after': decision.retry_after})
+        except Exception as e:
+            yield sse_event('error', {'error': str(e)})
+        finally:
+            upload.close()
+
+    response = Response(stream_with_context(generate()), mimetype='text/event-stream')
+    response.headers['Cache-Control'] = 'no-cache'
+    response.headers['X-Accel-Buffering'] = 'no'
+    return response
+
+
+@upload_bp.route('/api/cache/stats', methods=['GET'])
+def cache_stats():
+    """Hit/miss counters and size of the analysis result cache"""
+    stats = current_app.extensions['analysis_cache'].stats()
+    near_duplicates = current_app.extensions['near_duplicates']
+    if near_duplicates is not None:
+        stats['near_duplicates'] = near_duplicates.stats()
+    return jsonify(stats)
@@ -1,14 +1,163 @@
-from flask import Flask, request, jsonify
-from api.upload import upload_blueprint
+from flask import Flask, Request, Response, current_app, g, request, jsonify
+from api.upload import upload_bp
 from config import load_config
+from utils.admission import AdmissionController
+from utils.analysis_cache import AnalysisCache
+from utils.gpt_analyzer import LLMClient, set_llm_client
+from utils.job_queue import JobQueue, WorkerPool
+from utils.metrics import HTTP_REQUEST_SECONDS, REGISTRY, begin_request
+from utils.profiling import PROFILE_HEADER, RequestProfiler
+from utils.pipeline import UPLOAD_FOLDER, make_job_handlers
+from utils.near_duplicates import NearDuplicateIndex
+from utils.results_store import results_store_from_config
+from utils.revisions import RevisionStore
+from utils.traffic import RecordingTransport, TrafficRecorder, install_recorder
+from utils.upload_buffer import SpoolJanitor
+from utils.usage import UsageMeter
 from flask_cors import CORS
-import re
+import io
+import time
+from api.billing import billing_bp
 from api.ce_compliance import ce_bp
+from api.jobs import jobs_bp
+from api.profiles import profiles_bp
+from api.report import report_bp
+
+class UploadRequest(Request):
+    """Keeps multipart file parts in memory instead of Werkzeug's temp files, up to the spool threshold"""
+
+    def _get_file_stream(self, total_content_length, content_type, filename=None, content_length=None):
+        if total_content_length is not None and total_content_length <= current_app.config["UPLOAD_SPOOL_THRESHOLD"]:
+            return io.BytesIO()
+        return super()._get_file_stream(total_content_length, content_type, filename, content_length)
 
 def create_app():
     app = Flask(__name__)
+    app.request_class = UploadRequest
     CORS(app, supports_credentials=True, origins="*")
     load_config(app)
+    if app.config["METRICS_MULTIPROC_DIR"]:
+        # Several gunicorn workers: any of them answers /metrics with every process's values
+        REGISTRY.enable_multiprocess(app.config["METRICS_MULTIPROC_DIR"])
+    app.extensions["analysis_cache"] = AnalysisCache.from_config(app.config)
+    app.extensions["job_queue"] = JobQueue.from_config(app.config)
+    app.extensions["revision_store"] = RevisionStore.from_config(app.config) if app.config["REVISIONS_ENABLED"] else None
+    app.extensions["near_duplicates"] = NearDuplicateIndex.from_config(app.config) if app.config["NEAR_DUP_ENABLED"] else None
+    app.extensions["results_store"] = results_store_from_config(app.config)
+    app.extensions["usage"] = UsageMeter.from_config(app.config)
+    app.extensions["admission"] = AdmissionController.from_config(app.config, usage=app.extensions["usage"])
+
+    # Drain queued uploads in this process unless a separate worker.py does it
+    if app.config["JOB_INPROCESS_WORKERS"]:
+        pool = WorkerPool(
+            app.extensions["job_queue"],
+            make_job_handlers(
+                app.extensions["analysis_cache"],
+                app.extensions["revision_store"],
+                app.extensions["near_duplicates"],
+                app.extensions["results_store"],
+                app.extensions["usage"]
+            ),
+            workers=app.config["JOB_WORKERS"],
+            heartbeat_interval=app.config["JOB_HEARTBEAT_INTERVAL"],
+            heartbeat_timeout=app.config["JOB_HEARTBEAT_TIMEOUT"]
+        )
+        pool.start()
+        app.extensions["worker_pool"] = pool
+
+    # Remove upload files left behind by crashed requests or workers
+    janitor = SpoolJanitor(
+        [app.config["UPLOAD_SPOOL_DIR"], UPLOAD_FOLDER],
+        max_age=app.config["UPLOAD_FILE_MAX_AGE"],
+        interval=app.config["UPLOAD_JANITOR_INTERVAL"],
+        # Under a backlog a queued job's upload can outlive max_age
+        keep=app.extensions["job_queue"].pending_files
+    )
+    janitor.start()
+    app.extensions["spool_janitor"] = janitor
+
+    # Opt-in profiling; nothing is hooked into requests unless it is configured
+    profiler = RequestProfiler.from_config(app.config)
+    app.extensions["profiler"] = profiler
+    if profiler.enabled:
+        @app.before_request
+        def start_profile():
+            trigger = profiler.trigger(request.headers.get(PROFILE_HEADER))
+            if trigger is not None:
+                g.profile = profiler.start()
+                g.profile_trigger = trigger
+                g.profile_started = time.perf_counter()
+
+        @app.after_request
+        def finish_profile(response):
+            profile = g.pop("profile", None)
+            if profile is None:
+                return response
+            metadata = {
+                "trigger": g.profile_trigger,
+                "method": request.method,
+                "path": request.path,
+                "endpoint": request.endpoint,
+                "shop": request.args.get("shop"),
+                "status": response.status_code,
+                "created_at": time.time()
+            }
+            started = g.profile_started
+
+            # Streamed responses do their work after this hook, so stop once the body is sent
+            def stop():
+                metadata["duration_ms"] = round((time.perf_counter() - started) * 1000, 1)
+                profiler.finish(profile, metadata)
+
+            response.call_on_close(stop)
+            return response
+
+    # Opt-in traffic recording for offline replay; model calls are captured at the transport
+    recorder = TrafficRecorder.from_config(app.config) if app.config["RECORD_TRAFFIC"] else None
+    app.extensions["traffic_recorder"] = recorder
+    if recorder is not None:
+        install_recorder(recorder)
+        set_llm_client(LLMClient(transport=RecordingTransport(recorder)))
+
+        @app.before_request
+        def start_recording():
+            entry = recorder.begin(request.method, request.endpoint, request.args.get("shop"), request.values)
+            if entry is not None:
+                g.traffic = entry
+                g.traffic_started = time.perf_counter()
+
+        @app.after_request
+        def finish_recording(response):
+            entry = g.pop("traffic", None)
+            if entry is None:
+                return response
+            started = g.traffic_started
+            # Batch and stream responses do their work while the body is sent
+            response.call_on_close(lambda: recorder.finish(entry, response.status_code, time.perf_counter() - started))
+            return response
+
+    # Per-request stage timings, read by the metrics and Server-Timing hooks
+    @app.before_request
+    def start_timings():
+        g.request_started = time.perf_counter()
+        g.timings = begin_request()
+
+    @app.after_request
+    def record_timings(response):
+        if "request_started" not in g:
+            return response
+        elapsed = time.perf_counter() - g.request_started
+        HTTP_REQUEST_SECONDS.observe(
+            elapsed,
+            endpoint=request.endpoint or "unmatched",
+            method=request.method,
+            status=response.status_code
+        )
+        if app.config["SERVER_TIMING"]:
+            stages = g.timings.server_timing()
+            total = f"total;dur={elapsed * 1000:.1f}"
+            response.headers["Server-Timing"] = f"{stages}, {total}" if stages else total
+        return response
 
     # Log all requests during development
     @app.before_request
@@ -20,13 +169,23 @@ def create_app():
             print("---")
 
     # Register your API blueprint (e.g., /api/upload_certificate)
-    app.register_blueprint(upload_blueprint, url_prefix='/api')
+    app.register_blueprint(upload_bp)
     app.register_blueprint(ce_bp)
+    app.register_blueprint(jobs_bp)
+    app.register_blueprint(profiles_bp)
+    app.register_blueprint(report_bp)
+    app.register_blueprint(billing_bp)
 
     @app.route("/health")
     def health_check():
         return jsonify({"status": "healthy", "service": "Compliance Decoder API"})
 
+    @app.route("/metrics")
+    def metrics():
+        if not app.config["METRICS_ENABLED"]:
+            return jsonify({"error": "Endpoint not found"}), 404
+        return Response(REGISTRY.render(), mimetype="text/plain; version=0.0.4")
+
     @app.route("/iframe")
     def iframe_test():
         shop = request.args.get("shop", "test-shop")
@@ -56,10 +215,6 @@ def create_app():
         response.headers["Referrer-Policy"] = "strict-origin-when-cross-origin"
         return response
 
-    def is_valid_shopify_shop(shop):
-        pattern = r'^[a-zA-Z0-9\-]+\.myshopify\.com$'
-        return bool(re.match(pattern, shop))
-
     @app.errorhandler(404)
     def not_found(error):
         return jsonify({"error": "Endpoint not found"}), 404
@@ -70,9 +225,9 @@ def create_app():
 
     return app
 
-app = create_app()
-
+# Development server only; production runs wsgi:app under gunicorn
 if __name__ == "__main__":
     import os
+    app = create_app()
     port = int(os.environ.get('PORT', 5001))
-    app.run(debug=True, host="0.0.0.0", port=port)
+    app.run(debug=app.config["ENV"] == "development", host="0.0.0.0", port=port)
@@ -0,0 +1,369 @@
+"""Replay recorded upload traffic against a local app instance.
+
+Record with RECORD_TRAFFIC=true and RECORD_SALT set, copy the recording
+(cache/traffic.sqlite3 by default) off the box, then:
+
+    cd backend
+    python benchmarks/replay.py traffic.sqlite3 --speedup 10 --output replay.json
+    python benchmarks/replay.py traffic.sqlite3 --speedup 10 --set JOB_WORKERS=4 \\
+        --set ANALYSIS_CACHE_MAX_ENTRIES=500 --output tuned.json --compare replay.json
+
+Requests are sent open-loop on the recorded schedule divided by --speedup, so
+latency is measured from when each request was due and a saturated app shows up
+as latency instead of a slower send rate. Model answers are served from the
+recording: the exact prompt when it was recorded, otherwise a recorded answer to
+the same kind of call, chosen by prompt hash so every run serves the same one.
+Answers recorded without their text (RECORD_LLM_TEXT=false, the default) are
+replaced by a minimal valid analysis of the recorded length.
+PDFs come from --corpus when their hash matches a recorded one; the rest are
+synthetic stand-ins with the recorded page count, one per recorded hash, so
+repeat and cached uploads repeat in the replay too.
+"""
+import argparse
+import asyncio
+import hashlib
+import io
+import json
+import os
+import platform
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Page count of a recorded document that was never extracted (e.g. always a cache hit)
+BYTES_PER_PAGE_ESTIMATE = 50_000
+JOB_POLL_INTERVAL = 0.1
+
+
+def placeholder_answer(completion_tokens: int) -> str:
+    """Stand-in for an answer recorded without its text: a valid analysis about as long as the original"""
+    from utils.gpt_analyzer import estimate_tokens
+
+    answer = {
+        "risk_level": "MODERATE", "confidence_score": 0.5, "applicable_directives": [], "compliance_gaps": [],
+        "strengths": [], "next_steps": [], "estimated_cost": "", "estimated_timeline": "", "summary": "",
+    }
+    padding = max(0, completion_tokens - estimate_tokens(json.dumps(answer)))
+    answer["summary"] = "replay " * (padding * 4 // 7)
+    return json.dumps(answer)
+
+
+class ReplayTransport:
+    """LLM transport that answers from a recording, with the recorded latency times latency_scale"""
+
+    def __init__(self, calls, latency_scale: float = 1.0):
+        self.latency_scale = latency_scale
+        self._by_prompt = {call["prompt_key"]: call for call in calls}
+        self._by_shape = {}
+        for call in calls:
+            self._by_shape.setdefault(call["shape_key"], []).append(call)
+        self._all = list(calls)
+        self.matches = {"exact": 0, "shape": 0, "any": 0}
+
+    def _lookup(self, messages, model, max_tokens, options):
+        from utils.gpt_analyzer import LLMError
+        from utils.traffic import prompt_key, shape_key
+
+        key = prompt_key(messages, model, max_tokens, options)
+        call = self._by_prompt.get(key)
+        if call is not None:
+            self.matches["exact"] += 1
+            return call
+        candidates, match = self._by_shape.get(shape_key(messages, model, max_tokens)), "shape"
+        if not candidates:
+            candidates, match = self._all, "any"
+        if not candidates:
+            raise LLMError("The recording has no model answers")
+        self.matches[match] += 1
+        return candidates[int(key, 16) % len(candidates)]
+
+    def _delay(self, call) -> float:
+        return call["latency_ms"] / 1000 * self.latency_scale
+
+    @staticmethod
+    def _text(call) -> str:
+        return call["text"] if call["text"] is not None else placeholder_answer(call["completion_tokens"])
+
+    async def complete(self, messages, model, temperature, max_tokens, timeout, **kwargs):
+        from utils.gpt_analyzer import Completion
+
+        call = self._lookup(messages, model, max_tokens, kwargs)
+        await asyncio.sleep(min(self._delay(call), timeout))
+        return Completion(self._text(call), call["prompt_tokens"], call["completion_tokens"], call["finish_reason"])
+
+    async def stream(self, messages, model, temperature, max_tokens, timeout, **kwargs):
+        call = self._lookup(messages, model, max_tokens, kwargs)
+        text, step = self._text(call), 16
+        pieces = [text[i:i + step] for i in range(0, len(text), step)] or [""]
+        delay = min(self._delay(call), timeout) / len(pieces)
+        for piece in pieces:
+            await asyncio.sleep(delay)
+            yield piece
+
+
+class ReplayDocuments:
+    """PDF bytes for recorded hashes: the real file from the corpus, else a synthetic stand-in"""
+
+    def __init__(self, documents, corpus_dir=None):
+        self.documents = documents
+        self.corpus = {}
+        for root, _, names in os.walk(corpus_dir) if corpus_dir else ():
+            for name in names:
+                if name.lower().endswith(".pdf"):
+                    path = os.path.join(root, name)
+                    with open(path, "rb") as f:
+                        self.corpus[hashlib.sha256(f.read()).hexdigest()] = path
+        self._pdfs = {}
+        self._lock = threading.Lock()
+        self.sources = {"corpus": 0, "synthetic": 0}
+
+    def pdf(self, sha256: str, size: int) -> bytes:
+        from benchmarks.synthetic_pdf import synthetic_pdf
+
+        with self._lock:
+            data = self._pdfs.get(sha256)
+            if data is not None:
+                return data
+            if sha256 in self.corpus:
+                with open(self.corpus[sha256], "rb") as f:
+                    data = f.read()
+                self.sources["corpus"] += 1
+            else:
+                pages = (self.documents.get(sha256) or {}).get("pages") or max(1, size // BYTES_PER_PAGE_ESTIMATE)
+                data = synthetic_pdf(pages, seed=int(sha256[:12], 16))
+                self.sources["synthetic"] += 1
+            self._pdfs[sha256] = data
+            return data
+
+
+def build_request(recorded, documents):
+    """Query string and multipart form of one recorded upload"""
+    query = {"shop": f"replay-{recorded['shop']}.myshopify.com"} if recorded["shop"] else {}
+    data = dict(recorded["params"])
+    files = [
+        (io.BytesIO(documents.pdf(f["sha256"], f["size"])), f"{f['name'] or 'document'}.pdf")
+        for f in recorded["files"]
+    ]
+    if recorded["endpoint"] == "upload.upload_batch":
+        data["files"] = files
+    elif files:
+        data["file"] = files[0]
+    return query, data
+
+
+def outcome_of(response, body: bytes) -> str:
+    if response.status_code == 429:
+        return "rejected"
+    if response.status_code >= 500:
+        return "error"
+    if response.status_code >= 400:
+        return "client_error"
+    if response.mimetype == "application/json" and response.status_code == 200:
+        payload = json.loads(body or b"{}")
+        if "error" in payload.get("analysis", payload):
+            return "error"
+    return "ok"
+
+
+def wait_for_job(client, status_url, deadline):
+    from utils.job_queue import FAILED, SUCCEEDED
+
+    while time.perf_counter() < deadline:
+        status = (client.get(status_url).get_json(silent=True) or {}).get("status")
+        if status == SUCCEEDED:
+            return "ok"
+        if status == FAILED:
+            return "error"
+        time.sleep(JOB_POLL_INTERVAL)
+    return "timeout"
+
+
+def summarize(samples):
+    from benchmarks.run_benchmarks import latency_summary
+
+    outcomes = {}
+    for sample in samples:
+        outcomes[sample["outcome"]] = outcomes.get(sample["outcome"], 0) + 1
+    total = len(samples)
+    return {
+        "requests": total,
+        "outcomes": outcomes,
+        "error_rate": round(outcomes.get("error", 0) / total, 4) if total else 0.0,
+        "rejected_rate": round(outcomes.get("rejected", 0) / total, 4) if total else 0.0,
+        **latency_summary([sample["latency"] for sample in samples]),
+    }
+
+
+def replay(app, recorded_requests, documents, speedup, concurrency, job_timeout):
+    from flask import url_for
+
+    with app.test_request_context():
+        paths = {r["endpoint"]: url_for(r["endpoint"]) for r in recorded_requests}
+    # Built up front so PDF generation does not delay the schedule
+    prepared = [(recorded, build_request(recorded, documents)) for recorded in recorded_requests]
+
+    samples, jobs, lags, futures = [], [], [], []
+    lock = threading.Lock()
+
+    def one(recorded, query, data, due):
+        client = app.test_client()
+        response = client.post(paths[recorded["endpoint"]], query_string=query, data=data,
+                               content_type="multipart/form-data")
+        body = response.get_data()  # drains batch and stream bodies
+        response.close()
+        latency = time.perf_counter() - due
+        outcome = outcome_of(response, body)
+        sample = {"endpoint": recorded["endpoint"], "outcome": outcome, "latency": latency}
+        job = None
+        if response.status_code == 202:
+            status_url = response.get_json()["status_url"]
+            job_outcome = wait_for_job(client, status_url, time.perf_counter() + job_timeout)
+            job = {"endpoint": recorded["endpoint"], "outcome": job_outcome, "latency": time.perf_counter() - due}
+        with lock:
+            samples.append(sample)
+            if job is not None:
+                jobs.append(job)
+
+    t0 = recorded_requests[0]["started_at"] if recorded_requests else 0.0
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        for recorded, (query, data) in prepared:
+            due = started + ((recorded["started_at"] - t0) / speedup if speedup > 0 else 0.0)
+            wait = due - time.perf_counter()
+            if wait > 0:
+                time.sleep(wait)
+            lags.append(max(0.0, -wait))
+            future = pool.submit(one, recorded, query, data, due)
+            future.add_done_callback(lambda f: setattr(f, "finished_at", time.perf_counter()))
+            futures.append((future, recorded, due))
+    wall = time.perf_counter() - started
+
+    # A request that raised in the client (not an HTTP error) still counts, as an error
+    exceptions = {}
+    for future, recorded, due in futures:
+        error = future.exception()
+        if error is not None:
+            samples.append({"endpoint": recorded["endpoint"], "outcome": "error", "latency": future.finished_at - due})
+            exceptions[type(error).__name__] = exceptions.get(type(error).__name__, 0) + 1
+
+    by_endpoint = {}
+    for sample in samples:
+        by_endpoint.setdefault(sample["endpoint"], []).append(sample)
+    span = (recorded_requests[-1]["started_at"] - t0) if recorded_requests else 0.0
+    return {
+        "overall": {
+            **summarize(samples),
+            "requests_per_sec": round(len(samples) / wall, 2) if wall else None,
+            "offered_per_sec": round(len(samples) / (span / speedup), 2) if span and speedup > 0 else None,
+            "seconds": round(wall, 2),
+            "max_dispatch_lag_ms": round(max(lags) * 1000, 2) if lags else None,
+            "exceptions": exceptions,
+        },
+        "by_endpoint": {endpoint: summarize(group) for endpoint, group in sorted(by_endpoint.items())},
+        "jobs": summarize(jobs),
+    }
+
+
+def recorded_summary(recorded_requests):
+    from benchmarks.run_benchmarks import latency_summary
+
+    total = len(recorded_requests)
+    errors = sum(1 for r in recorded_requests if r["status"] >= 500)
+    rejected = sum(1 for r in recorded_requests if r["status"] == 429)
+    span = recorded_requests[-1]["started_at"] - recorded_requests[0]["started_at"] if total else 0.0
+    return {
+        "requests": total,
+        "span_seconds": round(span, 1),
+        "requests_per_sec": round(total / span, 3) if span else None,
+        "error_rate": round(errors / total, 4) if total else 0.0,
+        "rejected_rate": round(rejected / total, 4) if total else 0.0,
+        **latency_summary([r["duration_ms"] / 1000 for r in recorded_requests]),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("recording", help="SQLite file written by the traffic recorder")
+    parser.add_argument("--speedup", type=float, default=1.0, help="time compression; 0 sends everything at once")
+    parser.add_argument("--concurrency", type=int, default=64, help="client threads sending requests")
+    parser.add_argument("--limit", type=int, help="replay only the first N recorded requests")
+    parser.add_argument("--corpus", help="directory of PDFs to use where their hash matches the recording")
+    parser.add_argument("--llm-latency-scale", type=float, default=1.0,
+                        help="multiplier on recorded model latency; 0 answers immediately")
+    parser.add_argument("--no-scale-shop-rates", action="store_true",
+                        help="keep per-shop rate limits at their configured value instead of multiplying by --speedup")
+    parser.add_argument("--job-timeout", type=float, default=300.0, help="seconds to wait for a queued upload")
+    parser.add_argument("--set", action="append", default=[], metavar="KEY=VALUE",
+                        help="backend setting for this run, e.g. JOB_WORKERS=4; may be repeated")
+    parser.add_argument("--output", default="replay_output.json")
+    parser.add_argument("--compare", help="previous replay JSON to diff against")
+    args = parser.parse_args()
+    recording_path = os.path.abspath(args.recording)
+    output_path = os.path.abspath(args.output)
+    compare_path = os.path.abspath(args.compare) if args.compare else None
+    corpus_dir = os.path.abspath(args.corpus) if args.corpus else None
+
+    sys.path.insert(0, BACKEND_DIR)
+
+    # Everything stateful lives in a scratch directory; settings must be in the
+    # environment before the backend modules read them at import time
+    workdir = tempfile.mkdtemp(prefix="replay-")
+    os.environ.update({"GPT_API_KEY": "replay", "RECORD_TRAFFIC": "false", "WARMUP_ON_START": "false"})
+    overrides = dict(item.split("=", 1) for item in args.set)
+    if args.speedup > 0 and not args.no_scale_shop_rates and "SHOP_RATE_PER_MINUTE" not in overrides:
+        # The recorded shops sent at production pace; compressed time would otherwise read as abuse
+        rate = float(os.getenv("SHOP_RATE_PER_MINUTE", "20"))
+        overrides["SHOP_RATE_PER_MINUTE"] = str(rate * args.speedup)
+    os.environ.update(overrides)
+    os.chdir(workdir)
+
+    from utils.gpt_analyzer import LLMClient, set_llm_client
+    from utils.traffic import TrafficRecording
+
+    recording = TrafficRecording(recording_path)
+    recorded_requests = recording.requests(args.limit)
+    transport = ReplayTransport(recording.llm_calls(), args.llm_latency_scale)
+    documents = ReplayDocuments(recording.documents(), corpus_dir)
+
+    from app import create_app
+    app = create_app()
+    set_llm_client(LLMClient(transport=transport))
+
+    from benchmarks.run_benchmarks import compare, peak_rss_mb
+
+    results = {
+        "meta": {
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpus": os.cpu_count(),
+            "args": vars(args),
+            "settings": overrides,
+        },
+        "recorded": recorded_summary(recorded_requests),
+        "replay": replay(app, recorded_requests, documents, args.speedup, args.concurrency, args.job_timeout),
+        "llm_matches": transport.matches,
+        "documents": documents.sources,
+        "peak_rss_mb": peak_rss_mb(),
+    }
+
+    with open(output_path, "w") as f:
+        json.dump(results, f, indent=2)
+    print(json.dumps(results, indent=2))
+
+    if compare_path:
+        with open(compare_path) as f:
+            baseline = json.load(f)
+        print("\nmetric\tbaseline\tcurrent\tchange%")
+        for path, old, new, change, better in compare(results, baseline):
+            if path.startswith(("meta.", "recorded.")):
+                continue
+            print(f"{path}\t{old}\t{new}\t{change:+.1f}%{'' if better or change == 0 else '  (worse)'}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,229 @@
+"""Offline benchmark for the upload -> extract -> analyze pipeline.
+
+Runs against backend/sample.pdf and synthetic PDFs, with a local stub LLM in place
+of OpenAI, and writes machine-readable JSON:
+
+    cd backend
+    python benchmarks/run_benchmarks.py --output bench.json
+    python benchmarks/run_benchmarks.py --output new.json --compare bench.json
+"""
+import argparse
+import io
+import json
+import os
+import platform
+import resource
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+SAMPLE_PDF = os.path.join(BACKEND_DIR, "sample.pdf")
+
+# Lower is better for everything except throughput metrics
+HIGHER_IS_BETTER = ("pages_per_sec", "requests_per_sec")
+
+
+def percentile(samples, q):
+    if not samples:
+        return None
+    ordered = sorted(samples)
+    index = min(len(ordered) - 1, max(0, int(round(q / 100.0 * (len(ordered) - 1)))))
+    return ordered[index]
+
+
+def latency_summary(samples):
+    return {
+        "count": len(samples),
+        "p50_ms": round(percentile(samples, 50) * 1000, 2) if samples else None,
+        "p95_ms": round(percentile(samples, 95) * 1000, 2) if samples else None,
+        "p99_ms": round(percentile(samples, 99) * 1000, 2) if samples else None,
+        "max_ms": round(max(samples) * 1000, 2) if samples else None,
+    }
+
+
+def peak_rss_mb():
+    self_kb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    children_kb = resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss
+    return {"self": round(self_kb / 1024, 1), "children": round(children_kb / 1024, 1)}
+
+
+def bench_extraction(documents, repeats):
+    from utils.pdf_parser import PDFParser
+
+    results = {}
+    for name, pdf_bytes in documents.items():
+        for mode in ("serial", "parallel"):
+            parser = PDFParser(workers=1) if mode == "serial" else PDFParser()
+            pages = 0
+            started = time.perf_counter()
+            for _ in range(repeats):
+                pages += len(parser.extract_pages(pdf_bytes))
+            elapsed = time.perf_counter() - started
+            results[f"{name}/{mode}"] = {
+                "pages": pages // repeats,
+                "seconds": round(elapsed / repeats, 5),
+                "pages_per_sec": round(pages / elapsed, 1) if elapsed else None,
+            }
+    return results
+
+
+def bench_prompt_build(repeats):
+    from utils.ce_analyzer import CEAnalyzer
+    from utils.pipeline import CE_DOCUMENT_TYPES
+
+    analyzer = CEAnalyzer()
+    results = {}
+    for size in (1_000, 50_000, 500_000):
+        text = ("Directive 2014/35/EU applies. " * (size // 30 + 1))[:size]
+        for document_type in CE_DOCUMENT_TYPES:
+            started = time.perf_counter()
+            for _ in range(repeats):
+                analyzer.get_ce_analysis_prompt(document_type, text, "electronics")
+            elapsed = time.perf_counter() - started
+            results[f"{document_type}/{size}"] = {"mean_us": round(elapsed / repeats * 1e6, 2)}
+    return results
+
+
+def bench_end_to_end(app, pdf_bytes, requests, concurrency, document_type, unique):
+    from benchmarks.synthetic_pdf import unique_variant
+
+    client_factory = app.test_client
+    latencies, errors, rejected = [], 0, 0
+
+    def one(i):
+        body = unique_variant(pdf_bytes, i) if unique else pdf_bytes
+        client = client_factory()
+        started = time.perf_counter()
+        response = client.post("/api/upload", data={
+            "file": (io.BytesIO(body), "bench.pdf"),
+            "document_type": document_type,
+            "product_category": "electronics",
+        }, content_type="multipart/form-data")
+        elapsed = time.perf_counter() - started
+        payload = response.get_json(silent=True) or {}
+        ok = response.status_code == 200 and "error" not in payload.get("analysis", payload)
+        return elapsed, ok, response.status_code == 429
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        for elapsed, ok, was_rejected in pool.map(one, range(requests)):
+            latencies.append(elapsed)
+            errors += 0 if ok else 1
+            rejected += 1 if was_rejected else 0
+    wall = time.perf_counter() - started
+
+    return {
+        "requests": requests,
+        "concurrency": concurrency,
+        "errors": errors,
+        "rejected": rejected,
+        "error_rate": round(errors / requests, 4) if requests else 0.0,
+        "requests_per_sec": round(requests / wall, 2) if wall else None,
+        **latency_summary(latencies),
+    }
+
+
+def compare(current, baseline, prefix=""):
+    """Flatten both result trees and report relative change per numeric metric"""
+    rows = []
+    for key, value in current.items():
+        path = f"{prefix}{key}"
+        other = baseline.get(key) if isinstance(baseline, dict) else None
+        if isinstance(value, dict):
+            rows.extend(compare(value, other or {}, path + "."))
+        elif isinstance(value, (int, float)) and isinstance(other, (int, float)) and other:
+            change = (value - other) / other * 100
+            better = change > 0 if key.endswith(HIGHER_IS_BETTER) else change < 0
+            rows.append((path, other, value, round(change, 1), better))
+    return rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--output", default="bench_output.json")
+    parser.add_argument("--compare", help="previous JSON result to diff against")
+    parser.add_argument("--page-counts", default="1,10,100,1000")
+    parser.add_argument("--repeats", type=int, default=3)
+    parser.add_argument("--requests", type=int, default=40)
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--llm-latency", type=float, default=0.5)
+    parser.add_argument("--llm-jitter", type=float, default=0.1)
+    parser.add_argument("--llm-error-rate", type=float, default=0.0)
+    parser.add_argument("--llm-rate-limit-rate", type=float, default=0.0)
+    args = parser.parse_args()
+    output_path = os.path.abspath(args.output)
+    compare_path = os.path.abspath(args.compare) if args.compare else None
+
+    sys.path.insert(0, BACKEND_DIR)
+    from benchmarks.stub_llm import StubLLMServer
+    from benchmarks.synthetic_pdf import synthetic_pdf
+
+    stub = StubLLMServer(latency=args.llm_latency, jitter=args.llm_jitter, error_rate=args.llm_error_rate,
+                         rate_limit_rate=args.llm_rate_limit_rate).start()
+
+    # Everything stateful lives in a scratch directory; settings must be in the
+    # environment before the backend modules read them at import time
+    workdir = tempfile.mkdtemp(prefix="bench-")
+    os.environ.update({
+        "GPT_API_KEY": "bench",
+        "GPT_BASE_URL": stub.base_url,
+        "JOB_INPROCESS_WORKERS": "false",
+        "ANALYSIS_CACHE_PATH": os.path.join(workdir, "analysis_cache.sqlite3"),
+        "JOB_QUEUE_PATH": os.path.join(workdir, "jobs.sqlite3"),
+        "PRESCREEN_SKIP_COMPLETE": "false",
+        # Every request is one anonymous client; per-shop rate limits would turn most into fast 429s
+        "ADMISSION_ENABLED": "false",
+    })
+    os.chdir(workdir)
+
+    documents = {"sample": open(SAMPLE_PDF, "rb").read()}
+    for count in (int(c) for c in args.page_counts.split(",") if c):
+        documents[f"synthetic_{count}p"] = synthetic_pdf(count)
+
+    from app import create_app
+    app = create_app()
+
+    results = {
+        "meta": {
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpus": os.cpu_count(),
+            "args": vars(args),
+        },
+        "extraction": bench_extraction(documents, args.repeats),
+        "prompt_build": bench_prompt_build(args.repeats * 10),
+        "end_to_end": {
+            "cold": bench_end_to_end(app, documents["synthetic_10p"] if "synthetic_10p" in documents else documents["sample"],
+                                     args.requests, args.concurrency, "declaration_of_conformity", unique=True),
+            "cached": bench_end_to_end(app, documents["sample"], args.requests, args.concurrency,
+                                       "declaration_of_conformity", unique=False),
+        },
+        "llm_stub_requests": stub.requests,
+        "peak_rss_mb": peak_rss_mb(),
+    }
+    stub.stop()
+
+    with open(output_path, "w") as f:
+        json.dump(results, f, indent=2)
+    print(json.dumps(results, indent=2))
+
+    # A rejected request measures admission control, not the pipeline, so the numbers are void
+    rejected = sum(run["rejected"] for run in results["end_to_end"].values())
+    if rejected:
+        sys.exit(f"{rejected} upload(s) were rejected with 429; lower --concurrency or raise ANALYSIS_MAX_INFLIGHT")
+
+    if compare_path:
+        with open(compare_path) as f:
+            baseline = json.load(f)
+        print("\nmetric\tbaseline\tcurrent\tchange%")
+        for path, old, new, change, better in compare(results, baseline):
+            if path.startswith("meta."):
+                continue
+            print(f"{path}\t{old}\t{new}\t{change:+.1f}%{'' if better or change == 0 else '  (worse)'}")
+
+
+if __name__ == "__main__":
+    main()
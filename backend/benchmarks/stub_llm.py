@@ -0,0 +1,166 @@
+"""Local OpenAI-compatible chat completions server for offline benchmarks.
+
+    python benchmarks/stub_llm.py --port 8808 --latency 0.8 --error-rate 0.05
+
+then point the backend at it with GPT_BASE_URL=http://127.0.0.1:8808/v1
+"""
+import argparse
+import json
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+CANNED_ANALYSIS = {
+    "risk_level": "MODERATE",
+    "confidence_score": 0.8,
+    "applicable_directives": ["2014/35/EU", "2014/30/EU"],
+    "compliance_gaps": [
+        {
+            "severity": "HIGH",
+            "issue": "Notified body number missing",
+            "requirement": "Conformity assessment procedure",
+            "solution": "Add the notified body name and four-digit number"
+        }
+    ],
+    "strengths": ["Manufacturer identified"],
+    "next_steps": ["Add notified body details"],
+    "estimated_cost": "$500 - $1,000",
+    "estimated_timeline": "1-2 weeks",
+    "summary": "Stub analysis."
+}
+
+
+class StubLLMServer:
+    """Threaded stub server with configurable latency, jitter and error rate"""
+
+    def __init__(self, host: str = "127.0.0.1", port: int = 0, latency: float = 0.5, jitter: float = 0.1,
+                 error_rate: float = 0.0, rate_limit_rate: float = 0.0, tokens_per_second: float = 200.0,
+                 responder=None):
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.rate_limit_rate = rate_limit_rate
+        self.tokens_per_second = tokens_per_second
+        # responder(request_body) -> content string; defaults to the canned analysis
+        self.responder = responder or (lambda body: json.dumps(CANNED_ANALYSIS))
+        self.requests = 0
+        self._lock = threading.Lock()
+        self._server = ThreadingHTTPServer((host, port), self._handler_class())
+        self._server.daemon_threads = True
+        self._thread = None
+
+    @property
+    def base_url(self) -> str:
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}/v1"
+
+    def start(self) -> "StubLLMServer":
+        self._thread = threading.Thread(target=self._server.serve_forever, name="stub-llm", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        self._server.shutdown()
+        self._server.server_close()
+
+    def _handler_class(self):
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def log_message(self, format, *args):
+                pass
+
+            def _send_json(self, status, payload, headers=None):
+                data = json.dumps(payload).encode("utf-8")
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(data)))
+                for name, value in (headers or {}).items():
+                    self.send_header(name, value)
+                self.end_headers()
+                self.wfile.write(data)
+
+            def do_POST(self):
+                body = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))) or b"{}")
+                with stub._lock:
+                    stub.requests += 1
+
+                roll = random.random()
+                if roll < stub.rate_limit_rate:
+                    return self._send_json(429, {"error": {"message": "Rate limit reached", "type": "requests"}},
+                                           {"Retry-After": "0.2"})
+                if roll < stub.rate_limit_rate + stub.error_rate:
+                    return self._send_json(500, {"error": {"message": "Stub upstream error", "type": "server_error"}})
+
+                time.sleep(max(0.0, random.gauss(stub.latency, stub.jitter)))
+                content = stub.responder(body)
+                prompt_tokens = sum(len(m.get("content", "")) for m in body.get("messages", [])) // 4
+                completion_tokens = len(content) // 4
+
+                if body.get("stream"):
+                    return self._stream(body, content)
+
+                self._send_json(200, {
+                    "id": "chatcmpl-stub",
+                    "object": "chat.completion",
+                    "created": int(time.time()),
+                    "model": body.get("model", "stub"),
+                    "choices": [{
+                        "index": 0,
+                        "message": {"role": "assistant", "content": content},
+                        "finish_reason": "stop"
+                    }],
+                    "usage": {
+                        "prompt_tokens": prompt_tokens,
+                        "completion_tokens": completion_tokens,
+                        "total_tokens": prompt_tokens + completion_tokens
+                    }
+                })
+
+            def _stream(self, body, content):
+                self.send_response(200)
+                self.send_header("Content-Type", "text/event-stream")
+                self.send_header("Connection", "close")
+                self.end_headers()
+                step = 16
+                delay = step / 4 / stub.tokens_per_second if stub.tokens_per_second else 0
+                for i in range(0, len(content), step):
+                    chunk = {
+                        "id": "chatcmpl-stub",
+                        "object": "chat.completion.chunk",
+                        "created": int(time.time()),
+                        "model": body.get("model", "stub"),
+                        "choices": [{"index": 0, "delta": {"content": content[i:i + step]}, "finish_reason": None}]
+                    }
+                    self.wfile.write(f"data: {json.dumps(chunk)}\n\n".encode("utf-8"))
+                    self.wfile.flush()
+                    time.sleep(delay)
+                self.wfile.write(b"data: [DONE]\n\n")
+                self.close_connection = True
+
+        return Handler
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8808)
+    parser.add_argument("--latency", type=float, default=0.5, help="mean response latency in seconds")
+    parser.add_argument("--jitter", type=float, default=0.1, help="latency standard deviation in seconds")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="fraction of requests answered with 500")
+    parser.add_argument("--rate-limit-rate", type=float, default=0.0, help="fraction of requests answered with 429")
+    args = parser.parse_args()
+
+    server = StubLLMServer(args.host, args.port, args.latency, args.jitter, args.error_rate, args.rate_limit_rate)
+    print(f"Stub LLM listening on {server.base_url}")
+    try:
+        server._server.serve_forever()
+    except KeyboardInterrupt:
+        server.stop()
+
+
+if __name__ == "__main__":
+    main()
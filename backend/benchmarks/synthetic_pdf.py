@@ -0,0 +1,49 @@
+"""Synthetic CE documents for benchmarks, generated with PyMuPDF."""
+import random
+
+import fitz  # PyMuPDF
+
+PAGE_TEMPLATE = """{section}. TECHNICAL DOCUMENTATION - SECTION {section}
+
+Manufacturer: Example Devices GmbH, 12 Industrie Street, 10115 Berlin
+Model No.: EX-{page:04d}
+This product complies with Directive 2014/35/EU and Directive 2014/30/EU.
+Harmonised standards applied: EN 62368-1:2014+A11:2017, EN 55032:2015.
+
+Risk assessment summary for page {page}: electrical hazards were identified and
+mitigated by reinforced insulation. Residual risk is documented in the user manual.
+Test report no. TR-{page:05d} issued by an accredited laboratory.
+"""
+
+
+FILLER_WORDS = (
+    "insulation", "clearance", "creepage", "enclosure", "earthing", "fuse", "label", "marking", "warning",
+    "temperature", "humidity", "emission", "immunity", "surge", "leakage", "current", "voltage", "battery",
+    "charger", "adapter", "housing", "screw", "cable", "connector", "manual", "assembly", "inspection",
+)
+
+
+def synthetic_pdf(pages: int, lines_per_page: int = 4, seed=None) -> bytes:
+    """
+    PDF bytes with `pages` text pages that look like a technical file. With a seed the
+    filler text differs per seed, so documents are not near-duplicates of each other.
+    """
+    doc = fitz.open()
+    rng = random.Random(seed) if seed is not None else None
+    filler = "Lorem ipsum compliance text for benchmark sizing purposes only. " * 2
+    for page_number in range(1, pages + 1):
+        page = doc.new_page()
+        text = PAGE_TEMPLATE.format(section=(page_number - 1) // 10 + 1, page=page_number)
+        if rng is not None:
+            text += "\n".join(" ".join(rng.choices(FILLER_WORDS, k=18)) for _ in range(lines_per_page))
+        else:
+            text += "\n".join(filler for _ in range(lines_per_page))
+        page.insert_textbox(fitz.Rect(50, 50, 550, 800), text, fontsize=9)
+    data = doc.tobytes()
+    doc.close()
+    return data
+
+
+def unique_variant(pdf_bytes: bytes, marker: int) -> bytes:
+    """Same document with different bytes, so content-addressed caches miss"""
+    return pdf_bytes + f"\n%bench-{marker}\n".encode("ascii")
@@ -3,10 +3,96 @@ import os
 from dotenv import load_dotenv
 
 
+def _env_bool(name, default):
+    return os.getenv(name, default).strip().lower() in ("1", "true", "yes", "on")
+
+
 def load_config(app):
     load_dotenv()
     app.config["GPT_API_KEY"] = os.getenv("GPT_API_KEY")
     app.config["SHOPIFY_SECRET"] = os.getenv("SHOPIFY_SECRET")
+    # Checked against the aud claim of session tokens when set
+    app.config["SHOPIFY_API_KEY"] = os.getenv("SHOPIFY_API_KEY") or None
     app.config["ENV"] = os.getenv("FLASK_ENV", "development")
 
+    # Content-addressed analysis result cache
+    app.config["ANALYSIS_CACHE_PATH"] = os.getenv("ANALYSIS_CACHE_PATH", "cache/analysis_cache.sqlite3")
+    app.config["ANALYSIS_CACHE_MAX_ENTRIES"] = int(os.getenv("ANALYSIS_CACHE_MAX_ENTRIES", "5000"))
+    app.config["ANALYSIS_CACHE_MAX_BYTES"] = int(os.getenv("ANALYSIS_CACHE_MAX_BYTES", str(256 * 1024 * 1024)))
+    app.config["ANALYSIS_CACHE_TTL"] = int(os.getenv("ANALYSIS_CACHE_TTL", str(30 * 24 * 3600)))
+
+    # Background analysis jobs
+    app.config["JOB_QUEUE_PATH"] = os.getenv("JOB_QUEUE_PATH", "cache/jobs.sqlite3")
+    app.config["JOB_MAX_PENDING"] = int(os.getenv("JOB_MAX_PENDING", "500"))
+    app.config["JOB_WORKERS"] = int(os.getenv("JOB_WORKERS", "2"))
+    app.config["JOB_INPROCESS_WORKERS"] = _env_bool("JOB_INPROCESS_WORKERS", "true")
+    # Workers refresh their running jobs this often; jobs without a heartbeat for the timeout are requeued
+    app.config["JOB_HEARTBEAT_INTERVAL"] = float(os.getenv("JOB_HEARTBEAT_INTERVAL", "10"))
+    app.config["JOB_HEARTBEAT_TIMEOUT"] = float(os.getenv("JOB_HEARTBEAT_TIMEOUT", "60"))
+    app.config["UPLOAD_ASYNC_DEFAULT"] = _env_bool("UPLOAD_ASYNC_DEFAULT", "false")
+
+    # Uploads are kept in memory up to the spool threshold
+    app.config["UPLOAD_SPOOL_THRESHOLD"] = int(os.getenv("UPLOAD_SPOOL_THRESHOLD", str(8 * 1024 * 1024)))
+    app.config["UPLOAD_SPOOL_DIR"] = os.getenv("UPLOAD_SPOOL_DIR", "temp_uploads/spool")
+    app.config["UPLOAD_FILE_MAX_AGE"] = int(os.getenv("UPLOAD_FILE_MAX_AGE", str(6 * 3600)))
+    app.config["UPLOAD_JANITOR_INTERVAL"] = int(os.getenv("UPLOAD_JANITOR_INTERVAL", "600"))
+
+    # Batch uploads
+    app.config["BATCH_MAX_FILES"] = int(os.getenv("BATCH_MAX_FILES", "25"))
+    app.config["BATCH_CONCURRENCY"] = int(os.getenv("BATCH_CONCURRENCY", "4"))
+    app.config["ANALYSIS_MAX_INFLIGHT"] = int(os.getenv("ANALYSIS_MAX_INFLIGHT", "8"))
+
+    # Incremental re-analysis of revised documents
+    app.config["REVISIONS_ENABLED"] = _env_bool("REVISIONS_ENABLED", "true")
+    app.config["REVISION_STORE_PATH"] = os.getenv("REVISION_STORE_PATH", "cache/revisions.sqlite3")
+    app.config["REVISION_MAX_PER_LINEAGE"] = int(os.getenv("REVISION_MAX_PER_LINEAGE", "10"))
+
+    # Reuse of cached analyses for near-identical documents (MinHash similarity)
+    app.config["NEAR_DUP_ENABLED"] = _env_bool("NEAR_DUP_ENABLED", "true")
+    app.config["NEAR_DUP_PATH"] = os.getenv("NEAR_DUP_PATH", "cache/near_duplicates.sqlite3")
+    app.config["NEAR_DUP_THRESHOLD"] = float(os.getenv("NEAR_DUP_THRESHOLD", "0.9"))
+    app.config["NEAR_DUP_MAX_ENTRIES"] = int(os.getenv("NEAR_DUP_MAX_ENTRIES", "20000"))
+
+    # Stored analysis results behind /api/reports
+    app.config["RESULTS_STORE_URL"] = os.getenv("RESULTS_STORE_URL", "sqlite:///cache/results.sqlite3")
+    app.config["REPORTS_PAGE_MAX"] = int(os.getenv("REPORTS_PAGE_MAX", "100"))
+
+    # Per-shop admission control, fair scheduling and usage metering
+    app.config["ADMISSION_ENABLED"] = _env_bool("ADMISSION_ENABLED", "true")
+    app.config["SHOP_RATE_PER_MINUTE"] = float(os.getenv("SHOP_RATE_PER_MINUTE", "20"))
+    app.config["SHOP_BURST"] = float(os.getenv("SHOP_BURST", "30"))
+    app.config["SHOP_WEIGHTS"] = os.getenv("SHOP_WEIGHTS", "")
+    app.config["ADMISSION_MAX_WAITING"] = int(os.getenv("ADMISSION_MAX_WAITING", "32"))
+    app.config["ADMISSION_SLOT_TIMEOUT"] = float(os.getenv("ADMISSION_SLOT_TIMEOUT", "30"))
+    app.config["ADMISSION_SHED_QUEUE_DEPTH"] = int(
+        os.getenv("ADMISSION_SHED_QUEUE_DEPTH", str(app.config["JOB_MAX_PENDING"] * 4 // 5))
+    )
+    app.config["ADMISSION_RETRY_AFTER"] = int(os.getenv("ADMISSION_RETRY_AFTER", "30"))
+    app.config["USAGE_PATH"] = os.getenv("USAGE_PATH", "cache/usage.sqlite3")
+
+    # Prometheus metrics at /metrics and per-request Server-Timing headers
+    app.config["METRICS_ENABLED"] = _env_bool("METRICS_ENABLED", "true")
+    app.config["SERVER_TIMING"] = _env_bool("SERVER_TIMING", "false")
+    # Shared directory through which every process's metrics are summed (set by gunicorn.conf.py)
+    app.config["METRICS_MULTIPROC_DIR"] = os.getenv("METRICS_MULTIPROC_DIR") or None
+
+    # Request profiling: sampled, or per request with a header signed by PROFILE_SECRET
+    app.config["PROFILE_SAMPLE_RATE"] = float(os.getenv("PROFILE_SAMPLE_RATE", "0"))
+    app.config["PROFILE_SECRET"] = os.getenv("PROFILE_SECRET") or None
+    app.config["PROFILE_DIR"] = os.getenv("PROFILE_DIR", "cache/profiles")
+    app.config["PROFILE_MAX_PROFILES"] = int(os.getenv("PROFILE_MAX_PROFILES", "50"))
+    # Seconds between stack samples of all threads while a request is being profiled
+    app.config["PROFILE_INTERVAL"] = float(os.getenv("PROFILE_INTERVAL", "0.005"))
+
+    # Anonymized traffic recording for offline replay with benchmarks/replay.py
+    app.config["RECORD_TRAFFIC"] = _env_bool("RECORD_TRAFFIC", "false")
+    app.config["RECORD_PATH"] = os.getenv("RECORD_PATH", "cache/traffic.sqlite3")
+    app.config["RECORD_SAMPLE_RATE"] = float(os.getenv("RECORD_SAMPLE_RATE", "1.0"))
+    # Key for shop, supplier and file name pseudonyms; required when recording
+    app.config["RECORD_SALT"] = os.getenv("RECORD_SALT") or None
+    # Latency and token counts of model calls
+    app.config["RECORD_LLM"] = _env_bool("RECORD_LLM", "true")
+    # The model's answer text as well, which can quote document contents
+    app.config["RECORD_LLM_TEXT"] = _env_bool("RECORD_LLM_TEXT", "false")
+
 # === End File: backend/config.py ===
\ No newline at end of file
@@ -0,0 +1,34 @@
+"""gunicorn settings for the production entry point (wsgi:app)"""
+import os
+import time
+
+from utils.warmup import preload_modules
+
+bind = f"0.0.0.0:{os.getenv('PORT', '5001')}"
+workers = int(os.getenv("WEB_CONCURRENCY", "2"))
+# Requests mostly wait on the LLM or stream responses, so each worker runs threads
+worker_class = "gthread"
+threads = int(os.getenv("GUNICORN_THREADS", "8"))
+# Analyses of large technical files can take minutes
+timeout = int(os.getenv("GUNICORN_TIMEOUT", "300"))
+graceful_timeout = 30
+keepalive = 5
+# The app is created per worker, after fork; only imports are shared with the master
+preload_app = False
+
+_boot_started = time.perf_counter()
+
+
+def on_starting(server):
+    # Each worker keeps its own metrics; they are summed through files in this directory
+    directory = os.environ.setdefault("METRICS_MULTIPROC_DIR", "cache/metrics")
+    os.makedirs(directory, exist_ok=True)
+    for entry in os.listdir(directory):
+        if entry.startswith("metrics-"):
+            os.remove(os.path.join(directory, entry))
+    timings = preload_modules()
+    server.log.info(f"Preloaded modules in master: {timings}")
+
+
+def when_ready(server):
+    server.log.info(f"Master ready in {round((time.perf_counter() - _boot_started) * 1000, 1)} ms")
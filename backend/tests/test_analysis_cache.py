@@ -0,0 +1,57 @@
+from utils import analysis_cache
+from utils.analysis_cache import AnalysisCache, make_cache_key
+
+
+def test_cache_key_covers_every_input():
+    key = make_cache_key("abc", "test_report", None, "v1")
+    assert key == make_cache_key("abc", "test_report", "general", "v1")
+    assert len({key, make_cache_key("abd", "test_report", None, "v1"),
+                make_cache_key("abc", "user_manual", None, "v1"),
+                make_cache_key("abc", "test_report", "toys", "v1"),
+                make_cache_key("abc", "test_report", None, "v2")}) == 5
+
+
+def test_get_returns_what_was_set_and_counts_lookups():
+    cache = AnalysisCache(":memory:")
+    cache.set("a", {"risk_level": "LOW", "compliance_gaps": []})
+    assert cache.get("a") == {"risk_level": "LOW", "compliance_gaps": []}
+    assert cache.get("b") is None
+    stats = cache.stats()
+    assert (stats["entries"], stats["hits"], stats["misses"], stats["hit_rate"]) == (1, 1, 1, 0.5)
+
+
+def test_expired_entries_are_misses(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(analysis_cache.time, "time", lambda: now[0])
+    cache = AnalysisCache(":memory:", ttl_seconds=60)
+    cache.set("a", {"n": 1})
+    now[0] += 61
+    assert cache.get("a") is None
+    assert cache.stats()["entries"] == 0
+    assert cache.evictions == 1
+
+
+def test_least_recently_used_entries_are_evicted_first(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(analysis_cache.time, "time", lambda: now[0])
+    cache = AnalysisCache(":memory:", max_entries=2)
+    for key in ("a", "b"):
+        now[0] += 1
+        cache.set(key, {"key": key})
+    now[0] += 1
+    cache.get("a")
+    now[0] += 1
+    cache.set("c", {"key": "c"})
+    assert cache.get("b") is None
+    assert cache.get("a") == {"key": "a"}
+    assert cache.get("c") == {"key": "c"}
+
+
+def test_byte_cap_evicts_and_oversized_results_are_not_stored():
+    cache = AnalysisCache(":memory:", max_bytes=100)
+    cache.set("huge", {"text": "x" * 200})
+    assert cache.get("huge") is None
+    cache.set("a", {"text": "x" * 40})
+    cache.set("b", {"text": "y" * 40})
+    assert cache.stats()["entries"] == 1
+    assert cache.get("b") == {"text": "y" * 40}
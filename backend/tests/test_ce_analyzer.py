@@ -0,0 +1,32 @@
+import pytest
+
+from utils.ce_analyzer import CE_ANALYSIS_MAX_TOKENS, CEAnalyzer, chunk_token_budget
+from utils.ce_registry import DOCUMENT_TYPES
+from utils.chunker import chunk_pages, estimate_tokens
+from utils.gpt_analyzer import context_window
+from utils.prescreen import CHECKLISTS, PrescreenResult
+
+
+def test_context_window_by_longest_model_prefix():
+    assert context_window("gpt-4") == 8192
+    assert context_window("gpt-4-0613") == 8192
+    assert context_window("gpt-4-32k-0613") == 32768
+    assert context_window("gpt-4o-mini") == 128000
+    assert context_window("some-local-model") == 8192
+
+
+@pytest.mark.parametrize("document_type", DOCUMENT_TYPES)
+def test_full_budget_chunk_prompt_fits_gpt_4(document_type):
+    budget = chunk_token_budget(document_type, "gpt-4")
+    assert 1000 <= budget <= 5000
+    # Pages that only just fit the budget together, and the largest pre-screen section
+    chunk, = chunk_pages(["Clause text of the document. " * (budget * 2 // 29)] * 2, budget)
+    items = list(CHECKLISTS.get(document_type, ()))
+    screen = PrescreenResult("partial", {}, items[:1], items[1:])
+    excerpt = f"[Excerpt: pages {chunk.first_page}-{chunk.last_page} of 200]\n{chunk.text}"
+    prompt = CEAnalyzer(model="gpt-4").get_ce_analysis_prompt(document_type, excerpt, None, screen)
+    assert estimate_tokens(prompt) + CE_ANALYSIS_MAX_TOKENS <= context_window("gpt-4")
+
+
+def test_larger_models_get_larger_chunks():
+    assert chunk_token_budget("technical_file", "gpt-4o") > 10 * chunk_token_budget("technical_file", "gpt-4")
@@ -0,0 +1,10 @@
+from utils.ce_registry import CHECKLIST_ITEM_DOCUMENT_TYPES, CHECKLISTS, DIRECTIVE_CATEGORIES, DIRECTIVE_MAPPING
+
+
+def test_reverse_indexes_match_forward_mappings():
+    for item, document_types in CHECKLIST_ITEM_DOCUMENT_TYPES.items():
+        assert all(item in CHECKLISTS[document_type] for document_type in document_types)
+    for document_type, items in CHECKLISTS.items():
+        assert all(document_type in CHECKLIST_ITEM_DOCUMENT_TYPES[item] for item in items)
+    for directive, categories in DIRECTIVE_CATEGORIES.items():
+        assert all(directive in DIRECTIVE_MAPPING[category] for category in categories)
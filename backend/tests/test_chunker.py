@@ -0,0 +1,38 @@
+from utils.chunker import chunk_pages, estimate_tokens
+
+
+def test_small_pages_share_a_chunk():
+    chunks = chunk_pages(["a" * 40, "b" * 40, "c" * 40], max_tokens=100)
+    assert len(chunks) == 1
+    assert (chunks[0].first_page, chunks[0].last_page, chunks[0].tokens) == (1, 3, 30)
+    assert chunks[0].text == "a" * 40 + "b" * 40 + "c" * 40
+
+
+def test_chunks_break_between_pages_and_keep_page_ranges():
+    chunks = chunk_pages(["a" * 240, "b" * 240, "c" * 240], max_tokens=100)
+    assert [(c.first_page, c.last_page) for c in chunks] == [(1, 1), (2, 2), (3, 3)]
+    assert all(c.tokens <= 100 for c in chunks)
+
+
+def test_oversized_page_is_split_at_section_headings():
+    page = "1. Scope\n" + "s" * 300 + "\n2. Test results\n" + "r" * 300 + "\n"
+    chunks = chunk_pages(["intro", page], max_tokens=100)
+    assert all(c.tokens <= 100 for c in chunks)
+    assert [(c.first_page, c.last_page) for c in chunks] == [(1, 2), (2, 2)]
+    assert chunks[0].text.startswith("intro1. Scope")
+    assert chunks[1].text.startswith("2. Test results")
+    assert "".join(c.text for c in chunks) == "intro" + page
+
+
+def test_text_without_breaks_is_cut_to_the_budget():
+    chunks = chunk_pages(["z" * 1000], max_tokens=100)
+    assert [c.tokens for c in chunks] == [100, 100, 50]
+    assert all((c.first_page, c.last_page) == (1, 1) for c in chunks)
+
+
+def test_structured_headings_start_sections():
+    page = "## Declaration\n" + "d" * 500 + "\n## Signature\n" + "s" * 100
+    chunks = chunk_pages([page], max_tokens=150)
+    assert chunks[-1].text.startswith("## Signature")
+    assert estimate_tokens("") == 0
+    assert chunk_pages([]) == []
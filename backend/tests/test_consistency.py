@@ -0,0 +1,67 @@
+import pytest
+
+from utils.consistency import ConsistencyChecker, extract_entities, identity_keys
+
+
+@pytest.mark.parametrize("text, model, manufacturer", [
+    ("Model: Y-200. Manufacturer: Other Ltd. Standard EN 55032", "Y-200", "Other Ltd"),
+    ("Model: X100 Pro Manufacturer: ACME GmbH Address: Main Street 1", "X100 Pro", "ACME GmbH"),
+    ("Type: EX 200 B complies with Directive 2014/30/EU. Manufactured by Foo Bar Inc. The product is safe",
+     "EX 200 B", "Foo Bar Inc"),
+    ("Model No.: EX-200\nManufacturer: Example Devices GmbH, 12 Industrie Street", "EX-200", "Example Devices GmbH"),
+])
+def test_identities_stop_at_the_next_field(text, model, manufacturer):
+    entities = extract_entities(text)
+    assert entities["model"] == [model]
+    assert entities["manufacturer"] == [manufacturer]
+
+
+def test_model_keeps_inner_dots():
+    assert extract_entities("Model: v2.1.3-rc.")["model"] == ["v2.1.3-rc"]
+
+
+def test_extracts_directives_standards_and_dates():
+    entities = extract_entities(
+        "Complies with Directive 2014/35/EU and Regulation (EU) No 2023/988. "
+        "Standards: EN IEC 62368-1:2020, EN 55032:2015. Notified body No. 0123. Date of issue: 12.03.2024"
+    )
+    assert entities["directive"] == ["2014/35", "2023/988"]
+    assert entities["standard"] == ["EN IEC 62368-1:2020", "EN 55032:2015"]
+    assert entities["notified_body"] == ["0123"]
+    assert entities["issue_date"] == ["12.03.2024"]
+
+
+def test_identity_keys_ignore_formatting_and_legal_suffix():
+    a = identity_keys({"model": ["EX-200"], "manufacturer": ["Example Devices GmbH"]})
+    b = identity_keys({"model": ["ex 200"], "manufacturer": ["EXAMPLE DEVICES"]})
+    assert a == b
+
+
+def _doc(name, document_type, text):
+    return {"filename": name, "document_type": document_type, "entities": extract_entities(text)}
+
+
+def test_checker_flags_mismatches_by_rules():
+    checker = ConsistencyChecker(analyzer=object())
+    result = checker.check([
+        _doc("doc.pdf", "declaration_of_conformity",
+             "Model: EX-200. Manufacturer: Example Devices GmbH. Standards: EN 55032:2015, EN 62368-1:2014"),
+        _doc("report.pdf", "test_reports",
+             "Model: QZ-9. Manufacturer: Example Devices GmbH. Tested to EN 55032:2012"),
+    ])
+    checks = {finding["check"] for finding in result["findings"]}
+    assert "model_mismatch" in checks
+    assert "manufacturer_mismatch" not in checks
+    assert "standard_not_covered" in checks
+    assert "standard_version_mismatch" in checks
+    assert result["documents_checked"] == 2
+    assert result["llm_pairs"] == 0
+
+
+def test_checker_consistent_documents():
+    text = "Model: EX-200. Manufacturer: Example Devices GmbH. Standard EN 55032:2015"
+    result = ConsistencyChecker(analyzer=object()).check([
+        _doc("doc.pdf", "declaration_of_conformity", text),
+        _doc("report.pdf", "test_reports", text),
+    ])
+    assert result["consistent"], result["findings"]
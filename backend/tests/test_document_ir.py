@@ -0,0 +1,115 @@
+from array import array
+
+import pytest
+
+from utils import document_ir, pipeline
+from utils.document_ir import BLOCK_HEADING, BLOCK_TABLE, BLOCK_TEXT, LINE_START, DocumentIR
+
+
+def _page(blocks, tables=()):
+    """
+    IR of one page. blocks: (kind, table, [span texts, each starting a line]);
+    tables: rows of cells
+    """
+    spans, cells = [], []
+    ir = DocumentIR(
+        page_size=array("f", [595, 842]), page_blocks=array("I", [0, len(blocks)]),
+        page_tables=array("I", [0, len(tables)]), block_spans=array("I", [0]), span_text=array("I", [0]),
+        table_cells=array("I", [0]), cell_text=array("I", [0]),
+    )
+    for kind, table, texts in blocks:
+        ir.block_kind.append(kind)
+        ir.block_bbox.extend((50, 50, 500, 80))
+        ir.block_table.append(table)
+        for text in texts:
+            spans.append(text)
+            ir.span_text.append(ir.span_text[-1] + len(text))
+            ir.span_size.append(10.0)
+            ir.span_flags.append(LINE_START)
+        ir.block_spans.append(len(ir.span_size))
+    for rows in tables:
+        ir.table_bbox.extend((50, 100, 500, 300))
+        ir.table_shape.extend((len(rows), len(rows[0])))
+        for row in rows:
+            for cell in row:
+                cells.append(cell)
+                ir.cell_text.append(ir.cell_text[-1] + len(cell))
+        ir.table_cells.append(len(ir.cell_text) - 1)
+    ir.span_pool = "".join(spans)
+    ir.cell_pool = "".join(cells)
+    return ir
+
+
+DOC_PAGE = _page(
+    [(BLOCK_HEADING, -1, ["EU Declaration of Conformity"]),
+     (BLOCK_TEXT, -1, ["This declaration is issued under the sole", "responsibility of the manufacturer."]),
+     (BLOCK_TABLE, 0, ["Model"])],
+    [[["Model", "EX-200"], ["Manufacturer:", "Example Devices GmbH"], ["", "12 Industrie Street"]]],
+)
+RESULTS_PAGE = _page([], [[["Standard", "Result"], ["EN 55032:2015", "Pass"], ["EN 61000-3-2:2019", "Pass"]]])
+
+
+def test_page_text_marks_headings_and_renders_field_tables():
+    assert DOC_PAGE.page_texts() == [
+        "## EU Declaration of Conformity\n\n"
+        "This declaration is issued under the sole\nresponsibility of the manufacturer.\n\n"
+        "Model: EX-200\nManufacturer: Example Devices GmbH\n  12 Industrie Street\n"
+    ]
+
+
+def test_field_tables_feed_entity_extraction():
+    from utils.consistency import extract_entities
+
+    entities = extract_entities("".join(DOC_PAGE.page_texts()))
+    assert entities["model"] == ["EX-200"]
+    assert entities["manufacturer"] == ["Example Devices GmbH"]
+
+
+def test_data_tables_stay_pipe_delimited():
+    assert RESULTS_PAGE.pages[0].text == (
+        "| Standard | Result |\n| EN 55032:2015 | Pass |\n| EN 61000-3-2:2019 | Pass |\n"
+    )
+
+
+def test_round_trip_and_concat():
+    restored = DocumentIR.from_bytes(DOC_PAGE.to_bytes())
+    assert restored.page_texts() == DOC_PAGE.page_texts()
+
+    merged = DocumentIR.concat([DOC_PAGE, RESULTS_PAGE, DOC_PAGE])
+    assert merged.page_count == 3
+    assert merged.page_texts() == DOC_PAGE.page_texts() + RESULTS_PAGE.page_texts() + DOC_PAGE.page_texts()
+    assert [table.index for table in merged.pages[2].tables] == [2]
+    assert merged.pages[2].blocks[2].table == 2
+
+
+def test_from_bytes_rejects_other_versions():
+    data = bytearray(DOC_PAGE.to_bytes())
+    data[4] += 1
+    with pytest.raises(ValueError):
+        DocumentIR.from_bytes(bytes(data))
+
+
+def test_extraction_mode_is_part_of_the_prompt_version(monkeypatch):
+    text_version = pipeline.prompt_version_for("declaration_of_conformity", None)
+    text_key = pipeline.cache_key_for("abc", "declaration_of_conformity", None)
+
+    monkeypatch.setattr(document_ir, "STRUCTURED_EXTRACTION", True)
+    monkeypatch.setattr(pipeline, "STRUCTURED_EXTRACTION", True)
+    structured_version = pipeline.prompt_version_for("declaration_of_conformity", None)
+    assert structured_version.startswith(text_version + ":ir")
+    assert pipeline.cache_key_for("abc", "declaration_of_conformity", None) != text_key
+
+
+def test_ir_cache_key_follows_table_detection(monkeypatch):
+    builds = []
+
+    def build(source, parser):
+        builds.append(document_ir.IR_DETECT_TABLES)
+        return DOC_PAGE
+
+    monkeypatch.setattr(document_ir, "_cache", document_ir.IRCache(":memory:"))
+    monkeypatch.setattr(document_ir, "build_document_ir", build)
+    for detect_tables in (True, False, True):
+        monkeypatch.setattr(document_ir, "IR_DETECT_TABLES", detect_tables)
+        document_ir.load_document_ir(b"%PDF", "abc")
+    assert builds == [True, False]
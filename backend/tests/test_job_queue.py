@@ -0,0 +1,90 @@
+import time
+
+import pytest
+
+from utils.job_queue import FAILED, QUEUED, RUNNING, SUCCEEDED, JobQueue, QueueFull, WorkerPool
+
+
+@pytest.fixture
+def queue(tmp_path):
+    return JobQueue(str(tmp_path / "jobs.sqlite3"), max_pending=10)
+
+
+def _age_heartbeat(queue, job_id, seconds):
+    queue._conn().execute("UPDATE jobs SET heartbeat_at = heartbeat_at - ? WHERE id = ?", (seconds, job_id))
+
+
+def test_claim_records_the_worker(queue):
+    job_id = queue.enqueue("analyze_upload", {"n": 1})
+    job = queue.claim("host:1:a")
+    assert job["id"] == job_id and job["status"] == RUNNING
+    assert job["claimed_by"] == "host:1:a" and job["heartbeat_at"] is not None
+    assert queue.claim("host:1:a") is None
+
+
+def test_only_jobs_without_recent_heartbeat_are_requeued(queue):
+    alive = queue.enqueue("analyze_upload", {})
+    dead = queue.enqueue("analyze_upload", {})
+    queue.claim("host:1:a")
+    queue.claim("host:2:b")
+    _age_heartbeat(queue, alive, 120)
+    _age_heartbeat(queue, dead, 120)
+    queue.heartbeat([alive], "host:1:a")
+
+    assert queue.requeue_stale(60) == 1
+    assert queue.get(alive)["status"] == RUNNING
+    requeued = queue.get(dead)
+    assert requeued["status"] == QUEUED and requeued["claimed_by"] is None
+
+
+def test_requeued_job_cannot_be_finished_by_its_old_worker(queue):
+    job_id = queue.enqueue("analyze_upload", {})
+    queue.claim("host:1:a")
+    _age_heartbeat(queue, job_id, 120)
+    queue.requeue_stale(60)
+    queue.claim("host:2:b")
+
+    assert not queue.complete(job_id, {"stale": True}, "host:1:a")
+    assert queue.complete(job_id, {"ok": True}, "host:2:b")
+    job = queue.get(job_id)
+    assert job["status"] == SUCCEEDED and job["result"] == {"ok": True}
+
+
+def test_shops_are_interleaved(queue):
+    for i in range(3):
+        queue.enqueue("analyze_upload", {"i": i}, shop="busy.myshopify.com")
+    queue.enqueue("analyze_upload", {"i": "other"}, shop="quiet.myshopify.com")
+    order = [queue.claim()["shop"] for _ in range(4)]
+    assert order.index("quiet.myshopify.com") <= 1
+
+
+def test_queue_full(tmp_path):
+    queue = JobQueue(str(tmp_path / "jobs.sqlite3"), max_pending=1)
+    queue.enqueue("analyze_upload", {})
+    with pytest.raises(QueueFull):
+        queue.enqueue("analyze_upload", {})
+
+
+def test_pool_runs_jobs_and_records_failures(queue):
+    def handler(payload):
+        if payload.get("fail"):
+            raise RuntimeError("boom")
+        return {"double": payload["n"] * 2}
+
+    pool = WorkerPool(queue, {"analyze_upload": handler}, workers=2, poll_interval=0.05,
+                      heartbeat_interval=0.05, heartbeat_timeout=5)
+    ok = queue.enqueue("analyze_upload", {"n": 21})
+    failing = queue.enqueue("analyze_upload", {"fail": True})
+    unknown = queue.enqueue("other", {})
+    pool.start()
+    try:
+        deadline = time.time() + 5
+        while time.time() < deadline and queue.pending():
+            time.sleep(0.02)
+    finally:
+        pool.stop()
+
+    assert queue.get(ok)["result"] == {"double": 42}
+    assert queue.get(failing)["status"] == FAILED and queue.get(failing)["error"] == "boom"
+    assert queue.get(unknown)["status"] == FAILED
+    assert queue.get(ok)["claimed_by"] == pool.worker_id
@@ -0,0 +1,64 @@
+from concurrent.futures import ThreadPoolExecutor
+
+from utils import metrics
+from utils.metrics import (
+    Registry, add_usage, begin_document, begin_request, current_labels, drain_usage, propagate, set_labels, stage
+)
+
+
+def _registry():
+    registry = Registry()
+    counter = registry.counter("test_total", "Test counter", ("kind",))
+    histogram = registry.histogram("test_seconds", "Test histogram", buckets=(0.1, 1.0))
+    return registry, counter, histogram
+
+
+def test_multiprocess_render_sums_every_process_file(tmp_path, monkeypatch):
+    worker_a, counter_a, histogram_a = _registry()
+    worker_b, counter_b, histogram_b = _registry()
+    worker_a.directory = worker_b.directory = str(tmp_path)
+    counter_a.inc(2, kind="x")
+    histogram_a.observe(0.05)
+    counter_b.inc(3, kind="x")
+    counter_b.inc(1, kind="y")
+    histogram_b.observe(0.5)
+    # Another process's file, as its flusher would have written it
+    with monkeypatch.context() as patch:
+        patch.setattr(metrics.os, "getpid", lambda: 1)
+        worker_b.flush()
+
+    text = worker_a.render()
+    assert 'test_total{kind="x"} 5' in text
+    assert 'test_total{kind="y"} 1' in text
+    assert 'test_seconds_bucket{le="0.1"} 1' in text
+    assert 'test_seconds_bucket{le="1"} 2' in text
+    assert "test_seconds_count 2" in text
+
+
+def test_single_process_render():
+    registry, counter, _ = _registry()
+    counter.inc(kind="x")
+    assert 'test_total{kind="x"} 1' in registry.render()
+
+
+def test_batch_threads_keep_request_context_with_own_labels():
+    request = begin_request()
+    set_labels("declaration_of_conformity", "electronics")
+
+    @propagate
+    def analyze(document_type):
+        timings = begin_document()
+        set_labels(document_type, "electronics")
+        with stage("extract"):
+            add_usage("pages", 3)
+        return timings.parent, current_labels()["document_type"], drain_usage()
+
+    with ThreadPoolExecutor(max_workers=2) as pool:
+        results = list(pool.map(analyze, ["test_reports", "user_manual"]))
+
+    assert [parent for parent, _, _ in results] == [request, request]
+    assert [labels for _, labels, _ in results] == ["test_reports", "user_manual"]
+    assert [usage for _, _, usage in results] == [{"pages": 3}, {"pages": 3}]
+    assert "extract" in request.stages
+    assert current_labels()["document_type"] == "declaration_of_conformity"
+    assert drain_usage() == {}
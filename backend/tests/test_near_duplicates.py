@@ -0,0 +1,58 @@
+import pytest
+
+from utils.consistency import extract_entities, identity_keys
+from utils.near_duplicates import NearDuplicateIndex, delta_key
+from utils.prescreen import prescreen
+
+np = pytest.importorskip("numpy")
+
+from utils.near_duplicates import minhash_signature  # noqa: E402
+
+TEMPLATE = """
+EU DECLARATION OF CONFORMITY
+Manufacturer: {manufacturer}
+Model: {model}
+This declaration is issued under the sole responsibility of the manufacturer.
+The product complies with Directive 2014/35/EU and Directive 2014/30/EU.
+Harmonised standards: EN 62368-1:2014+A11:2017, EN 55032:2015, EN 55035:2017
+The object of the declaration described above is in conformity with the relevant
+Union harmonisation legislation. Technical documentation is kept at the address
+of the manufacturer and is available to the market surveillance authorities on
+request for a period of ten years after the product has been placed on the market.
+Place and date of issue: Berlin, 12.03.2024
+"""
+
+
+def _document(model="EX-200", manufacturer="Example Devices GmbH"):
+    return TEMPLATE.format(model=model, manufacturer=manufacturer)
+
+
+def _delta(text):
+    return delta_key(prescreen(text, "declaration_of_conformity"), identity_keys(extract_entities(text)))
+
+
+def test_group_key_is_scoped_by_shop():
+    a = NearDuplicateIndex.group_key("a.myshopify.com", "declaration_of_conformity", None, "v1")
+    b = NearDuplicateIndex.group_key("b.myshopify.com", "declaration_of_conformity", None, "v1")
+    assert a != b
+
+
+def test_delta_key_differs_by_model():
+    assert _delta(_document(model="EX-200")) != _delta(_document(model="EX-300"))
+    assert _delta(_document()) == _delta(_document())
+
+
+def test_find_only_matches_within_group():
+    index = NearDuplicateIndex(":memory:", threshold=0.8)
+    signature = minhash_signature(_document())
+    group = NearDuplicateIndex.group_key("a.myshopify.com", "declaration_of_conformity", None, "v1")
+    other = NearDuplicateIndex.group_key("b.myshopify.com", "declaration_of_conformity", None, "v1")
+    index.add(signature, "cache-a", group, "delta")
+
+    match = index.find(minhash_signature(_document(model="EX-300")), group)
+    assert match is not None and match[0] == "cache-a" and match[2] >= 0.8
+    assert index.find(signature, other) is None
+
+
+def test_short_text_has_no_signature():
+    assert minhash_signature("too short to shingle") is None
@@ -0,0 +1,57 @@
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+
+from utils import ocr
+from utils.ocr import OcrCache
+
+
+def test_cache_returns_text_including_blank_scans():
+    cache = OcrCache(":memory:")
+    cache.set("scan", "Test report no. 42")
+    cache.set("blank", "")
+    assert cache.get("scan") == "Test report no. 42"
+    assert cache.get("blank") == ""
+    assert cache.get("unknown") is None
+
+
+def test_failures_are_remembered_until_the_ttl_expires(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(ocr.time, "time", lambda: now[0])
+    cache = OcrCache(":memory:", failure_ttl=900)
+    cache.set_failed("slow")
+    assert cache.get("slow") is None
+    assert cache.recently_failed("slow")
+
+    now[0] += 901
+    assert not cache.recently_failed("slow")
+    cache.set("slow", "Recovered text")
+    assert cache.get("slow") == "Recovered text"
+    assert not cache.recently_failed("slow")
+
+
+def test_missing_tesseract_is_reported_without_touching_the_pdf(monkeypatch):
+    monkeypatch.setattr(ocr, "OCR_ENABLED", True)
+    monkeypatch.setattr(ocr, "TESSDATA_PREFIX", None)
+    pages = ["A page with its own text layer, long enough", "", " "]
+    assert ocr.ocr_missing_pages(b"not opened", pages) == (pages, {"unavailable": 2})
+
+
+def test_pages_share_one_deadline():
+    release = threading.Event()
+    done = Future()
+    done.set_result("fast")
+    cache = OcrCache(":memory:")
+    # One worker: the slow page is running at the deadline, the last one still queued
+    pool = ThreadPoolExecutor(max_workers=1)
+    try:
+        futures = {0: done, 1: pool.submit(release.wait, 5), 2: pool.submit(str, "queued")}
+        started = time.monotonic()
+        texts, outcomes = ocr._collect(futures, {0: "k0", 1: "k1", 2: "k2"}, cache, timeout=0.2)
+        assert time.monotonic() - started < 1
+    finally:
+        release.set()
+        pool.shutdown()
+    assert texts == {0: "fast"}
+    assert outcomes == {"ocr": 1, "failed": 1, "skipped": 1}
+    assert cache.recently_failed("k1") and not cache.recently_failed("k2")
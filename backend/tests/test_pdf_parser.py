@@ -0,0 +1,61 @@
+import os
+import threading
+import time
+
+from utils import pdf_parser
+from utils.pdf_parser import PageRangeJob
+
+PDF = b"%PDF-1.4\n" + b"x" * 100_000
+
+
+def _range_info(path, start, stop):
+    with open(path, "rb") as f:
+        return type(path).__name__, len(f.read()), start, stop
+
+
+def test_in_memory_source_is_shared_through_one_temp_file(tmp_path, monkeypatch):
+    monkeypatch.setattr(pdf_parser, "SHARE_DIR", str(tmp_path))
+    job = PageRangeJob(_range_info, PDF, page_count=10, workers=2)
+    try:
+        results = list(job.results())
+        assert len(os.listdir(tmp_path)) == 1
+    finally:
+        job.close()
+
+    assert [(start, stop) for _, _, start, stop in results] == [(i, i + 2) for i in range(0, 10, 2)]
+    assert all(kind == "str" and size == len(PDF) for kind, size, _, _ in results)
+    assert os.listdir(tmp_path) == []
+
+
+def test_path_source_is_passed_through(tmp_path, monkeypatch):
+    monkeypatch.setattr(pdf_parser, "SHARE_DIR", str(tmp_path / "share"))
+    path = tmp_path / "upload.pdf"
+    path.write_bytes(PDF)
+    job = PageRangeJob(_range_info, str(path), page_count=3, workers=1)
+    try:
+        assert [size for _, size, _, _ in job.results()] == [len(PDF)] * 3
+    finally:
+        job.close()
+    assert path.exists()
+    assert not (tmp_path / "share").exists()
+
+
+def test_concurrent_first_requests_share_one_pool(monkeypatch):
+    created = []
+
+    class SlowPool:
+        def __init__(self, max_workers):
+            time.sleep(0.05)
+            created.append(self)
+
+    monkeypatch.setattr(pdf_parser, "ProcessPoolExecutor", SlowPool)
+    monkeypatch.setattr(pdf_parser, "_pool", None)
+    monkeypatch.setattr(pdf_parser, "_pool_workers", 0)
+    pools = []
+    threads = [threading.Thread(target=lambda: pools.append(pdf_parser._get_pool(3))) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert len(created) == 1
+    assert all(pool is created[0] for pool in pools)
@@ -0,0 +1,53 @@
+from utils.prescreen import PRESCREEN_MIN_CHARS, prescreen, prescreen_prompt_section, scan
+
+DOC_TEXT = """
+EU DECLARATION OF CONFORMITY
+Manufacturer: Example Devices GmbH, 12 Industrie Street, 10115 Berlin
+Model No.: EX-200
+This declaration is issued under the sole responsibility of the manufacturer.
+The product complies with Directive 2014/35/EU and Directive 2014/30/EU.
+Harmonised standards: EN 62368-1:2014+A11:2017, EN 55032:2015
+Place and date of issue: Berlin, 12.03.2024
+Signed for and on behalf of Example Devices GmbH
+"""
+
+
+def test_scan_collects_evidence_per_rule():
+    evidence = scan(DOC_TEXT)
+    assert "2014/35/EU" in evidence["directive"]
+    assert any(value.startswith("EN 55032") for value in evidence["standard"])
+    assert "sole_responsibility" in evidence
+
+
+def test_short_text_is_empty():
+    assert prescreen("Page 1", "declaration_of_conformity").decision == "empty"
+
+
+def test_long_text_without_rule_hits_is_not_empty():
+    german_manual = ("Bitte lesen Sie diese Anleitung vor dem ersten Gebrauch sorgfältig durch. "
+                     "Das Gerät darf nur in trockenen Räumen betrieben werden. ") * 5
+    assert len(german_manual) > PRESCREEN_MIN_CHARS
+    result = prescreen(german_manual, "user_manual")
+    assert result.decision == "partial"
+    assert result.evidence == {}
+
+
+def test_complete_declaration_is_a_hint_with_all_items_satisfied():
+    result = prescreen(DOC_TEXT, "declaration_of_conformity")
+    assert result.decision == "complete"
+    assert not result.unresolved
+
+
+def test_prompt_section_does_not_tell_the_model_to_skip_checks():
+    section = prescreen_prompt_section(prescreen(DOC_TEXT, "test_reports"))
+    assert "do not re-check" not in section
+    assert "still check" in section
+
+
+def test_complete_prescreen_does_not_skip_the_model_by_default():
+    from utils.ce_analyzer import CEAnalyzer
+
+    text = ("This risk assessment covers the product. Safety information is in the manual. " * 4)
+    screen = prescreen(text, "risk_assessment")
+    assert screen.decision == "complete"
+    assert CEAnalyzer()._prescreen_shortcut(screen, "risk_assessment", None) is None
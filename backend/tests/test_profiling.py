@@ -0,0 +1,50 @@
+import json
+import os
+import pstats
+import threading
+import time
+
+from utils.profiling import RequestProfiler, sign_profile_request
+
+
+def _spin_in_worker(stop):
+    while not stop.is_set():
+        sum(range(1000))
+
+
+def test_profile_covers_other_threads(tmp_path):
+    profiler = RequestProfiler(str(tmp_path), secret="s3cret", interval=0.001)
+    stop = threading.Event()
+    worker = threading.Thread(target=_spin_in_worker, args=(stop,), name="chunk-worker")
+    sampler = profiler.start()
+    worker.start()
+    time.sleep(0.1)
+    stop.set()
+    worker.join()
+    name = profiler.finish(sampler, {"trigger": "signed"})
+
+    stats = pstats.Stats(os.path.join(str(tmp_path), f"{name}.prof"))
+    functions = {func[2] for func in stats.stats}
+    assert "_spin_in_worker" in functions
+    assert "chunk-worker" in functions
+    with open(os.path.join(str(tmp_path), f"{name}.json")) as f:
+        metadata = json.load(f)
+    assert metadata["samples"] > 0
+    assert "chunk-worker" in metadata["threads"]
+    assert "profile-sampler" not in metadata["threads"]
+    assert profiler.list()[0]["name"] == name
+
+
+def test_ring_keeps_newest_profiles(tmp_path):
+    profiler = RequestProfiler(str(tmp_path), max_profiles=2, secret="s3cret", interval=0.001)
+    names = [profiler.finish(profiler.start(), {}) for _ in range(3)]
+    assert [profile["name"] for profile in profiler.list()] == names[:0:-1]
+    assert profiler.path_for(names[0]) is None
+    assert profiler.path_for("../etc/passwd") is None
+
+
+def test_signed_trigger():
+    profiler = RequestProfiler("unused", secret="s3cret")
+    assert profiler.trigger(sign_profile_request("s3cret")) == "signed"
+    assert profiler.trigger(sign_profile_request("other")) is None
+    assert profiler.trigger(sign_profile_request("s3cret", time.time() - 3600)) is None
@@ -0,0 +1,69 @@
+import pytest
+
+from utils import results_store
+from utils.results_store import SQLiteResultsStore, decode_cursor, encode_cursor
+
+
+def _response(file_id, document_type="test_report", risk_level="LOW"):
+    return {
+        "file_id": file_id, "filename": f"{file_id}.pdf", "document_type": document_type,
+        "analysis": {"risk_level": risk_level, "confidence_score": 0.9, "compliance_gaps": [{"gap": 1}]},
+    }
+
+
+@pytest.fixture
+def store(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(results_store.time, "time", lambda: now[0])
+    store = SQLiteResultsStore(":memory:")
+    # Results share timestamps in pairs, so pages have to break ties by file_id
+    for index in range(7):
+        now[0] += index % 2
+        store.save("shop-a.myshopify.com", _response(f"f{index}", risk_level="HIGH" if index % 3 == 0 else "LOW"))
+    store.save("shop-b.myshopify.com", _response("other"))
+    return store
+
+
+def _all_pages(store, **filters):
+    pages, cursor = [], None
+    while True:
+        rows, cursor = store.query("shop-a.myshopify.com", cursor=cursor, **filters)
+        pages.append([row["file_id"] for row in rows])
+        if cursor is None:
+            return pages
+
+
+def test_pages_cover_every_row_once_newest_first(store):
+    pages = _all_pages(store, limit=2)
+    assert pages == [["f6", "f5"], ["f4", "f3"], ["f2", "f1"], ["f0"]]
+
+
+def test_exact_last_page_has_no_cursor(store):
+    rows, cursor = store.query("shop-a.myshopify.com", limit=7)
+    assert len(rows) == 7 and cursor is None
+
+
+def test_filters_apply_across_pages(store):
+    assert _all_pages(store, risk_level="HIGH", limit=1) == [["f6"], ["f3"], ["f0"]]
+    rows, _ = store.query("shop-a.myshopify.com", since=1002.0, until=1003.0)
+    assert [row["file_id"] for row in rows] == ["f4", "f3"]
+
+
+def test_results_are_scoped_to_the_shop(store):
+    assert [row["file_id"] for row in store.query("shop-b.myshopify.com")[0]] == ["other"]
+    assert store.get("other", "shop-a.myshopify.com") is None
+    assert store.get("other", "shop-b.myshopify.com")["filename"] == "other.pdf"
+
+
+def test_summaries_and_full_export(store):
+    rows, _ = store.query("shop-a.myshopify.com", limit=1)
+    assert rows[0]["gap_count"] == 1 and "analysis" not in rows[0]
+    exported = list(store.export("shop-a.myshopify.com", batch_size=3))
+    assert [row["file_id"] for row in exported] == ["f6", "f5", "f4", "f3", "f2", "f1", "f0"]
+    assert exported[0]["analysis"]["risk_level"] == "HIGH"
+
+
+def test_cursor_round_trip_and_rejection():
+    assert decode_cursor(encode_cursor(1234.5, "f1")) == (1234.5, "f1")
+    with pytest.raises(ValueError):
+        decode_cursor("not a cursor")
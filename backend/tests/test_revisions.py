@@ -0,0 +1,88 @@
+from utils.revisions import Lineage, RevisionStore, diff_pages, document_stem, lineage_for, page_fingerprint
+
+
+def test_document_stem_drops_revision_markers():
+    assert document_stem("DoC_v2.pdf") == "doc"
+    assert document_stem("Risk-Assessment rev3 (1).pdf") == "risk assessment"
+
+
+def test_lineage_requires_shop_and_supplier():
+    assert lineage_for("declaration_of_conformity.pdf").key is None
+    assert lineage_for("doc.pdf", shop="a.myshopify.com").key is None
+    assert lineage_for("doc.pdf", supplier="ACME").key is None
+
+
+def test_lineage_groups_revisions_of_one_supplier_document():
+    first = lineage_for("DoC_v1.pdf", supplier="ACME", shop="a.myshopify.com")
+    second = lineage_for("doc-v2.pdf", supplier=" acme ", shop="a.myshopify.com")
+    assert first.key is not None and first.key == second.key
+    assert lineage_for("doc.pdf", supplier="ACME", shop="b.myshopify.com").key != first.key
+    assert lineage_for("doc.pdf", supplier="Other", shop="a.myshopify.com").key != first.key
+
+
+def test_explicit_parent_is_kept_for_a_verified_shop_only():
+    assert lineage_for("doc.pdf", parent_file_id="f1", shop="a.myshopify.com").parent_file_id == "f1"
+    assert lineage_for("doc.pdf", parent_file_id="f1").empty
+
+
+def test_page_fingerprint_ignores_whitespace_and_case():
+    assert page_fingerprint("Model  X\n200") == page_fingerprint("model x 200")
+
+
+def test_diff_pages_treats_moved_pages_as_unchanged():
+    diff = diff_pages(["a", "b", "c"], ["c", "a", "b"])
+    assert diff.unchanged
+    assert diff.shared_ratio == 1.0
+
+
+def test_diff_pages_counts_edits_and_removals():
+    diff = diff_pages(["a", "b", "c", "d"], ["a", "x", "c"])
+    assert diff.changed == [1]
+    assert diff.removed == 2
+    assert diff.changed_ratio == 1.0
+    assert diff.shared_ratio == 0.5
+
+
+def test_shared_ratio_of_unrelated_documents_is_zero():
+    assert diff_pages(["a", "b"], ["x", "y", "z"]).shared_ratio == 0.0
+
+
+def test_store_finds_latest_revision_of_lineage():
+    store = RevisionStore(":memory:")
+    lineage = Lineage("k", None, "a.myshopify.com")
+    store.record(lineage, "f1", "manual", None, "p1", ["a"], {"risk_level": "LOW"})
+    store.record(lineage, "f2", "manual", None, "p1", ["a", "b"], {"risk_level": "HIGH"})
+    prior = store.find_prior(lineage, "manual", None, "p1")
+    assert prior["file_id"] == "f2"
+    assert prior["fingerprints"] == ["a", "b"]
+    assert store.find_prior(lineage, "manual", None, "p2") is None
+    assert store.find_prior(Lineage(None, "f1", "a.myshopify.com"), "manual", None, "p1")["result"] == {"risk_level": "LOW"}
+
+
+def test_parent_file_id_of_another_shop_is_not_found():
+    store = RevisionStore(":memory:")
+    store.record(Lineage("k", None, "a.myshopify.com"), "f1", "manual", None, "p1", ["a"], {"risk_level": "LOW"})
+    assert store.find_prior(Lineage(None, "f1", "b.myshopify.com"), "manual", None, "p1") is None
+    assert store.find_prior(Lineage(None, "f1"), "manual", None, "p1") is None
+
+
+def test_uploads_without_a_lineage_are_not_recorded(monkeypatch):
+    from utils import pipeline
+
+    monkeypatch.setattr(pipeline, "prompt_version_for", lambda document_type, product_category: "p1")
+    store = RevisionStore(":memory:")
+    pipeline.record_revision(store, Lineage(None, None, "a.myshopify.com"), "f1", ["a"], "manual", None, {})
+    assert store._conn.execute("SELECT COUNT(*) FROM revisions").fetchone()[0] == 0
+
+
+def test_explicit_parent_still_needs_shared_pages(monkeypatch):
+    from utils import pipeline
+
+    monkeypatch.setattr(pipeline, "prompt_version_for", lambda document_type, product_category: "p1")
+    document_type = pipeline.CE_DOCUMENT_TYPES[0]
+    store = RevisionStore(":memory:")
+    lineage = Lineage(None, "f1", "a.myshopify.com")
+    store.record(lineage, "f1", document_type, None, "p1",
+                 [page_fingerprint(page) for page in ("one", "two")], {"risk_level": "LOW"})
+    assert pipeline.find_revision(["one", "three"], document_type, None, lineage, store) is not None
+    assert pipeline.find_revision(["other", "pages"], document_type, None, lineage, store) is None
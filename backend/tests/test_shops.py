@@ -0,0 +1,83 @@
+import base64
+import hashlib
+import hmac
+import json
+import time
+
+import pytest
+
+from utils.shops import ShopAuthError, authenticated_shop, is_valid_shopify_shop
+
+SECRET = "app-secret"
+SHOP = "demo.myshopify.com"
+
+
+def b64(data: bytes) -> str:
+    return base64.urlsafe_b64encode(data).rstrip(b"=").decode("ascii")
+
+
+def session_token(payload, secret=SECRET, alg="HS256"):
+    signing_input = f"{b64(json.dumps({'alg': alg, 'typ': 'JWT'}).encode())}.{b64(json.dumps(payload).encode())}"
+    signature = hmac.new(secret.encode(), signing_input.encode(), hashlib.sha256).digest()
+    return f"{signing_input}.{b64(signature)}"
+
+
+def signed_query(params, secret=SECRET):
+    message = "&".join(f"{key}={value}" for key, value in sorted(params.items()))
+    return {**params, "hmac": hmac.new(secret.encode(), message.encode(), hashlib.sha256).hexdigest()}
+
+
+def valid_payload(**overrides):
+    now = int(time.time())
+    return {"dest": f"https://{SHOP}", "aud": "key", "exp": now + 60, "nbf": now - 5, **overrides}
+
+
+def test_shop_domain_validation():
+    assert is_valid_shopify_shop(SHOP)
+    assert not is_valid_shopify_shop("evil.com")
+    assert not is_valid_shopify_shop("")
+
+
+def test_session_token_proves_the_shop():
+    token = session_token(valid_payload())
+    assert authenticated_shop({}, f"Bearer {token}", SECRET, "key") == SHOP
+
+
+@pytest.mark.parametrize("token", [
+    session_token(valid_payload(), secret="other"),
+    session_token(valid_payload(exp=int(time.time()) - 3600)),
+    session_token(valid_payload(aud="another-app")),
+    session_token(valid_payload(dest="https://evil.com")),
+    session_token(valid_payload(), alg="none"),
+    "not.a.token",
+])
+def test_invalid_session_tokens_are_refused(token):
+    with pytest.raises(ShopAuthError):
+        authenticated_shop({}, f"Bearer {token}", SECRET, "key")
+
+
+def test_session_token_must_match_the_shop_parameter():
+    token = session_token(valid_payload())
+    with pytest.raises(ShopAuthError):
+        authenticated_shop({"shop": "other.myshopify.com"}, f"Bearer {token}", SECRET)
+
+
+def test_signed_query_proves_the_shop():
+    args = signed_query({"shop": SHOP, "timestamp": str(int(time.time())), "risk_level": "HIGH"})
+    assert authenticated_shop(args, None, SECRET) == SHOP
+
+
+def test_tampered_or_stale_queries_are_refused():
+    args = signed_query({"shop": SHOP, "timestamp": str(int(time.time()))})
+    with pytest.raises(ShopAuthError):
+        authenticated_shop({**args, "shop": "other.myshopify.com"}, None, SECRET)
+    stale = signed_query({"shop": SHOP, "timestamp": str(int(time.time()) - 3600)})
+    with pytest.raises(ShopAuthError):
+        authenticated_shop(stale, None, SECRET)
+
+
+def test_unsigned_requests_and_missing_secret_are_refused():
+    with pytest.raises(ShopAuthError):
+        authenticated_shop({"shop": SHOP}, None, SECRET)
+    with pytest.raises(ShopAuthError):
+        authenticated_shop({"shop": SHOP}, None, None)
@@ -0,0 +1,52 @@
+import json
+
+from utils.structured_output import parse_json_response, repair_truncated_json, validate_ce_analysis
+
+COMPLETE = {"risk_level": "HIGH", "compliance_gaps": [{"severity": "HIGH", "issue": "No DoC"}], "summary": "x"}
+
+
+def test_plain_json_is_not_truncated():
+    assert parse_json_response(json.dumps(COMPLETE)) == (COMPLETE, False)
+
+
+def test_fenced_json_is_not_truncated():
+    assert parse_json_response("```json\n" + json.dumps(COMPLETE) + "\n```") == (COMPLETE, False)
+
+
+def test_complete_json_in_prose_is_not_truncated():
+    text = "Here is the analysis:\n" + json.dumps(COMPLETE) + "\nLet me know if you need more."
+    assert repair_truncated_json(text) == (json.dumps(COMPLETE), False)
+    assert parse_json_response(text) == (COMPLETE, False)
+
+
+def test_truncated_json_is_closed_at_last_complete_element():
+    text = '{"risk_level": "HIGH", "compliance_gaps": [{"severity": "HIGH", "issue": "No DoC"}, {"severity": "LO'
+    data, truncated = parse_json_response(text)
+    assert truncated
+    assert data == {"risk_level": "HIGH", "compliance_gaps": [{"severity": "HIGH", "issue": "No DoC"}, {}]}
+
+
+def test_truncated_inside_key_drops_the_key():
+    data, truncated = parse_json_response('{"risk_level": "HIGH", "summ')
+    assert truncated and data == {"risk_level": "HIGH"}
+
+
+def test_not_json():
+    assert parse_json_response("I cannot analyze this document.") == (None, False)
+    assert repair_truncated_json("no braces here") == (None, False)
+
+
+def test_validate_coerces_values():
+    result = validate_ce_analysis({
+        "risk_level": "medium",
+        "confidence_score": "1.7",
+        "compliance_gaps": [{"severity": "urgent", "issue": " Missing report "}, {"issue": ""}, "junk"],
+        "strengths": ["ok", "", 3],
+    })
+    assert result["risk_level"] == "MODERATE"
+    assert result["confidence_score"] == 1.0
+    assert result["compliance_gaps"] == [
+        {"severity": "MEDIUM", "issue": "Missing report", "requirement": "", "solution": ""}
+    ]
+    assert result["strengths"] == ["ok", "3"]
+    assert validate_ce_analysis(["not", "an", "object"]) is None
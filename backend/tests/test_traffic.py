@@ -0,0 +1,46 @@
+import json
+
+import pytest
+
+from benchmarks.replay import ReplayTransport, placeholder_answer
+from utils.gpt_analyzer import Completion, estimate_tokens
+from utils.structured_output import parse_json_response, validate_ce_analysis
+from utils.traffic import TrafficRecorder, TrafficRecording
+
+MESSAGES = [{"role": "system", "content": "You are a CE expert."}, {"role": "user", "content": "Document text"}]
+
+
+def test_recording_needs_a_salt():
+    with pytest.raises(ValueError):
+        TrafficRecorder(":memory:", salt=None)
+
+
+def test_pseudonyms_are_stable_for_one_salt(tmp_path):
+    a = TrafficRecorder(str(tmp_path / "a.sqlite3"), salt="salt")
+    b = TrafficRecorder(str(tmp_path / "b.sqlite3"), salt="salt")
+    other = TrafficRecorder(str(tmp_path / "c.sqlite3"), salt="pepper")
+    assert a.pseudonym("Shop.myshopify.com") == b.pseudonym("shop.myshopify.com")
+    assert a.pseudonym("shop.myshopify.com") != other.pseudonym("shop.myshopify.com")
+    assert "shop" not in a.pseudonym("shop.myshopify.com")
+
+
+@pytest.mark.parametrize("capture_text", [False, True])
+def test_answer_text_is_only_kept_when_enabled(tmp_path, capture_text):
+    path = str(tmp_path / "traffic.sqlite3")
+    recorder = TrafficRecorder(path, salt="salt", capture_llm_text=capture_text)
+    recorder.record_llm(MESSAGES, "gpt-4o", 1000, {}, Completion('{"risk_level": "HIGH"}', 120, 40, "stop"), 1.5)
+
+    (call,) = TrafficRecording(path).llm_calls()
+    assert call["completion_tokens"] == 40 and call["latency_ms"] == 1500.0
+    assert call["text"] == ('{"risk_level": "HIGH"}' if capture_text else None)
+
+
+def test_replay_serves_a_placeholder_for_answers_without_text():
+    answer = placeholder_answer(300)
+    data, truncated = parse_json_response(answer)
+    assert not truncated and validate_ce_analysis(data)["risk_level"] == "MODERATE"
+    assert abs(estimate_tokens(answer) - 300) < 10
+
+    call = {"prompt_key": "0" * 32, "shape_key": "s", "text": None, "prompt_tokens": 10,
+            "completion_tokens": 50, "finish_reason": "stop", "latency_ms": 0.0}
+    assert json.loads(ReplayTransport([call])._text(call))["risk_level"] == "MODERATE"
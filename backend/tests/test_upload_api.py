@@ -0,0 +1,82 @@
+import hashlib
+import hmac
+import io
+import time
+from urllib.parse import urlencode
+
+import pytest
+
+pytest.importorskip("flask")
+pytest.importorskip("flask_cors")
+
+from utils.pipeline import cache_key_for
+
+SECRET = "app-secret"
+SHOP = "victim.myshopify.com"
+OTHER_SHOP = "other.myshopify.com"
+PDF = b"%PDF-1.4 test"
+
+
+@pytest.fixture
+def app(monkeypatch, tmp_path):
+    monkeypatch.chdir(tmp_path)
+    for name in ("ANALYSIS_CACHE_PATH", "JOB_QUEUE_PATH", "REVISION_STORE_PATH", "NEAR_DUP_PATH", "USAGE_PATH"):
+        monkeypatch.setenv(name, str(tmp_path / f"{name.lower()}.sqlite3"))
+    monkeypatch.setenv("RESULTS_STORE_URL", f"sqlite:///{tmp_path / 'results.sqlite3'}")
+    monkeypatch.setenv("SHOPIFY_SECRET", SECRET)
+    monkeypatch.setenv("JOB_INPROCESS_WORKERS", "false")
+
+    from app import create_app
+
+    app = create_app()
+    # Every upload below is a cache hit, so no extraction or model call is made
+    app.extensions["analysis_cache"].set(
+        cache_key_for(hashlib.sha256(PDF).hexdigest(), "test_report", None),
+        {"file_id": "f-first", "document_type": "test_report", "product_category": None,
+         "analysis": {"risk_level": "LOW", "compliance_gaps": []}}
+    )
+    return app
+
+
+def signed(**params):
+    params = {"timestamp": str(int(time.time())), **params}
+    message = "&".join(f"{key}={value}" for key, value in sorted(params.items()))
+    params["hmac"] = hmac.new(SECRET.encode(), message.encode(), hashlib.sha256).hexdigest()
+    return urlencode(params)
+
+
+def upload(app, query):
+    data = {"file": (io.BytesIO(PDF), "doc.pdf"), "document_type": "test_report"}
+    return app.test_client().post(f"/api/upload?{query}", data=data, content_type="multipart/form-data")
+
+
+def test_unsigned_shop_is_not_charged(app):
+    assert upload(app, f"shop={SHOP}").status_code == 200
+    assert app.extensions["usage"].report(SHOP)["days"] == []
+
+    assert upload(app, signed(shop=SHOP)).status_code == 200
+    assert app.extensions["usage"].report(SHOP)["totals"]["documents"] == 1
+
+
+def reports(app, shop):
+    response = app.test_client().get(f"/api/reports?{signed(shop=shop)}")
+    assert response.status_code == 200
+    return response.get_json()["reports"]
+
+
+def test_unsigned_shop_gets_no_reports(app):
+    assert upload(app, f"shop={SHOP}").status_code == 200
+    assert reports(app, SHOP) == []
+
+
+def test_cache_hits_are_reported_to_each_shop_under_their_own_file_id(app):
+    first = upload(app, signed(shop=SHOP)).get_json()
+    second = upload(app, signed(shop=OTHER_SHOP)).get_json()
+    assert first["cached"] and second["cached"]
+    assert len({first["file_id"], second["file_id"], "f-first"}) == 3
+    assert [row["file_id"] for row in reports(app, SHOP)] == [first["file_id"]]
+    assert [row["file_id"] for row in reports(app, OTHER_SHOP)] == [second["file_id"]]
+
+    query = signed(shop=OTHER_SHOP)
+    assert app.test_client().get(f"/api/reports/{second['file_id']}?{query}").status_code == 200
+    assert app.test_client().get(f"/api/reports/{first['file_id']}?{query}").status_code == 404
@@ -0,0 +1,62 @@
+import hashlib
+import io
+import os
+import time
+
+from utils.job_queue import JobQueue
+from utils.upload_buffer import SpoolJanitor, UploadBuffer
+
+PDF = b"%PDF-1.4\n" + os.urandom(300_000)
+
+
+def test_small_upload_stays_in_memory(tmp_path):
+    (tmp_path / "upload").write_bytes(PDF)
+    with open(tmp_path / "upload", "rb") as stream:
+        upload = UploadBuffer.from_stream(stream, spool_threshold=1 << 20, spool_dir=str(tmp_path / "spool"))
+    with upload:
+        assert not upload.spooled
+        assert type(upload.source) is bytes and upload.source == PDF
+        assert upload.sha256 == hashlib.sha256(PDF).hexdigest()
+        assert upload.size == len(PDF)
+    assert not os.path.exists(tmp_path / "spool")
+
+
+def test_multipart_buffer_is_taken_over_without_a_copy(tmp_path):
+    part = io.BytesIO()
+    part.write(PDF)
+    part.seek(0)
+    with UploadBuffer.from_stream(part, spool_threshold=1 << 20, spool_dir=str(tmp_path)) as upload:
+        assert upload.source is part.getvalue()
+        assert upload.sha256 == hashlib.sha256(PDF).hexdigest()
+
+
+def test_large_upload_is_spooled_and_removed(tmp_path):
+    with UploadBuffer.from_stream(io.BytesIO(PDF), spool_threshold=100_000, spool_dir=str(tmp_path)) as upload:
+        assert upload.spooled
+        with open(upload.source, "rb") as f:
+            assert f.read() == PDF
+        assert upload.sha256 == hashlib.sha256(PDF).hexdigest()
+    assert os.listdir(tmp_path) == []
+
+
+def test_persist_and_detach_keep_the_file(tmp_path):
+    upload = UploadBuffer.from_bytes(PDF)
+    path = upload.persist(str(tmp_path / "jobs"), "job.pdf")
+    upload.detach()
+    upload.close()
+    with open(path, "rb") as f:
+        assert f.read() == PDF
+
+
+def test_janitor_keeps_files_of_pending_jobs(tmp_path):
+    queue = JobQueue(str(tmp_path / "jobs.sqlite3"))
+    uploads = tmp_path / "uploads"
+    uploads.mkdir()
+    for name in ("queued.pdf", "abandoned.pdf"):
+        (uploads / name).write_bytes(PDF)
+        os.utime(uploads / name, (time.time() - 7200, time.time() - 7200))
+    queue.enqueue("analyze_upload", {"filepath": os.path.relpath(uploads / "queued.pdf")})
+
+    janitor = SpoolJanitor([str(uploads)], max_age=3600, keep=queue.pending_files)
+    assert janitor.sweep() == 1
+    assert os.listdir(uploads) == ["queued.pdf"]
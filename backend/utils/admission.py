@@ -0,0 +1,202 @@
+import heapq
+import itertools
+import math
+import threading
+import time
+from contextlib import contextmanager
+from typing import Dict, Iterator, List, NamedTuple, Optional, Tuple
+
+# Idle buckets are dropped once this many shops have been seen
+MAX_TRACKED_SHOPS = 10000
+
+
+def parse_shop_weights(spec: Optional[str]) -> Dict[str, float]:
+    """'big-store.myshopify.com=2,tiny.myshopify.com=0.5' -> {shop: weight}"""
+    weights = {}
+    for item in (spec or "").split(","):
+        shop, _, weight = item.strip().partition("=")
+        if shop and weight:
+            weights[shop.strip()] = max(0.01, float(weight))
+    return weights
+
+
+class Overloaded(Exception):
+    """Raised when an analysis slot cannot be granted in time"""
+
+    def __init__(self, message: str, retry_after: float):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+class Admission(NamedTuple):
+    allowed: bool
+    retry_after: int = 0
+    reason: Optional[str] = None
+
+
+class ShopBucket:
+    """
+    Token bucket of documents per shop. A request may cost more than the burst
+    (a whole technical file); it is admitted once the bucket is full and leaves
+    it in debt, so the shop waits the batch off before its next upload.
+    """
+
+    def __init__(self, rate: float, capacity: float):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+
+    def _refill(self, now: float) -> None:
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def take(self, cost: float) -> float:
+        """Seconds until cost could be admitted; 0 if taken now"""
+        self._refill(time.monotonic())
+        needed = min(cost, self.capacity)
+        if self.tokens >= needed:
+            self.tokens -= cost
+            return 0.0
+        return (needed - self.tokens) / self.rate
+
+    @property
+    def idle(self) -> bool:
+        self._refill(time.monotonic())
+        return self.tokens >= self.capacity
+
+
+class FairScheduler:
+    """
+    Weighted fair queuing of the process's analysis slots across shops. Each waiter
+    gets a virtual finish time of max(clock, shop's last finish) + cost / weight and
+    slots go to the smallest one, so a shop with fifty queued documents is served
+    in turn with a shop that has one instead of ahead of it.
+    """
+
+    def __init__(self, slots: int, weights: Optional[Dict[str, float]] = None):
+        self.slots = slots
+        self.weights = weights or {}
+        self._cond = threading.Condition()
+        self._inflight = 0
+        self._clock = 0.0
+        self._last_finish: Dict[str, float] = {}
+        self._waiting: List[Tuple[float, int, str]] = []
+        self._sequence = itertools.count()
+
+    @property
+    def waiting(self) -> int:
+        return len(self._waiting)
+
+    @property
+    def inflight(self) -> int:
+        return self._inflight
+
+    def _withdraw(self, entry: Tuple[float, int, str]) -> None:
+        self._waiting.remove(entry)
+        heapq.heapify(self._waiting)
+        self._cond.notify_all()
+
+    @contextmanager
+    def slot(self, shop: Optional[str], cost: float = 1.0, timeout: Optional[float] = None) -> Iterator[None]:
+        """Hold one analysis slot; raises Overloaded if none is granted within timeout"""
+        shop = shop or ""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self._cond:
+            finish = max(self._clock, self._last_finish.get(shop, 0.0)) + cost / self.weights.get(shop, 1.0)
+            self._last_finish[shop] = finish
+            entry = (finish, next(self._sequence), shop)
+            heapq.heappush(self._waiting, entry)
+            while self._inflight >= self.slots or self._waiting[0] is not entry:
+                remaining = None if deadline is None else deadline - time.monotonic()
+                if remaining is not None and remaining <= 0:
+                    self._withdraw(entry)
+                    raise Overloaded("No analysis slot became free in time", retry_after=timeout)
+                self._cond.wait(remaining)
+            heapq.heappop(self._waiting)
+            self._inflight += 1
+            # Self-clocked: virtual time is the finish tag of the latest job put into service
+            self._clock = finish
+            self._cond.notify_all()
+        try:
+            yield
+        finally:
+            with self._cond:
+                self._inflight -= 1
+                if len(self._last_finish) > MAX_TRACKED_SHOPS:
+                    self._last_finish = {s: f for s, f in self._last_finish.items() if f > self._clock}
+                self._cond.notify_all()
+
+
+class AdmissionController:
+    """
+    Decides at the door whether a shop's upload is accepted: per-shop token buckets,
+    then load shedding when the job queue or the slot waiters are past their limits.
+    Rejections answer 429 with Retry-After and are counted in the usage meter.
+    """
+
+    def __init__(self, enabled: bool = True, rate_per_minute: float = 20, burst: float = 30,
+                 weights: Optional[Dict[str, float]] = None, max_inflight: int = 8, max_waiting: int = 32,
+                 slot_timeout: float = 30.0, shed_queue_depth: int = 400, retry_after: int = 30, usage=None):
+        self.enabled = enabled
+        self.rate = rate_per_minute / 60.0
+        self.burst = burst
+        self.weights = weights or {}
+        self.max_waiting = max_waiting
+        self.slot_timeout = slot_timeout
+        self.shed_queue_depth = shed_queue_depth
+        self.retry_after = retry_after
+        self.usage = usage
+        self.scheduler = FairScheduler(max_inflight, self.weights)
+        self._buckets: Dict[str, ShopBucket] = {}
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_config(cls, config, usage=None) -> "AdmissionController":
+        return cls(
+            enabled=config["ADMISSION_ENABLED"],
+            rate_per_minute=config["SHOP_RATE_PER_MINUTE"],
+            burst=config["SHOP_BURST"],
+            weights=parse_shop_weights(config["SHOP_WEIGHTS"]),
+            max_inflight=config["ANALYSIS_MAX_INFLIGHT"],
+            max_waiting=config["ADMISSION_MAX_WAITING"],
+            slot_timeout=config["ADMISSION_SLOT_TIMEOUT"],
+            shed_queue_depth=config["ADMISSION_SHED_QUEUE_DEPTH"],
+            retry_after=config["ADMISSION_RETRY_AFTER"],
+            usage=usage,
+        )
+
+    def weight(self, shop: Optional[str]) -> float:
+        return self.weights.get(shop or "", 1.0)
+
+    def _bucket(self, shop: str) -> ShopBucket:
+        bucket = self._buckets.get(shop)
+        if bucket is None:
+            if len(self._buckets) >= MAX_TRACKED_SHOPS:
+                self._buckets = {s: b for s, b in self._buckets.items() if not b.idle}
+            weight = self.weight(shop)
+            bucket = self._buckets[shop] = ShopBucket(self.rate * weight, self.burst * weight)
+        return bucket
+
+    def reject(self, shop: Optional[str], retry_after: float, reason: str) -> Admission:
+        if self.usage is not None:
+            self.usage.record(shop, rejected=1)
+        return Admission(False, max(1, math.ceil(retry_after)), reason)
+
+    def admit(self, shop: Optional[str], cost: float = 1, queue_depth: Optional[int] = None,
+              inline: bool = False) -> Admission:
+        """
+        Admit cost documents for a shop. queue_depth is the job queue's pending count
+        for queued uploads; inline uploads are shed on the number of slot waiters.
+        """
+        if not self.enabled:
+            return Admission(True)
+        if queue_depth is not None and queue_depth >= self.shed_queue_depth:
+            return self.reject(shop, self.retry_after, "Analysis queue is full, try again later")
+        if inline and self.scheduler.waiting >= self.max_waiting:
+            return self.reject(shop, self.retry_after, "Too many analyses in progress, try again later")
+        with self._lock:
+            wait = self._bucket(shop or "").take(cost)
+        if wait > 0:
+            return self.reject(shop, wait, "Upload rate limit reached for this shop")
+        return Admission(True)
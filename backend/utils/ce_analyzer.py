@@ -1,224 +1,176 @@
 # Create: utils/ce_analyzer.py
 
+import hashlib
 import json
-from typing import Dict, List, Any, Optional
-from .gpt_analyzer import GPTAnalyzer  # Import your existing analyzer
+import os
+import re
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
+from typing import Dict, Iterator, List, Any, Optional, Tuple
+from .gpt_analyzer import GPT_MODEL, GPTAnalyzer, context_window, estimate_tokens  # Import your existing analyzer
+from .ce_registry import DIRECTIVE_MAPPING, DOCUMENT_TYPES, prompt_parts
+from .chunker import ANALYSIS_CHUNK_TOKENS, Chunk, chunk_pages
+from .metrics import propagate, stage
+from .revisions import PageDiff
+from .prescreen import (
+    CHECKLISTS, PRESCREEN_MIN_CHARS, PRESCREEN_SECTION, PRESCREEN_SKIP_COMPLETE, RULES, PrescreenResult, prescreen,
+    prescreen_prompt_section, scan
+)
+from .structured_output import JSON_OUTPUT_INSTRUCTIONS, parse_json_response, response_format_kwargs, validate_ce_analysis
+
+CHUNK_CONCURRENCY = int(os.getenv("ANALYSIS_CHUNK_CONCURRENCY", "4"))
+# Completion budget of one CE analysis call
+CE_ANALYSIS_MAX_TOKENS = int(os.getenv("CE_ANALYSIS_MAX_TOKENS", "1500"))
+# estimate_tokens assumes ~4 characters per token; dense or non-English text has fewer,
+# so a chunk only gets this share of the room the prompt leaves
+CHUNK_TOKEN_HEADROOM = 0.8
+# "[Excerpt: pages x-y of n]" line in front of every chunk
+EXCERPT_HEADER_TOKENS = 20
+RISK_ORDER = ["LOW", "MODERATE", "HIGH", "CRITICAL"]
+
+# Patterns used to surface fields from a response that is still streaming
+STREAM_RISK_LEVEL = re.compile(r"risk[\s_]*level\W{0,5}(LOW|MODERATE|HIGH|CRITICAL)\b", re.IGNORECASE)
+STREAM_GAP_LINE = re.compile(
+    r"^\s*(?:[-*\u2022]|\d+[.)]|\u26a0\ufe0f?)\s+(.*\b(?:missing|lacks?|absent|incomplete|expired|invalid|not provided|no)\b.*)$",
+    re.IGNORECASE | re.MULTILINE
+)
+STREAM_JSON_ISSUE = re.compile(r'"issue"\s*:\s*"((?:[^"\\]|\\.)*)"')
+
+
+@lru_cache(maxsize=64)
+def ce_prompt_version(document_type: str) -> str:
+    """Prompt template hash per document type; templates only change with a deploy"""
+    head, requirements = prompt_parts(document_type)
+    template = head + "{document_text}" + requirements + JSON_OUTPUT_INSTRUCTIONS
+    # Pre-screen rules and settings shape prompts and can decide results, so they version the cache too
+    template += PRESCREEN_SECTION + json.dumps([RULES, PRESCREEN_MIN_CHARS, PRESCREEN_SKIP_COMPLETE], sort_keys=True)
+    return hashlib.sha256(template.encode("utf-8")).hexdigest()[:16]
+
+
+@lru_cache(maxsize=64)
+def chunk_token_budget(document_type: str, model: str = GPT_MODEL) -> int:
+    """
+    Document tokens one CE analysis call can take: the model's context window minus
+    the completion budget and the prompt around the document, with the largest
+    pre-screen section the document type can produce
+    """
+    if ANALYSIS_CHUNK_TOKENS:
+        return ANALYSIS_CHUNK_TOKENS
+    head, requirements = prompt_parts(document_type)
+    checklist = "\n".join(f"- {item}" for item in CHECKLISTS.get(document_type, ()))
+    template = (head + requirements + JSON_OUTPUT_INSTRUCTIONS + PRESCREEN_SECTION + checklist
+                + json.dumps(response_format_kwargs()))
+    room = context_window(model) - CE_ANALYSIS_MAX_TOKENS - estimate_tokens(template) - EXCERPT_HEADER_TOKENS
+    return max(1000, int(room * CHUNK_TOKEN_HEADROOM))
+
+
+def revision_prompt_section(previous: Dict[str, Any], diff: PageDiff) -> str:
+    """Prompt addendum carrying the previous revision's findings"""
+    findings = {key: previous.get(key) for key in (
+        "risk_level", "applicable_directives", "compliance_gaps", "strengths", "next_steps",
+        "estimated_cost", "estimated_timeline", "summary"
+    )}
+    return f"""
+REVISED DOCUMENT:
+The content above is only the {len(diff.changed)} new or edited page(s) of a revised document with {diff.total} pages;
+{diff.removed} page(s) of the previous revision were removed. All other pages are unchanged.
+
+PREVIOUS ANALYSIS OF THE UNCHANGED DOCUMENT:
+{json.dumps(findings, ensure_ascii=False)}
+
+Return the complete, updated analysis of the whole revised document: keep previous findings
+that the changes do not affect, drop gaps the changed pages resolve, and add new ones.
+"""
+
 
 class CEAnalyzer(GPTAnalyzer):
     """Specialized CE marking compliance analyzer"""
     
-    def __init__(self):
-        super().__init__()  # Initialize parent GPTAnalyzer
-        self.document_types = [
-            "technical_file",
-            "declaration_of_conformity", 
-            "test_reports",
-            "risk_assessment",
-            "user_manual"
-        ]
-        
-        # EU Directive mapping for different product categories
-        self.directive_mapping = {
-            "electronics": ["2014/35/EU (LVD)", "2014/30/EU (EMC)", "2011/65/EU (RoHS)"],
-            "machinery": ["2006/42/EC (Machinery)", "2014/35/EU (LVD)", "2014/30/EU (EMC)"],
-            "toys": ["2009/48/EC (Toy Safety)", "2011/65/EU (RoHS)"],
-            "medical_devices": ["2017/745 (MDR)", "2014/35/EU (LVD)", "2014/30/EU (EMC)"],
-            "radio_equipment": ["2014/53/EU (RED)", "2011/65/EU (RoHS)"],
-            "ppe": ["2016/425 (PPE)", "2014/35/EU (LVD)"],
-            "cosmetics": ["1223/2009 (Cosmetics)", "2019/1020 (Market Surveillance)"]
-        }
+    # Shared, read-only reference data; nothing is rebuilt per instance
+    document_types = tuple(DOCUMENT_TYPES)
+    directive_mapping = DIRECTIVE_MAPPING
 
-    def get_ce_analysis_prompt(self, document_type: str, document_text: str, product_category: str = None) -> str:
+    def get_ce_analysis_prompt(self, document_type: str, document_text: str, product_category: str = None,
+                               screen: PrescreenResult = None, revision: str = None) -> str:
         """Generate CE-specific analysis prompt"""
-        
-        base_context = f"""
-You are a CE marking compliance expert analyzing a {document_type.replace('_', ' ')} document.
-Your goal is to assess EU compliance and provide actionable recommendations.
-
-DOCUMENT CONTENT:
-{document_text}
-
-ANALYSIS REQUIREMENTS:
-1. Identify applicable EU directives/regulations
-2. Check completeness against legal requirements  
-3. Flag missing mandatory information
-4. Assess risk level: LOW, MODERATE, HIGH, or CRITICAL
-5. Provide specific, actionable solutions
-6. Estimate compliance costs and timeline
-
-"""
-        
-        if document_type == "technical_file":
-            return base_context + self._get_technical_file_requirements()
-        elif document_type == "declaration_of_conformity":
-            return base_context + self._get_doc_requirements()
-        elif document_type == "test_reports":
-            return base_context + self._get_test_report_requirements()
-        elif document_type == "risk_assessment":
-            return base_context + self._get_risk_assessment_requirements()
-        else:
-            return base_context + self._get_general_requirements()
-
-    def _get_technical_file_requirements(self) -> str:
-        return """
-TECHNICAL FILE VALIDATION CHECKLIST:
-
-MANDATORY ELEMENTS TO VERIFY:
-✓ Manufacturer name and complete business address
-✓ Product description and intended use statement
-✓ Design drawings, technical specifications
-✓ List of applicable EU directives/regulations
-✓ Essential requirements analysis and compliance
-✓ Risk analysis documentation
-✓ Test reports from accredited/notified bodies
-✓ Declaration of Conformity reference
-✓ User instructions and safety information
-
-CRITICAL FLAGS:
-⚠️ Missing manufacturer identification
-⚠️ Incomplete technical specifications
-⚠️ No conformity assessment procedure
-⚠️ Missing or expired test certificates
-⚠️ Inadequate risk analysis
-
-RISK ASSESSMENT LOGIC:
-- CRITICAL: Missing DoC, invalid test reports, no risk analysis
-- HIGH: Incomplete specs, expired certificates, missing standards
-- MODERATE: Minor documentation gaps, formatting issues
-- LOW: Complete documentation with administrative notes only
-
-Provide specific recommendations for each gap found.
-"""
-
-    def _get_doc_requirements(self) -> str:
-        return """
-DECLARATION OF CONFORMITY VALIDATION:
-
-MANDATORY INFORMATION CHECK:
-✓ Manufacturer identification (name, address)
-✓ Authorized representative details (if applicable)
-✓ Product identification (model, type, batch, serial)
-✓ Sole responsibility statement
-✓ Product description and intended use
-✓ Applicable EU legislation references
-✓ Essential requirements compliance statement
-✓ Conformity assessment procedures used
-✓ Notified body details and numbers (if required)
-✓ Place and date of issue
-✓ Authorized person name and signature
-
-VALIDATION CHECKS:
-- Are directive references current and correct?
-- Do notified body numbers exist in official database?
-- Is product description sufficiently detailed?
-- Are harmonized standards current versions?
-- Is signature present and properly authorized?
-
-COMMON ERRORS TO FLAG:
-⚠️ Generic or vague product descriptions
-⚠️ Incorrect directive citations
-⚠️ Missing or invalid notified body references
-⚠️ Unsigned or undated documents
-⚠️ Wrong conformity assessment procedures
-
-Return structured analysis with specific fixes needed.
-"""
-
-    def _get_test_report_requirements(self) -> str:
-        return """
-TEST REPORTS & CERTIFICATES ANALYSIS:
-
-ACCREDITATION VALIDATION:
-✓ Laboratory accreditation status and scope
-✓ Notified body number verification
-✓ Certificate validity periods (not expired)
-✓ Test standard versions (current/withdrawn)
-✓ Product tested matches DoC description
-✓ Complete test coverage for applicable requirements
-
-RED FLAGS TO IDENTIFY:
-⚠️ Non-accredited laboratory reports
-⚠️ Expired certificates (check validity periods)
-⚠️ Missing critical safety tests
-⚠️ Product description mismatches
-⚠️ Incomplete electromagnetic compatibility testing
-⚠️ Wrong or outdated test standards referenced
-
-COMPLIANCE ASSESSMENT:
-- Are all essential requirements tested?
-- Do test results meet acceptance criteria?
-- Is electromagnetic compatibility covered (if applicable)?
-- Are chemical/safety tests complete for product type?
-
-Provide specific guidance on missing tests and accreditation requirements.
-"""
-
-    def _get_risk_assessment_requirements(self) -> str:
-        return """
-PRODUCT RISK ASSESSMENT VALIDATION:
-
-REQUIRED RISK ASSESSMENT ELEMENTS:
-✓ Systematic hazard identification
-✓ Risk evaluation methodology used
-✓ Risk reduction measures implemented
-✓ Residual risk assessment and acceptance
-✓ User information and warnings
-✓ Post-market surveillance provisions
-
-HAZARD CATEGORIES TO VERIFY:
-- Mechanical hazards (cutting, crushing, impact)
-- Electrical hazards (shock, fire, electrocution)
-- Chemical hazards (toxic substances, emissions)
-- Thermal hazards (burns, overheating)
-- Biological/hygiene hazards
-- Noise and vibration exposure
-- Ergonomic and usability risks
-
-QUALITY INDICATORS:
-- Comprehensive hazard identification?
-- Appropriate risk evaluation methods?
-- Evidence of risk reduction hierarchy?
-- Adequate user information provided?
-- Post-market surveillance plan defined?
-
-Flag any gaps in methodology or hazard coverage.
-"""
-
-    def _get_general_requirements(self) -> str:
-        return """
-GENERAL CE COMPLIANCE DOCUMENT REVIEW:
-
-COMPLIANCE INDICATORS TO CHECK:
-✓ CE marking format and placement
-✓ Product labeling completeness
-✓ User manual adequacy
-✓ Packaging compliance
-✓ Import/distribution documentation
-
-COMMON ISSUES:
-- Incorrect CE marking size or format
-- Missing mandatory product information
-- Inadequate user instructions
-- Non-compliant marketing materials
-- Missing distributor responsibilities
-
-Assess overall compliance maturity and next steps.
-"""
+        head, requirements = prompt_parts(document_type)
+
+        # Items already verified by the local pre-screen are excluded from the model's work
+        if screen is not None:
+            requirements += prescreen_prompt_section(screen)
+        if revision:
+            requirements += revision
+        return head + document_text + requirements + JSON_OUTPUT_INSTRUCTIONS
+
+    def prompt_version(self, document_type: str, product_category: str = None) -> str:
+        """Short hash of the prompt template, used to invalidate cached results when prompts change"""
+        return ce_prompt_version(document_type)
+
+    def _prescreen_shortcut(self, screen: PrescreenResult, document_type: str, product_category: str) -> Optional[Dict[str, Any]]:
+        """Result for documents the local rules can decide without the model, else None"""
+        if screen.decision == "empty":
+            return {
+                "document_type": document_type,
+                "product_category": product_category or "general",
+                "risk_level": "UNKNOWN",
+                "confidence_score": 0.0,
+                "applicable_directives": list(self.directive_mapping.get(product_category, ())),
+                "compliance_gaps": [{
+                    "severity": "HIGH",
+                    "issue": "No readable compliance content found in the document",
+                    "requirement": "Document must contain legible compliance information",
+                    "solution": "Upload a text-based PDF or a clearer scan of the original document"
+                }],
+                "strengths": [],
+                "next_steps": ["Provide a legible copy of the document"],
+                "estimated_cost": "Unknown",
+                "estimated_timeline": "Unknown",
+                "summary": "The document could not be assessed because it contains no readable compliance content.",
+                "prescreen": screen.to_dict(),
+                "llm_skipped": True
+            }
+        if screen.decision == "complete" and PRESCREEN_SKIP_COMPLETE:
+            return {
+                "document_type": document_type,
+                "product_category": product_category or "general",
+                "risk_level": "LOW",
+                "confidence_score": 0.7,
+                "applicable_directives": screen.evidence.get("directive", []) or list(self.directive_mapping.get(product_category, ())),
+                "compliance_gaps": [],
+                "strengths": screen.satisfied,
+                "next_steps": ["Confirm cited standards and directives are current versions"],
+                "estimated_cost": "$0 - $500",
+                "estimated_timeline": "1 week",
+                "summary": "All mandatory elements for this document type were found by the automated pre-screen.",
+                "prescreen": screen.to_dict(),
+                "llm_skipped": True
+            }
+        return None
 
-    def analyze_ce_document(self, document_text: str, document_type: str, product_category: str = None) -> Dict[str, Any]:
+    def analyze_ce_document(self, document_text: str, document_type: str, product_category: str = None,
+                            screen: PrescreenResult = None) -> Dict[str, Any]:
         """
         Analyze CE compliance document using specialized prompts
         """
         try:
+            if screen is None:
+                screen = prescreen(document_text, document_type)
+                shortcut = self._prescreen_shortcut(screen, document_type, product_category)
+                if shortcut is not None:
+                    return shortcut
+
             # Get CE-specific prompt
-            prompt = self.get_ce_analysis_prompt(document_type, document_text, product_category)
+            with stage("prompt_build"):
+                prompt = self.get_ce_analysis_prompt(document_type, document_text, product_category, screen)
             
             # Use your existing GPT analysis method
             # Modify this to match your current GPTAnalyzer implementation
-            analysis_text = self.analyze_text(prompt)  # Assuming this method exists in parent class
+            analysis_text = self.analyze_text(prompt, max_tokens=CE_ANALYSIS_MAX_TOKENS, **response_format_kwargs())
             
             # Parse and structure the response
-            structured_result = self._parse_ce_analysis(analysis_text, document_type, product_category)
+            with stage("parse"):
+                structured_result = self._parse_ce_analysis(analysis_text, document_type, product_category)
+            structured_result["prescreen"] = screen.to_dict()
             
             return structured_result
             
@@ -229,86 +181,258 @@ Assess overall compliance maturity and next steps.
                 "confidence_score": 0.0
             }
 
+    def stream_ce_document(self, document_text: str, document_type: str,
+                           product_category: str = None) -> Iterator[Tuple[str, Any]]:
+        """
+        Stream a CE analysis as (event, data) pairs: "token" for each model delta,
+        "field" for partial structured fields as they are detected, then "result"
+        with the full parsed analysis
+        """
+        screen = prescreen(document_text, document_type)
+        shortcut = self._prescreen_shortcut(screen, document_type, product_category)
+        if shortcut is not None:
+            yield "field", {"risk_level": shortcut["risk_level"]}
+            yield "result", shortcut
+            return
+
+        with stage("prompt_build"):
+            prompt = self.get_ce_analysis_prompt(document_type, document_text, product_category, screen)
+        text = ""
+        scanned = 0
+        json_scanned = 0
+        risk_level = None
+        gaps_seen = set()
+
+        for delta in self.stream_text(prompt, max_tokens=CE_ANALYSIS_MAX_TOKENS, **response_format_kwargs()):
+            text += delta
+            yield "token", delta
+
+            # JSON output: a gap's issue is final once its closing quote arrives
+            for match in STREAM_JSON_ISSUE.finditer(text, json_scanned):
+                json_scanned = match.end()
+                issue = json.loads(f'"{match.group(1)}"').strip()
+                if issue and issue.lower() not in gaps_seen:
+                    gaps_seen.add(issue.lower())
+                    yield "field", {"compliance_gap": issue}
+
+            if risk_level is None:
+                match = STREAM_RISK_LEVEL.search(text)
+                if match:
+                    risk_level = match.group(1).upper()
+                    yield "field", {"risk_level": risk_level}
+
+            # Only look at completed lines so a gap is never emitted half-written
+            complete = text.rfind("\n") + 1
+            if complete > scanned:
+                for match in STREAM_GAP_LINE.finditer(text, scanned, complete):
+                    issue = match.group(1).strip()
+                    if issue.lower() not in gaps_seen:
+                        gaps_seen.add(issue.lower())
+                        yield "field", {"compliance_gap": issue}
+                scanned = complete
+
+        with stage("parse"):
+            result = self._parse_ce_analysis(text, document_type, product_category)
+        result["prescreen"] = screen.to_dict()
+        yield "result", result
+
+    def analyze_ce_pages(self, pages: List[str], document_type: str, product_category: str = None,
+                         max_chunk_tokens: Optional[int] = None, max_workers: int = CHUNK_CONCURRENCY) -> Dict[str, Any]:
+        """
+        Analyze a document page by page: chunks within the token budget (by default,
+        what fits this model's context) are analyzed concurrently and their findings
+        merged into a single result
+        """
+        document_text = "".join(pages).strip()
+        screen = prescreen(document_text, document_type)
+        shortcut = self._prescreen_shortcut(screen, document_type, product_category)
+        if shortcut is not None:
+            return shortcut
+
+        chunks = chunk_pages(pages, max_chunk_tokens or chunk_token_budget(document_type, self.model))
+        if len(chunks) <= 1:
+            return self.analyze_ce_document(document_text, document_type, product_category, screen)
+
+        try:
+            with ThreadPoolExecutor(max_workers=max(1, min(max_workers, len(chunks)))) as pool:
+                # Chunk threads keep the request's metric labels and Server-Timing
+                partials = list(pool.map(
+                    propagate(lambda chunk: self._analyze_chunk(chunk, len(pages), document_type, product_category, screen)),
+                    chunks
+                ))
+            result = self._merge_ce_analyses(partials, document_type, product_category)
+            result["prescreen"] = screen.to_dict()
+            return result
+
+        except Exception as e:
+            return {
+                "error": f"Analysis failed: {str(e)}",
+                "risk_level": "UNKNOWN",
+                "confidence_score": 0.0
+            }
+
+    def analyze_ce_revision(self, previous: Dict[str, Any], pages: List[str], diff: PageDiff,
+                            document_type: str, product_category: str = None) -> Dict[str, Any]:
+        """
+        Re-analyze only the pages a revision changed, asking the model to update the
+        previous analysis rather than start over
+        """
+        changed = "\n".join(f"[Page {index + 1} of {diff.total}]\n{pages[index]}" for index in diff.changed)
+        try:
+            with stage("prompt_build"):
+                prompt = self.get_ce_analysis_prompt(
+                    document_type, changed or "(no new pages)", product_category,
+                    revision=revision_prompt_section(previous, diff)
+                )
+            analysis_text = self.analyze_text(prompt, max_tokens=CE_ANALYSIS_MAX_TOKENS, **response_format_kwargs())
+            with stage("parse"):
+                return self._parse_ce_analysis(analysis_text, document_type, product_category)
+
+        except Exception as e:
+            return {
+                "error": f"Analysis failed: {str(e)}",
+                "risk_level": "UNKNOWN",
+                "confidence_score": 0.0
+            }
+
+    def _analyze_chunk(self, chunk: Chunk, page_count: int, document_type: str, product_category: str,
+                       screen: PrescreenResult = None) -> Dict[str, Any]:
+        excerpt = f"[Excerpt: pages {chunk.first_page}-{chunk.last_page} of {page_count}]\n{chunk.text}"
+        with stage("prompt_build"):
+            prompt = self.get_ce_analysis_prompt(document_type, excerpt, product_category, screen)
+        analysis_text = self.analyze_text(prompt, max_tokens=CE_ANALYSIS_MAX_TOKENS, **response_format_kwargs())
+        with stage("parse"):
+            return self._parse_ce_analysis(analysis_text, document_type, product_category)
+
+    def _merge_ce_analyses(self, partials: List[Dict[str, Any]], document_type: str, product_category: str) -> Dict[str, Any]:
+        """Reduce per-chunk results into one _parse_ce_analysis-shaped result"""
+        def union(key, identity=lambda item: item):
+            seen, merged = set(), []
+            for partial in partials:
+                for item in partial.get(key, []):
+                    marker = identity(item)
+                    if marker not in seen:
+                        seen.add(marker)
+                        merged.append(item)
+            return merged
+
+        # The riskiest chunk decides the document's risk and headline estimates
+        worst = max(partials, key=lambda partial: RISK_ORDER.index(partial["risk_level"]) if partial["risk_level"] in RISK_ORDER else -1)
+        return {
+            "document_type": document_type,
+            "product_category": product_category or "general",
+            "risk_level": worst["risk_level"],
+            "confidence_score": min(partial["confidence_score"] for partial in partials),
+            "applicable_directives": union("applicable_directives"),
+            "compliance_gaps": union("compliance_gaps", lambda gap: gap.get("issue", "").strip().lower()),
+            "strengths": union("strengths"),
+            "next_steps": union("next_steps"),
+            "estimated_cost": worst["estimated_cost"],
+            "estimated_timeline": worst["estimated_timeline"],
+            "summary": worst["summary"],
+            "chunks_analyzed": len(partials)
+        }
+
     def _parse_ce_analysis(self, analysis_text: str, document_type: str, product_category: str) -> Dict[str, Any]:
         """Parse AI response into structured CE compliance data"""
-        
-        # This is a simplified parser - you'll want to make this more robust
-        # based on your GPT response format
-        
+        data, truncated = parse_json_response(analysis_text)
+        structured = validate_ce_analysis(data)
+        if structured is not None:
+            confidence = structured["confidence_score"]
+            if confidence is None:
+                confidence = 0.85
+            if truncated:
+                # Salvaged from a cut-off response: some findings may be missing
+                confidence = round(confidence * 0.8, 2)
+        else:
+            # Free-text response: fall back to pattern extraction
+            structured = {
+                "risk_level": self._extract_risk_level(analysis_text),
+                "compliance_gaps": self._extract_compliance_gaps(analysis_text),
+                "strengths": self._extract_strengths(analysis_text),
+                "next_steps": self._extract_next_steps(analysis_text),
+                "estimated_cost": self._estimate_compliance_cost(analysis_text),
+                "estimated_timeline": self._estimate_timeline(analysis_text),
+                "summary": self._extract_summary(analysis_text),
+                "applicable_directives": []
+            }
+            confidence = 0.6
+
         return {
             "document_type": document_type,
             "product_category": product_category or "general",
-            "risk_level": self._extract_risk_level(analysis_text),
-            "confidence_score": 0.85,  # You can calculate this based on analysis quality
-            "applicable_directives": self._extract_directives(analysis_text, product_category),
-            "compliance_gaps": self._extract_compliance_gaps(analysis_text),
-            "strengths": self._extract_strengths(analysis_text),
-            "next_steps": self._extract_next_steps(analysis_text),
-            "estimated_cost": self._estimate_compliance_cost(analysis_text),
-            "estimated_timeline": self._estimate_timeline(analysis_text),
-            "summary": self._extract_summary(analysis_text)
+            "risk_level": structured["risk_level"] or "UNKNOWN",
+            "confidence_score": confidence,
+            "applicable_directives": structured["applicable_directives"] or self._extract_directives(analysis_text, product_category),
+            "compliance_gaps": structured["compliance_gaps"],
+            "strengths": structured["strengths"],
+            "next_steps": structured["next_steps"],
+            "estimated_cost": structured["estimated_cost"] or "Not estimated",
+            "estimated_timeline": structured["estimated_timeline"] or "Not estimated",
+            "summary": structured["summary"] or "",
+            "truncated": truncated
         }
 
     def _extract_risk_level(self, text: str) -> str:
-        """Extract risk level from analysis text"""
-        text_upper = text.upper()
-        if "CRITICAL" in text_upper:
-            return "CRITICAL"
-        elif "HIGH" in text_upper:
-            return "HIGH"
-        elif "MODERATE" in text_upper:
-            return "MODERATE"
-        else:
-            return "LOW"
+        """Extract an explicitly labelled risk level from analysis text"""
+        # Only a labelled value counts; bare mentions may be the prompt's own risk scale
+        match = STREAM_RISK_LEVEL.search(text)
+        return match.group(1).upper() if match else "UNKNOWN"
 
     def _extract_directives(self, text: str, product_category: str) -> List[str]:
         """Extract applicable EU directives"""
+        cited = scan(text).get("directive")
+        if cited:
+            return cited
         if product_category and product_category in self.directive_mapping:
-            return self.directive_mapping[product_category]
-        
-        # Fallback: extract from text analysis
-        common_directives = [
-            "2014/35/EU (LVD)", "2014/30/EU (EMC)", "2011/65/EU (RoHS)",
-            "2006/42/EC (Machinery)", "2009/48/EC (Toy Safety)"
-        ]
-        return common_directives[:2]  # Return most common ones as fallback
+            return list(self.directive_mapping[product_category])
+        return []
 
     def _extract_compliance_gaps(self, text: str) -> List[Dict[str, str]]:
         """Extract compliance issues from analysis"""
-        # Simplified extraction - make this more sophisticated based on your needs
-        return [
-            {
-                "severity": "HIGH",
-                "issue": "Missing notified body certificate",
-                "requirement": "Conformity assessment procedure",
-                "solution": "Obtain testing from accredited notified body"
-            }
-        ]
+        gaps = []
+        for match in STREAM_GAP_LINE.finditer(text):
+            issue = match.group(1).strip()
+            severity = "HIGH" if re.search(r"\b(?:critical|missing|expired|invalid)\b", issue, re.IGNORECASE) else "MEDIUM"
+            gaps.append({"severity": severity, "issue": issue, "requirement": "", "solution": ""})
+        return gaps
+
+    def _section_items(self, text: str, heading: str) -> List[str]:
+        """Bullet or numbered lines under the first heading matching `heading`"""
+        match = re.search(rf"^[^\n]*\b(?:{heading})\b[^\n]*$", text, re.IGNORECASE | re.MULTILINE)
+        if not match:
+            return []
+        items = []
+        for line in text[match.end():].splitlines():
+            item = re.match(r"^\s*(?:[-*\u2022\u2713]|\d+[.)])\s+(.+)$", line)
+            if item:
+                items.append(item.group(1).strip())
+            elif line.strip() and items:
+                break
+        return items
 
     def _extract_strengths(self, text: str) -> List[str]:
         """Extract compliance strengths"""
-        return [
-            "Complete manufacturer identification",
-            "Proper document structure maintained"
-        ]
+        return self._section_items(text, "strengths?")
 
     def _extract_next_steps(self, text: str) -> List[str]:
         """Extract recommended actions"""
-        return [
-            "Submit product for required testing",
-            "Update technical documentation",
-            "Prepare Declaration of Conformity"
-        ]
+        return self._section_items(text, "next steps|recommendations?|recommended actions")
 
-    def _estimate_compliance_cost(self, text: str) -> str:
-        """Estimate compliance costs"""
-        return "$2,500 - $4,000"  # You can make this dynamic based on gaps found
+    def _estimate_compliance_cost(self, text: str) -> Optional[str]:
+        """Extract a compliance cost estimate"""
+        match = re.search(r"[$€£]\s?[\d,.]+\s*[kK]?(?:\s*(?:-|–|to)\s*[$€£]?\s?[\d,.]+\s*[kK]?)?", text)
+        return match.group(0).strip() if match else None
 
-    def _estimate_timeline(self, text: str) -> str:
-        """Estimate compliance timeline"""
-        return "4-6 weeks"  # You can make this dynamic based on complexity
+    def _estimate_timeline(self, text: str) -> Optional[str]:
+        """Extract a compliance timeline estimate"""
+        match = re.search(r"\b\d+\s*(?:-|–|to)?\s*\d*\s*(?:days?|weeks?|months?)\b", text, re.IGNORECASE)
+        return match.group(0).strip() if match else None
 
-    def _extract_summary(self, text: str) -> str:
+    def _extract_summary(self, text: str) -> Optional[str]:
         """Extract executive summary"""
-        return "Document shows moderate compliance gaps requiring attention to testing and certification requirements."
-
+        match = re.search(r"summary\W*\n?(.+?)(?:\n\s*\n|$)", text, re.IGNORECASE | re.DOTALL)
+        if match:
+            return match.group(1).strip()
+        paragraph = text.strip().split("\n\n", 1)[0].strip()
+        return paragraph[:600] or None
@@ -0,0 +1,274 @@
+"""
+CE reference data shared by the analyzer and the /api/ce endpoints: document types,
+product categories, directives, checklists and prompt sections. Everything here is
+built once at import time and exposed read-only, with reverse indexes precomputed.
+"""
+import hashlib
+import json
+from types import MappingProxyType
+from typing import Dict, Mapping, Tuple
+
+DOCUMENT_TYPES: Mapping[str, str] = MappingProxyType({
+    'technical_file': 'Technical File',
+    'declaration_of_conformity': 'Declaration of Conformity',
+    'test_reports': 'Test Reports & Certificates',
+    'risk_assessment': 'Risk Assessment',
+    'user_manual': 'User Manual'
+})
+
+PRODUCT_CATEGORIES: Mapping[str, str] = MappingProxyType({
+    'electronics': 'Electronics & Electrical',
+    'machinery': 'Machinery & Equipment',
+    'toys': 'Toys & Children Products',
+    'medical_devices': 'Medical Devices',
+    'radio_equipment': 'Radio & Telecom Equipment',
+    'ppe': 'Personal Protective Equipment',
+    'cosmetics': 'Cosmetics & Beauty Products'
+})
+
+# EU Directive mapping for different product categories
+DIRECTIVE_MAPPING: Mapping[str, Tuple[str, ...]] = MappingProxyType({
+    "electronics": ("2014/35/EU (LVD)", "2014/30/EU (EMC)", "2011/65/EU (RoHS)"),
+    "machinery": ("2006/42/EC (Machinery)", "2014/35/EU (LVD)", "2014/30/EU (EMC)"),
+    "toys": ("2009/48/EC (Toy Safety)", "2011/65/EU (RoHS)"),
+    "medical_devices": ("2017/745 (MDR)", "2014/35/EU (LVD)", "2014/30/EU (EMC)"),
+    "radio_equipment": ("2014/53/EU (RED)", "2011/65/EU (RoHS)"),
+    "ppe": ("2016/425 (PPE)", "2014/35/EU (LVD)"),
+    "cosmetics": ("1223/2009 (Cosmetics)", "2019/1020 (Market Surveillance)")
+})
+
+CHECKLISTS: Mapping[str, Tuple[str, ...]] = MappingProxyType({
+    'technical_file': (
+        'Manufacturer identification and address',
+        'Product description and intended use',
+        'Design drawings and specifications',
+        'Applicable EU directives listed',
+        'Essential requirements analysis',
+        'Risk assessment documentation',
+        'Test reports from accredited bodies',
+        'Declaration of Conformity reference',
+        'User instructions included'
+    ),
+    'declaration_of_conformity': (
+        'Manufacturer name and address',
+        'Product identification details',
+        'Sole responsibility statement',
+        'Applicable EU legislation cited',
+        'Essential requirements compliance',
+        'Conformity assessment procedures',
+        'Notified body details (if required)',
+        'Place and date of issue',
+        'Authorized signature present'
+    )
+    # Add more checklists as needed
+})
+
+TECHNICAL_FILE_REQUIREMENTS = """
+TECHNICAL FILE VALIDATION CHECKLIST:
+
+MANDATORY ELEMENTS TO VERIFY:
+✓ Manufacturer name and complete business address
+✓ Product description and intended use statement
+✓ Design drawings, technical specifications
+✓ List of applicable EU directives/regulations
+✓ Essential requirements analysis and compliance
+✓ Risk analysis documentation
+✓ Test reports from accredited/notified bodies
+✓ Declaration of Conformity reference
+✓ User instructions and safety information
+
+CRITICAL FLAGS:
+⚠️ Missing manufacturer identification
+⚠️ Incomplete technical specifications
+⚠️ No conformity assessment procedure
+⚠️ Missing or expired test certificates
+⚠️ Inadequate risk analysis
+
+RISK ASSESSMENT LOGIC:
+- CRITICAL: Missing DoC, invalid test reports, no risk analysis
+- HIGH: Incomplete specs, expired certificates, missing standards
+- MODERATE: Minor documentation gaps, formatting issues
+- LOW: Complete documentation with administrative notes only
+
+Provide specific recommendations for each gap found.
+"""
+
+DOC_REQUIREMENTS = """
+DECLARATION OF CONFORMITY VALIDATION:
+
+MANDATORY INFORMATION CHECK:
+✓ Manufacturer identification (name, address)
+✓ Authorized representative details (if applicable)
+✓ Product identification (model, type, batch, serial)
+✓ Sole responsibility statement
+✓ Product description and intended use
+✓ Applicable EU legislation references
+✓ Essential requirements compliance statement
+✓ Conformity assessment procedures used
+✓ Notified body details and numbers (if required)
+✓ Place and date of issue
+✓ Authorized person name and signature
+
+VALIDATION CHECKS:
+- Are directive references current and correct?
+- Do notified body numbers exist in official database?
+- Is product description sufficiently detailed?
+- Are harmonized standards current versions?
+- Is signature present and properly authorized?
+
+COMMON ERRORS TO FLAG:
+⚠️ Generic or vague product descriptions
+⚠️ Incorrect directive citations
+⚠️ Missing or invalid notified body references
+⚠️ Unsigned or undated documents
+⚠️ Wrong conformity assessment procedures
+
+Return structured analysis with specific fixes needed.
+"""
+
+TEST_REPORT_REQUIREMENTS = """
+TEST REPORTS & CERTIFICATES ANALYSIS:
+
+ACCREDITATION VALIDATION:
+✓ Laboratory accreditation status and scope
+✓ Notified body number verification
+✓ Certificate validity periods (not expired)
+✓ Test standard versions (current/withdrawn)
+✓ Product tested matches DoC description
+✓ Complete test coverage for applicable requirements
+
+RED FLAGS TO IDENTIFY:
+⚠️ Non-accredited laboratory reports
+⚠️ Expired certificates (check validity periods)
+⚠️ Missing critical safety tests
+⚠️ Product description mismatches
+⚠️ Incomplete electromagnetic compatibility testing
+⚠️ Wrong or outdated test standards referenced
+
+COMPLIANCE ASSESSMENT:
+- Are all essential requirements tested?
+- Do test results meet acceptance criteria?
+- Is electromagnetic compatibility covered (if applicable)?
+- Are chemical/safety tests complete for product type?
+
+Provide specific guidance on missing tests and accreditation requirements.
+"""
+
+RISK_ASSESSMENT_REQUIREMENTS = """
+PRODUCT RISK ASSESSMENT VALIDATION:
+
+REQUIRED RISK ASSESSMENT ELEMENTS:
+✓ Systematic hazard identification
+✓ Risk evaluation methodology used
+✓ Risk reduction measures implemented
+✓ Residual risk assessment and acceptance
+✓ User information and warnings
+✓ Post-market surveillance provisions
+
+HAZARD CATEGORIES TO VERIFY:
+- Mechanical hazards (cutting, crushing, impact)
+- Electrical hazards (shock, fire, electrocution)
+- Chemical hazards (toxic substances, emissions)
+- Thermal hazards (burns, overheating)
+- Biological/hygiene hazards
+- Noise and vibration exposure
+- Ergonomic and usability risks
+
+QUALITY INDICATORS:
+- Comprehensive hazard identification?
+- Appropriate risk evaluation methods?
+- Evidence of risk reduction hierarchy?
+- Adequate user information provided?
+- Post-market surveillance plan defined?
+
+Flag any gaps in methodology or hazard coverage.
+"""
+
+GENERAL_REQUIREMENTS = """
+GENERAL CE COMPLIANCE DOCUMENT REVIEW:
+
+COMPLIANCE INDICATORS TO CHECK:
+✓ CE marking format and placement
+✓ Product labeling completeness
+✓ User manual adequacy
+✓ Packaging compliance
+✓ Import/distribution documentation
+
+COMMON ISSUES:
+- Incorrect CE marking size or format
+- Missing mandatory product information
+- Inadequate user instructions
+- Non-compliant marketing materials
+- Missing distributor responsibilities
+
+Assess overall compliance maturity and next steps.
+"""
+
+REQUIREMENT_SECTIONS: Mapping[str, str] = MappingProxyType({
+    "technical_file": TECHNICAL_FILE_REQUIREMENTS,
+    "declaration_of_conformity": DOC_REQUIREMENTS,
+    "test_reports": TEST_REPORT_REQUIREMENTS,
+    "risk_assessment": RISK_ASSESSMENT_REQUIREMENTS
+})
+
+ANALYSIS_HEADER = """
+You are a CE marking compliance expert analyzing a {document_label} document.
+Your goal is to assess EU compliance and provide actionable recommendations.
+
+DOCUMENT CONTENT:
+"""
+
+ANALYSIS_REQUIREMENTS = """
+
+ANALYSIS REQUIREMENTS:
+1. Identify applicable EU directives/regulations
+2. Check completeness against legal requirements  
+3. Flag missing mandatory information
+4. Assess risk level: LOW, MODERATE, HIGH, or CRITICAL
+5. Provide specific, actionable solutions
+6. Estimate compliance costs and timeline
+
+"""
+
+
+def requirements_for(document_type: str) -> str:
+    return REQUIREMENT_SECTIONS.get(document_type, GENERAL_REQUIREMENTS)
+
+
+def prompt_parts(document_type: str) -> Tuple[str, str]:
+    """Prompt text before and after the document content, without per-call sections"""
+    parts = _PROMPT_PARTS.get(document_type)
+    if parts is None:
+        # Unknown types are rare and not worth caching under attacker-chosen keys
+        parts = _build_prompt_parts(document_type)
+    return parts
+
+
+def _build_prompt_parts(document_type: str) -> Tuple[str, str]:
+    head = ANALYSIS_HEADER.format(document_label=document_type.replace('_', ' '))
+    return head, ANALYSIS_REQUIREMENTS + requirements_for(document_type)
+
+
+def _invert(mapping: Mapping[str, Tuple[str, ...]]) -> Mapping[str, Tuple[str, ...]]:
+    inverted: Dict[str, list] = {}
+    for key, values in mapping.items():
+        for value in values:
+            inverted.setdefault(value, []).append(key)
+    return MappingProxyType({value: tuple(keys) for value, keys in inverted.items()})
+
+
+_PROMPT_PARTS: Mapping[str, Tuple[str, str]] = MappingProxyType({
+    document_type: _build_prompt_parts(document_type) for document_type in DOCUMENT_TYPES
+})
+
+# Reverse indexes
+DIRECTIVE_CATEGORIES = _invert(DIRECTIVE_MAPPING)
+CHECKLIST_ITEM_DOCUMENT_TYPES = _invert(CHECKLISTS)
+
+# Changes whenever any reference data changes; the ETag base of the /api/ce metadata endpoints
+REGISTRY_VERSION = hashlib.sha256(json.dumps({
+    "document_types": dict(DOCUMENT_TYPES),
+    "product_categories": dict(PRODUCT_CATEGORIES),
+    "directives": {key: list(value) for key, value in DIRECTIVE_MAPPING.items()},
+    "checklists": {key: list(value) for key, value in CHECKLISTS.items()}
+}, sort_keys=True).encode("utf-8")).hexdigest()[:16]
@@ -0,0 +1,76 @@
+import os
+import re
+from typing import List, NamedTuple
+
+# Fixed document tokens per chunk; unset, CE analyses derive them from the model's context window
+ANALYSIS_CHUNK_TOKENS = int(os.getenv("ANALYSIS_CHUNK_TOKENS", "0"))
+# For callers that do not know the model: fits a CE prompt into gpt-4's 8k context
+DEFAULT_CHUNK_TOKENS = ANALYSIS_CHUNK_TOKENS or 4000
+
+# Numbered ("4.2 Risk analysis"), all-caps ("TEST RESULTS") or, from structured extraction, "## " heading lines
+SECTION_HEADING = re.compile(
+    r"^(?:\d+(?:\.\d+)*\.?\s+[A-Z][^\n]{0,80}|[A-Z][A-Z0-9 &/,\-()]{3,80}|## [^\n]{1,120})$",
+    re.MULTILINE,
+)
+
+
+class Chunk(NamedTuple):
+    text: str
+    first_page: int
+    last_page: int
+    tokens: int
+
+
+def estimate_tokens(text: str) -> int:
+    """Cheap token estimate (~4 characters per token for English/European text)"""
+    return (len(text) + 3) // 4
+
+
+def _split_sections(text: str) -> List[str]:
+    starts = [m.start() for m in SECTION_HEADING.finditer(text)]
+    if not starts or starts[0] != 0:
+        starts.insert(0, 0)
+    return [text[a:b] for a, b in zip(starts, starts[1:] + [len(text)]) if text[a:b].strip()]
+
+
+def _split_to_budget(text: str, max_tokens: int) -> List[str]:
+    """Split one oversized page by section headings, then paragraphs, then hard cuts"""
+    pieces = []
+    for section in _split_sections(text):
+        if estimate_tokens(section) <= max_tokens:
+            pieces.append(section)
+            continue
+        for paragraph in re.split(r"\n\s*\n", section):
+            while estimate_tokens(paragraph) > max_tokens:
+                cut = max_tokens * 4
+                pieces.append(paragraph[:cut])
+                paragraph = paragraph[cut:]
+            if paragraph.strip():
+                pieces.append(paragraph)
+    return pieces
+
+
+def chunk_pages(pages: List[str], max_tokens: int = DEFAULT_CHUNK_TOKENS) -> List[Chunk]:
+    """Group consecutive pages into chunks of at most max_tokens each"""
+    chunks = []
+    parts, tokens, first = [], 0, 1
+
+    def flush(last_page):
+        nonlocal parts, tokens
+        if parts:
+            chunks.append(Chunk("".join(parts), first, last_page, tokens))
+        parts, tokens = [], 0
+
+    for page_number, page_text in enumerate(pages, start=1):
+        pieces = [page_text] if estimate_tokens(page_text) <= max_tokens else _split_to_budget(page_text, max_tokens)
+        for piece in pieces:
+            piece_tokens = estimate_tokens(piece)
+            if parts and tokens + piece_tokens > max_tokens:
+                flush(page_number - 1 if piece is pieces[0] else page_number)
+                first = page_number
+            if not parts:
+                first = page_number
+            parts.append(piece)
+            tokens += piece_tokens
+    flush(len(pages))
+    return chunks
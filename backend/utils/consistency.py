@@ -0,0 +1,378 @@
+import os
+import re
+import sqlite3
+from datetime import datetime
+from difflib import SequenceMatcher
+from typing import Any, Dict, List, Optional, Tuple
+
+from .ce_registry import DIRECTIVE_CATEGORIES, DIRECTIVE_MAPPING
+from .structured_output import parse_json_response
+
+# Values this alike that still differ are sent to the model instead of being flagged outright
+AMBIGUOUS_SIMILARITY = float(os.getenv("CONSISTENCY_AMBIGUOUS_SIMILARITY", "0.6"))
+CONSISTENCY_MAX_LLM_PAIRS = int(os.getenv("CONSISTENCY_MAX_LLM_PAIRS", "20"))
+MAX_ENTITY_VALUES = 10
+
+# Labels that start the next field when a document's fields run together on one line
+NEXT_LABEL = (r"(?:model|type|article|manufacturer|manufactured\s+by|hersteller|address|brand|product|serial"
+              r"|standards?|directives?|notified\s+body|date|place|tel|phone|fax|e-?mail|web)\b")
+# Rest of an identifier after its first character: dots only inside it, so "Y-200." ends at the full stop
+MODEL_CHARS = r"(?:[A-Za-z0-9\-_/]|\.(?=[A-Za-z0-9]))*"
+
+ENTITY_PATTERNS = {
+    # Up to two more words ("X100 Pro", "EX 200 B"), each starting with a capital or digit and not a label
+    "model": re.compile(
+        r"\b(?:model|type|article)\s*(?:no\.?|number|nr\.?|designation|name)?\s*[:#]\s*"
+        rf"([A-Za-z0-9]{MODEL_CHARS}(?: (?!{NEXT_LABEL})(?-i:[A-Z0-9]){MODEL_CHARS}){{0,2}})",
+        re.IGNORECASE),
+    # A name ends at a line break, a comma, a sentence stop (". " before a capital) or the next label
+    "manufacturer": re.compile(
+        r"\b(?:manufacturer|manufactured\s+by|hersteller)\s*[:\-]?\s*"
+        rf"([A-Z](?:(?!\.\s+(?-i:[A-Z])|\s+{NEXT_LABEL})[^\n,;:]){{2,80}})", re.IGNORECASE),
+    "directive": re.compile(
+        r"\b((?:19|20)\d{2}/\d{1,4})/(?:EU|EC|EEC)\b|\bRegulation\s*\((?:EU|EC)\)\s*(?:No\.?\s*)?(\d{1,4}/\d{1,4})\b",
+        re.IGNORECASE),
+    "standard": re.compile(r"\b((?:EN|IEC|ISO)\s?(?:IEC\s?|ISO\s?)?\d{3,5}(?:-\d+)*)(?::(\d{4}))?"),
+    "notified_body": re.compile(r"\b(?:notified\s+body|NB)\s*(?:no\.?|number|nr\.?)?\s*[:#]?\s*(\d{4})\b", re.IGNORECASE),
+    "issue_date": re.compile(
+        r"\b(?:date\s+of\s+issue|issued\s+on|place\s+and\s+date(?:\s+of\s+issue)?|report\s+date|date\s+of\s+report)"
+        r"\s*[:\-]?[^\n\d]{0,40}?(\d{1,2}[./-]\d{1,2}[./-]\d{2,4}|\d{4}-\d{2}-\d{2}|\d{1,2}\s+[A-Z][a-z]+\s+\d{4})",
+        re.IGNORECASE),
+}
+
+LEGAL_SUFFIX = re.compile(r"\b(?:gmbh|ltd|limited|inc|llc|co|corp|corporation|s\.?a|s\.?r\.?l|b\.?v|ag|plc)\b\.?")
+NON_ALNUM = re.compile(r"[^a-z0-9]+")
+DIRECTIVE_NUMBER = re.compile(r"(\d{4}/\d{1,4})")
+STANDARD_NUMBER = re.compile(r"\d{3,5}(?:-\d+)*")
+
+# Documents that must agree on who made what
+IDENTITY_CHECKS = {
+    "model": ("HIGH", "Product model/type differs between documents"),
+    "manufacturer": ("HIGH", "Manufacturer differs between documents"),
+    "notified_body": ("MEDIUM", "Notified body number differs between documents"),
+}
+# (kind, citing document type, document type expected to cover it, severity, issue)
+COVERAGE_CHECKS = (
+    ("standard", "declaration_of_conformity", "test_reports", "HIGH",
+     "Standard declared in the DoC has no test report"),
+    ("standard", "declaration_of_conformity", "risk_assessment", "MEDIUM",
+     "Standard declared in the DoC is not addressed in the risk assessment"),
+    ("standard", "test_reports", "risk_assessment", "LOW",
+     "Tested standard is not referenced in the risk assessment"),
+    ("directive", "declaration_of_conformity", "technical_file", "MEDIUM",
+     "Directive declared in the DoC is not listed in the technical file"),
+)
+
+ADJUDICATION_PROMPT = """
+You are checking a CE technical file for consistency. For each numbered pair below, decide whether
+the two values refer to the same {kind} (allowing for formatting, abbreviations and variant suffixes)
+or to different ones.
+
+{pairs}
+
+Respond with a single JSON object and nothing else:
+{{"decisions": [{{"id": 1, "same": true, "reason": "one sentence"}}]}}
+"""
+
+
+def _normalize(kind: str, value: str) -> Tuple[str, str]:
+    """(key compared across documents, detail such as a standard's year)"""
+    if kind == "manufacturer":
+        return NON_ALNUM.sub(" ", LEGAL_SUFFIX.sub(" ", value.lower())).strip(), ""
+    if kind == "model":
+        return NON_ALNUM.sub("", value.lower()), ""
+    if kind == "standard":
+        # "EN IEC 62368-1", "IEC 62368-1" and "EN 62368-1" are the same standard
+        base, _, year = value.partition(":")
+        match = STANDARD_NUMBER.search(base)
+        return (match.group() if match else base), year
+    if kind == "directive":
+        match = DIRECTIVE_NUMBER.search(value)
+        return (match.group(1) if match else value), ""
+    if kind == "issue_date":
+        return _parse_date(value) or "", ""
+    return value.strip(), ""
+
+
+def _parse_date(value: str) -> Optional[str]:
+    for fmt in ("%d.%m.%Y", "%d/%m/%Y", "%d-%m-%Y", "%Y-%m-%d", "%d %B %Y", "%d %b %Y", "%d.%m.%y", "%d/%m/%y"):
+        try:
+            return datetime.strptime(value, fmt).date().isoformat()
+        except ValueError:
+            continue
+    return None
+
+
+def extract_entities(text: str) -> Dict[str, List[str]]:
+    """Distinct raw values per entity kind found in a document's text"""
+    entities: Dict[str, List[str]] = {}
+    for kind, pattern in ENTITY_PATTERNS.items():
+        values: List[str] = []
+        for match in pattern.finditer(text):
+            if kind == "standard":
+                value = " ".join(match.group(1).split()) + (f":{match.group(2)}" if match.group(2) else "")
+            else:
+                value = " ".join(next(group for group in match.groups() if group).split()).strip(" .")
+            if value and value not in values:
+                values.append(value)
+            if len(values) >= MAX_ENTITY_VALUES:
+                break
+        if values:
+            entities[kind] = values
+    return entities
+
+
+def identity_keys(entities: Dict[str, List[str]]) -> Dict[str, List[str]]:
+    """Normalized model and manufacturer values, which tell same-template documents of different products apart"""
+    return {
+        kind: sorted({_normalize(kind, value)[0] for value in entities.get(kind, [])})
+        for kind in ("model", "manufacturer")
+    }
+
+
+class EntityTable:
+    """
+    The entities of every document of one product in an in-memory SQLite table,
+    indexed by (kind, key) so cross-document checks are plain joins
+    """
+
+    def __init__(self, documents: List[Dict[str, Any]]):
+        self.documents = documents
+        self._conn = sqlite3.connect(":memory:")
+        self._conn.execute("CREATE TABLE documents (doc INTEGER PRIMARY KEY, document_type TEXT NOT NULL)")
+        self._conn.execute(
+            "CREATE TABLE entities (doc INTEGER NOT NULL, document_type TEXT NOT NULL, kind TEXT NOT NULL, "
+            "value TEXT NOT NULL, key TEXT NOT NULL, detail TEXT NOT NULL)"
+        )
+        self._conn.execute("CREATE INDEX idx_entities_kind_key ON entities (kind, key)")
+        self._conn.execute("CREATE INDEX idx_entities_kind_doc ON entities (kind, doc)")
+        rows = []
+        for doc, document in enumerate(documents):
+            self._conn.execute("INSERT INTO documents VALUES (?, ?)", (doc, document.get("document_type") or "general"))
+            for kind, values in (document.get("entities") or {}).items():
+                for value in values:
+                    key, detail = _normalize(kind, value)
+                    if key:
+                        rows.append((doc, document.get("document_type") or "general", kind, value, key, detail))
+        self._conn.executemany("INSERT INTO entities VALUES (?, ?, ?, ?, ?, ?)", rows)
+
+    def query(self, sql: str, args: tuple = ()) -> List[tuple]:
+        return self._conn.execute(sql, args).fetchall()
+
+    def values(self, doc: int, kind: str) -> List[str]:
+        return [row[0] for row in self.query("SELECT value FROM entities WHERE doc = ? AND kind = ?", (doc, kind))]
+
+    def unmatched_pairs(self, kind: str) -> List[Tuple[int, int]]:
+        """Pairs of documents that both name a kind of entity but share no value of it"""
+        return self.query(
+            """
+            SELECT a.doc, b.doc FROM
+                (SELECT DISTINCT doc FROM entities WHERE kind = ?) a
+                JOIN (SELECT DISTINCT doc FROM entities WHERE kind = ?) b ON a.doc < b.doc
+            WHERE NOT EXISTS (
+                SELECT 1 FROM entities x JOIN entities y ON y.kind = x.kind AND y.key = x.key
+                WHERE x.kind = ? AND x.doc = a.doc AND y.doc = b.doc
+            )
+            """,
+            (kind, kind, kind)
+        )
+
+    def uncovered(self, kind: str, source_type: str, target_type: str) -> List[tuple]:
+        """Values cited by source_type documents that no target_type document mentions"""
+        return self.query(
+            """
+            SELECT s.key, MIN(s.value), GROUP_CONCAT(DISTINCT s.doc) FROM entities s
+            WHERE s.kind = ? AND s.document_type = ?
+              AND EXISTS (SELECT 1 FROM documents d WHERE d.document_type = ?)
+              AND NOT EXISTS (SELECT 1 FROM entities t WHERE t.kind = s.kind AND t.key = s.key AND t.document_type = ?)
+            GROUP BY s.key
+            """,
+            (kind, source_type, target_type, target_type)
+        )
+
+    def version_conflicts(self) -> List[tuple]:
+        """The same standard cited with different years"""
+        return self.query(
+            """
+            SELECT a.key, a.value, b.value, a.doc, b.doc FROM entities a
+            JOIN entities b ON b.kind = a.kind AND b.key = a.key AND a.doc < b.doc
+            WHERE a.kind = 'standard' AND a.detail != '' AND b.detail != '' AND a.detail != b.detail
+            GROUP BY a.key, a.detail, b.detail
+            """
+        )
+
+    def close(self) -> None:
+        self._conn.close()
+
+
+class ConsistencyChecker:
+    """
+    Product-level checks across the documents of one technical file. Mismatches
+    the rules can decide are flagged directly; near-identical values (a model
+    "X-100" against "X100 Pro") are batched into one model call.
+    """
+
+    def __init__(self, analyzer=None, max_llm_pairs: int = CONSISTENCY_MAX_LLM_PAIRS):
+        self._analyzer = analyzer
+        self.max_llm_pairs = max_llm_pairs
+
+    @property
+    def analyzer(self):
+        if self._analyzer is None:
+            from .gpt_analyzer import GPTAnalyzer
+            self._analyzer = GPTAnalyzer()
+        return self._analyzer
+
+    def check(self, documents: List[Dict[str, Any]], product_category: Optional[str] = None) -> Dict[str, Any]:
+        """documents: dicts with filename, document_type and entities, e.g. stored upload results"""
+        usable = [document for document in documents if document.get("entities")]
+        table = EntityTable(usable)
+        try:
+            names = [document.get("filename") or document.get("file_id") or f"document {i + 1}"
+                     for i, document in enumerate(usable)]
+            findings: List[Dict[str, Any]] = []
+            ambiguous: List[Dict[str, Any]] = []
+
+            for kind, (severity, issue) in IDENTITY_CHECKS.items():
+                for a, b in table.unmatched_pairs(kind):
+                    values_a, values_b = table.values(a, kind), table.values(b, kind)
+                    similarity, value_a, value_b = max(
+                        (SequenceMatcher(None, _normalize(kind, x)[0], _normalize(kind, y)[0]).ratio(), x, y)
+                        for x in values_a for y in values_b
+                    )
+                    finding = {
+                        "check": f"{kind}_mismatch",
+                        "severity": severity,
+                        "issue": issue,
+                        "documents": [names[a], names[b]],
+                        "values": [value_a, value_b],
+                        "resolved_by": "rules"
+                    }
+                    if kind != "notified_body" and similarity >= AMBIGUOUS_SIMILARITY:
+                        ambiguous.append({**finding, "kind": kind})
+                    else:
+                        findings.append(finding)
+
+            for kind, source_type, target_type, severity, issue in COVERAGE_CHECKS:
+                for _, value, docs in table.uncovered(kind, source_type, target_type):
+                    findings.append({
+                        "check": f"{kind}_not_covered",
+                        "severity": severity,
+                        "issue": issue,
+                        "documents": [names[int(doc)] for doc in str(docs).split(",")],
+                        "values": [value],
+                        "resolved_by": "rules"
+                    })
+
+            for _, value_a, value_b, a, b in table.version_conflicts():
+                findings.append({
+                    "check": "standard_version_mismatch",
+                    "severity": "MEDIUM",
+                    "issue": "Same standard cited with different versions",
+                    "documents": [names[a], names[b]],
+                    "values": [value_a, value_b],
+                    "resolved_by": "rules"
+                })
+
+            findings.extend(self._directive_findings(table, names, product_category))
+            findings.extend(self._date_findings(table, names))
+            findings.extend(self._adjudicate(ambiguous))
+        finally:
+            table.close()
+
+        return {
+            "consistent": not findings,
+            "findings": findings,
+            "documents_checked": len(usable),
+            "documents_without_entities": [
+                document.get("filename") or document.get("file_id") for document in documents if not document.get("entities")
+            ],
+            "llm_pairs": min(len(ambiguous), self.max_llm_pairs)
+        }
+
+    def _directive_findings(self, table: EntityTable, names: List[str], product_category: Optional[str]) -> List[Dict[str, Any]]:
+        if not product_category or product_category not in DIRECTIVE_MAPPING:
+            return []
+        cited = {row[0] for row in table.query("SELECT DISTINCT key FROM entities WHERE kind = 'directive'")}
+        findings = []
+        for directive in DIRECTIVE_MAPPING[product_category]:
+            if _normalize("directive", directive)[0] not in cited:
+                findings.append({
+                    "check": "directive_not_cited",
+                    "severity": "MEDIUM",
+                    "issue": f"{directive} applies to {product_category} but no document cites it",
+                    "documents": [],
+                    "values": [directive],
+                    "resolved_by": "rules"
+                })
+        known = {_normalize("directive", directive)[0]: categories for directive, categories in DIRECTIVE_CATEGORIES.items()}
+        for key, value, doc in table.query(
+            "SELECT key, MIN(value), MIN(doc) FROM entities WHERE kind = 'directive' GROUP BY key"
+        ):
+            if key in known and product_category not in known[key]:
+                findings.append({
+                    "check": "directive_not_applicable",
+                    "severity": "LOW",
+                    "issue": f"Cited directive is not usually applicable to {product_category}",
+                    "documents": [names[doc]],
+                    "values": [value],
+                    "resolved_by": "rules"
+                })
+        return findings
+
+    def _date_findings(self, table: EntityTable, names: List[str]) -> List[Dict[str, Any]]:
+        """A DoC dated before the test reports it relies on"""
+        rows = table.query(
+            """
+            SELECT d.value, d.doc, t.value, t.doc FROM entities d
+            JOIN entities t ON t.kind = d.kind AND t.document_type = 'test_reports' AND t.key > d.key
+            WHERE d.kind = 'issue_date' AND d.document_type = 'declaration_of_conformity'
+            ORDER BY t.key DESC LIMIT 1
+            """
+        )
+        return [{
+            "check": "doc_predates_tests",
+            "severity": "MEDIUM",
+            "issue": "Declaration of Conformity is dated before a test report it relies on",
+            "documents": [names[doc_a], names[doc_b]],
+            "values": [value_a, value_b],
+            "resolved_by": "rules"
+        } for value_a, doc_a, value_b, doc_b in rows]
+
+    def _adjudicate(self, ambiguous: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """Ask the model about near-identical values; unresolved pairs are kept for human review"""
+        if not ambiguous:
+            return []
+        asked, rest = ambiguous[:self.max_llm_pairs], ambiguous[self.max_llm_pairs:]
+        decisions = {}
+        by_kind: Dict[str, List[Tuple[int, Dict[str, Any]]]] = {}
+        for index, pair in enumerate(asked):
+            by_kind.setdefault(pair["kind"], []).append((index, pair))
+        for kind, pairs in by_kind.items():
+            prompt = ADJUDICATION_PROMPT.format(kind=kind.replace("_", " "), pairs="\n".join(
+                f'{index + 1}. "{pair["values"][0]}" ({pair["documents"][0]}) vs "{pair["values"][1]}" ({pair["documents"][1]})'
+                for index, pair in pairs
+            ))
+            try:
+                data, _ = parse_json_response(self.analyzer.analyze_text(prompt, max_tokens=600, temperature=0))
+                for decision in (data or {}).get("decisions", []):
+                    decisions[int(decision["id"]) - 1] = decision
+            except Exception:
+                continue
+
+        findings = []
+        for index, pair in enumerate(asked):
+            pair = {key: value for key, value in pair.items() if key != "kind"}
+            decision = decisions.get(index)
+            if decision is None:
+                findings.append({**pair, "severity": "LOW", "resolved_by": "unresolved", "needs_review": True})
+            elif not decision.get("same"):
+                findings.append({**pair, "resolved_by": "llm", "reason": decision.get("reason")})
+        for pair in rest:
+            pair = {key: value for key, value in pair.items() if key != "kind"}
+            findings.append({**pair, "severity": "LOW", "resolved_by": "unresolved", "needs_review": True})
+        return findings
+
+
+def check_consistency(documents: List[Dict[str, Any]], product_category: Optional[str] = None) -> Dict[str, Any]:
+    return ConsistencyChecker().check(documents, product_category)
@@ -0,0 +1,510 @@
+import hashlib
+import os
+import sqlite3
+import statistics
+import struct
+import sys
+import threading
+import time
+from array import array
+from typing import Iterator, List, Optional, Sequence
+
+from .pdf_parser import PageRangeJob, PdfSource, PDFParser, _fitz, _open
+
+STRUCTURED_EXTRACTION = os.getenv("STRUCTURED_EXTRACTION", "false").lower() in ("1", "true", "yes")
+IR_CACHE_PATH = os.getenv("IR_CACHE_PATH", "cache/document_ir.sqlite3")
+IR_CACHE_MAX_BYTES = int(os.getenv("IR_CACHE_MAX_BYTES", str(512 * 1024 * 1024)))
+IR_DETECT_TABLES = os.getenv("IR_DETECT_TABLES", "true").lower() in ("1", "true", "yes")
+
+IR_MAGIC = b"CDIR"
+# Bump when the layout or the extraction heuristics change; old cache entries are then ignored
+IR_VERSION = 1
+# Bump when the text rendered from the IR changes, so analyses of the old text are not reused
+TEXT_RENDER_VERSION = 2
+
+BLOCK_TEXT = 0
+BLOCK_HEADING = 1
+BLOCK_TABLE = 2  # text block that lies inside a detected table
+
+SPAN_BOLD = 1 << 4   # PyMuPDF span flag
+LINE_START = 1 << 16  # our own flag: the span opens a new line of its block
+
+# Headings are short blocks set noticeably larger than the page's body text, or all bold
+HEADING_SIZE_RATIO = 1.15
+HEADING_MAX_CHARS = 120
+# Two-column tables whose left cells are all short word labels are rendered as "label: value" lines
+FIELD_LABEL_MAX_CHARS = 40
+
+# (name, typecode) of every column, in serialization order
+ARRAY_FIELDS = (
+    ("page_size", "f"),     # width, height per page
+    ("page_blocks", "I"),   # offsets into blocks, pages + 1
+    ("page_tables", "I"),   # offsets into tables, pages + 1
+    ("block_kind", "B"),
+    ("block_bbox", "f"),    # x0, y0, x1, y1 per block
+    ("block_table", "i"),   # table a block belongs to, or -1
+    ("block_spans", "I"),   # offsets into spans, blocks + 1
+    ("span_text", "I"),     # offsets into span_pool, spans + 1
+    ("span_size", "f"),
+    ("span_flags", "I"),
+    ("table_bbox", "f"),    # x0, y0, x1, y1 per table
+    ("table_shape", "H"),   # rows, columns per table
+    ("table_cells", "I"),   # offsets into cells, tables + 1
+    ("cell_text", "I"),     # offsets into cell_pool, cells + 1
+)
+STRING_FIELDS = ("span_pool", "cell_pool")
+
+
+class Span:
+    __slots__ = ("_ir", "index")
+
+    def __init__(self, ir: "DocumentIR", index: int):
+        self._ir = ir
+        self.index = index
+
+    @property
+    def text(self) -> str:
+        offsets = self._ir.span_text
+        return self._ir.span_pool[offsets[self.index]:offsets[self.index + 1]]
+
+    @property
+    def size(self) -> float:
+        return self._ir.span_size[self.index]
+
+    @property
+    def bold(self) -> bool:
+        return bool(self._ir.span_flags[self.index] & SPAN_BOLD)
+
+    @property
+    def line_start(self) -> bool:
+        return bool(self._ir.span_flags[self.index] & LINE_START)
+
+
+class Block:
+    __slots__ = ("_ir", "index")
+
+    def __init__(self, ir: "DocumentIR", index: int):
+        self._ir = ir
+        self.index = index
+
+    @property
+    def kind(self) -> int:
+        return self._ir.block_kind[self.index]
+
+    @property
+    def bbox(self) -> tuple:
+        return tuple(self._ir.block_bbox[self.index * 4:self.index * 4 + 4])
+
+    @property
+    def table(self) -> int:
+        return self._ir.block_table[self.index]
+
+    @property
+    def spans(self) -> List[Span]:
+        offsets = self._ir.block_spans
+        return [Span(self._ir, i) for i in range(offsets[self.index], offsets[self.index + 1])]
+
+    @property
+    def text(self) -> str:
+        ir = self._ir
+        parts = []
+        for i in range(ir.block_spans[self.index], ir.block_spans[self.index + 1]):
+            if ir.span_flags[i] & LINE_START and parts:
+                parts.append("\n")
+            parts.append(ir.span_pool[ir.span_text[i]:ir.span_text[i + 1]])
+        return "".join(parts)
+
+
+class Table:
+    __slots__ = ("_ir", "index")
+
+    def __init__(self, ir: "DocumentIR", index: int):
+        self._ir = ir
+        self.index = index
+
+    @property
+    def bbox(self) -> tuple:
+        return tuple(self._ir.table_bbox[self.index * 4:self.index * 4 + 4])
+
+    @property
+    def rows(self) -> List[List[str]]:
+        ir = self._ir
+        row_count, column_count = ir.table_shape[self.index * 2], ir.table_shape[self.index * 2 + 1]
+        first = ir.table_cells[self.index]
+        cells = [ir.cell_pool[ir.cell_text[i]:ir.cell_text[i + 1]] for i in range(first, first + row_count * column_count)]
+        return [cells[r * column_count:(r + 1) * column_count] for r in range(row_count)]
+
+    def fields(self) -> Optional[List[tuple]]:
+        """(label, value) rows of a two-column label/value table, such as a DoC's product block, else None"""
+        rows = [[" ".join(cell.split()) for cell in row] for row in self.rows]
+        if len(rows) < 2 or len(rows[0]) != 2:
+            return None
+        # Field names are short words; a first column of standards, dates or part numbers is data
+        labels = [label for label, _ in rows if label]
+        if not labels or not all(len(label) <= FIELD_LABEL_MAX_CHARS and any(c.isalpha() for c in label)
+                                 and not any(c.isdigit() for c in label) for label in labels):
+            return None
+        return [(label.rstrip(" :"), value) for label, value in rows]
+
+    @property
+    def text(self) -> str:
+        """
+        Label/value tables as "label: value" lines, which the entity and pre-screen
+        patterns read like any form field; other tables as pipe-delimited rows, one
+        per line, so the model sees the columns
+        """
+        fields = self.fields()
+        if fields is not None:
+            # A row without a label continues the previous field's value
+            return "\n".join(f"{label}: {value}" if label else f"  {value}" for label, value in fields)
+        return "\n".join("| " + " | ".join(" ".join(cell.split()) for cell in row) + " |" for row in self.rows)
+
+
+class Page:
+    __slots__ = ("_ir", "number")
+
+    def __init__(self, ir: "DocumentIR", number: int):
+        self._ir = ir
+        self.number = number
+
+    @property
+    def size(self) -> tuple:
+        return tuple(self._ir.page_size[self.number * 2:self.number * 2 + 2])
+
+    @property
+    def blocks(self) -> List[Block]:
+        offsets = self._ir.page_blocks
+        return [Block(self._ir, i) for i in range(offsets[self.number], offsets[self.number + 1])]
+
+    @property
+    def tables(self) -> List[Table]:
+        offsets = self._ir.page_tables
+        return [Table(self._ir, i) for i in range(offsets[self.number], offsets[self.number + 1])]
+
+    @property
+    def text(self) -> str:
+        """Page text in reading order: headings marked with '## ', tables rendered once as rows"""
+        parts = []
+        emitted = set()
+        for block in self.blocks:
+            if block.table >= 0:
+                if block.table not in emitted:
+                    emitted.add(block.table)
+                    parts.append(Table(self._ir, block.table).text)
+                continue
+            text = block.text.strip()
+            if text:
+                parts.append(f"## {text}" if block.kind == BLOCK_HEADING else text)
+        parts.extend(table.text for table in self.tables if table.index not in emitted)
+        return "\n\n".join(parts) + "\n" if parts else ""
+
+
+class DocumentIR:
+    """
+    Compact, column-oriented representation of an extracted PDF: pages, blocks,
+    spans and tables as parallel typed arrays with offset indexes, plus two string
+    pools. Page/Block/Span/Table are __slots__ views over it, created on access.
+    """
+
+    __slots__ = tuple(name for name, _ in ARRAY_FIELDS) + STRING_FIELDS
+
+    def __init__(self, **columns):
+        for name, typecode in ARRAY_FIELDS:
+            setattr(self, name, columns.get(name, array(typecode)))
+        for name in STRING_FIELDS:
+            setattr(self, name, columns.get(name, ""))
+
+    @property
+    def page_count(self) -> int:
+        return len(self.page_size) // 2
+
+    @property
+    def pages(self) -> List[Page]:
+        return [Page(self, number) for number in range(self.page_count)]
+
+    def page_texts(self) -> List[str]:
+        return [page.text for page in self.pages]
+
+    def to_bytes(self) -> bytes:
+        """Header, then each column as (length, raw array bytes) and each pool as UTF-8"""
+        out = [struct.pack("<4sHB", IR_MAGIC, IR_VERSION, sys.byteorder == "little")]
+        for name, _ in ARRAY_FIELDS:
+            data = getattr(self, name).tobytes()
+            out.append(struct.pack("<Q", len(data)))
+            out.append(data)
+        for name in STRING_FIELDS:
+            data = getattr(self, name).encode("utf-8")
+            out.append(struct.pack("<Q", len(data)))
+            out.append(data)
+        return b"".join(out)
+
+    @classmethod
+    def from_bytes(cls, data: bytes) -> "DocumentIR":
+        view = memoryview(data)
+        magic, version, little = struct.unpack_from("<4sHB", view, 0)
+        if magic != IR_MAGIC or version != IR_VERSION:
+            raise ValueError("Not a document IR of this version")
+        offset = struct.calcsize("<4sHB")
+        columns = {}
+        for name, typecode in ARRAY_FIELDS:
+            (length,), offset = struct.unpack_from("<Q", view, offset), offset + 8
+            column = array(typecode)
+            column.frombytes(view[offset:offset + length])
+            if bool(little) != (sys.byteorder == "little"):
+                column.byteswap()
+            columns[name] = column
+            offset += length
+        for name in STRING_FIELDS:
+            (length,), offset = struct.unpack_from("<Q", view, offset), offset + 8
+            columns[name] = bytes(view[offset:offset + length]).decode("utf-8")
+            offset += length
+        return cls(**columns)
+
+    @classmethod
+    def concat(cls, parts: Sequence["DocumentIR"]) -> "DocumentIR":
+        """Join IRs of consecutive page ranges, shifting every offset index"""
+        merged = cls()
+        for name, _ in ARRAY_FIELDS:
+            if name in ("page_blocks", "page_tables", "block_spans", "span_text", "table_cells", "cell_text"):
+                getattr(merged, name).append(0)
+        for part in parts:
+            shifts = {
+                "page_blocks": len(merged.block_kind),
+                "page_tables": len(merged.table_shape) // 2,
+                "block_spans": len(merged.span_size),
+                "span_text": len(merged.span_pool),
+                "table_cells": len(merged.cell_text) - 1,
+                "cell_text": len(merged.cell_pool),
+            }
+            table_shift = len(merged.table_shape) // 2
+            for name, typecode in ARRAY_FIELDS:
+                column = getattr(part, name)
+                if name in shifts:
+                    getattr(merged, name).extend(array(typecode, (value + shifts[name] for value in column[1:])))
+                elif name == "block_table":
+                    merged.block_table.extend(array("i", (t + table_shift if t >= 0 else -1 for t in column)))
+                else:
+                    getattr(merged, name).extend(column)
+            merged.span_pool += part.span_pool
+            merged.cell_pool += part.cell_pool
+        return merged
+
+
+class IRBuilder:
+    """Appends PyMuPDF pages to the columns of a DocumentIR"""
+
+    def __init__(self):
+        self.ir = DocumentIR()
+        self._spans: List[str] = []
+        self._cells: List[str] = []
+        self._span_chars = 0
+        self._cell_chars = 0
+        for name in ("page_blocks", "page_tables", "block_spans", "span_text", "table_cells", "cell_text"):
+            getattr(self.ir, name).append(0)
+
+    def _add_tables(self, page) -> List[tuple]:
+        ir = self.ir
+        if not IR_DETECT_TABLES:
+            return []
+        try:
+            found = page.find_tables().tables
+        except Exception:
+            # Table detection is best effort; the text blocks are still extracted
+            return []
+        bboxes = []
+        for table in found:
+            rows = [["" if cell is None else str(cell) for cell in row] for row in table.extract()]
+            columns = max((len(row) for row in rows), default=0)
+            if not rows or not columns:
+                continue
+            ir.table_bbox.extend(table.bbox)
+            ir.table_shape.extend((len(rows), columns))
+            for row in rows:
+                for cell in row + [""] * (columns - len(row)):
+                    self._cells.append(cell)
+                    self._cell_chars += len(cell)
+                    ir.cell_text.append(self._cell_chars)
+            ir.table_cells.append(len(ir.cell_text) - 1)
+            bboxes.append(tuple(table.bbox))
+        return bboxes
+
+    def add_page(self, page) -> None:
+        fitz = _fitz()
+        ir = self.ir
+        ir.page_size.extend((page.rect.width, page.rect.height))
+        first_table = len(ir.table_shape) // 2
+        tables = self._add_tables(page)
+
+        flags = fitz.TEXTFLAGS_DICT & ~fitz.TEXT_PRESERVE_IMAGES
+        blocks = [block for block in page.get_text("dict", flags=flags)["blocks"] if block.get("type") == 0]
+        sizes = [span["size"] for block in blocks for line in block["lines"] for span in line["spans"] if span["text"].strip()]
+        body_size = statistics.median(sizes) if sizes else 0.0
+
+        for block in blocks:
+            spans = [(span, index == 0) for line in block["lines"] for index, span in enumerate(line["spans"])]
+            if not spans:
+                continue
+            x0, y0, x1, y1 = block["bbox"]
+            center = ((x0 + x1) / 2, (y0 + y1) / 2)
+            table = next((first_table + i for i, (tx0, ty0, tx1, ty1) in enumerate(tables)
+                          if tx0 <= center[0] <= tx1 and ty0 <= center[1] <= ty1), -1)
+
+            text_spans = [span for span, _ in spans if span["text"].strip()]
+            length = sum(len(span["text"]) for span in text_spans)
+            heading = (
+                table < 0 and text_spans and len(block["lines"]) <= 2 and length <= HEADING_MAX_CHARS
+                and (all(span["size"] >= body_size * HEADING_SIZE_RATIO for span in text_spans)
+                     or all(span["flags"] & SPAN_BOLD for span in text_spans))
+            )
+            ir.block_kind.append(BLOCK_TABLE if table >= 0 else BLOCK_HEADING if heading else BLOCK_TEXT)
+            ir.block_bbox.extend(block["bbox"])
+            ir.block_table.append(table)
+            for span, line_start in spans:
+                self._spans.append(span["text"])
+                self._span_chars += len(span["text"])
+                ir.span_text.append(self._span_chars)
+                ir.span_size.append(span["size"])
+                ir.span_flags.append(span["flags"] | (LINE_START if line_start else 0))
+            ir.block_spans.append(len(ir.span_size))
+
+        ir.page_blocks.append(len(ir.block_kind))
+        ir.page_tables.append(len(ir.table_shape) // 2)
+
+    def build(self) -> DocumentIR:
+        self.ir.span_pool = "".join(self._spans)
+        self.ir.cell_pool = "".join(self._cells)
+        return self.ir
+
+
+def _build_page_range(source: PdfSource, start: int, stop: int) -> bytes:
+    """Worker entry point: serialized IR of pages [start, stop) of one document"""
+    builder = IRBuilder()
+    with _open(source) as doc:
+        for i in range(start, stop):
+            builder.add_page(doc[i])
+    return builder.build().to_bytes()
+
+
+def build_document_ir(source: PdfSource, parser: Optional[PDFParser] = None) -> DocumentIR:
+    """Extract the IR of a PDF, page ranges in the extraction pool for long documents"""
+    parser = parser or PDFParser()
+    page_count = parser.page_count(source)
+    if parser.workers <= 1 or page_count < parser.parallel_min_pages:
+        return DocumentIR.from_bytes(_build_page_range(source, 0, page_count))
+
+    job = PageRangeJob(_build_page_range, source, page_count, parser.workers)
+    try:
+        return DocumentIR.concat([DocumentIR.from_bytes(data) for data in job.results()])
+    finally:
+        job.close()
+
+
+class IRCache:
+    """Serialized document IRs in SQLite, keyed by PDF hash, with LRU eviction by size"""
+
+    def __init__(self, path: str, max_bytes: int = 512 * 1024 * 1024):
+        self.path = path
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+
+        if path != ":memory:":
+            os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS document_ir (
+                key TEXT PRIMARY KEY,
+                data BLOB NOT NULL,
+                size INTEGER NOT NULL,
+                last_access REAL NOT NULL
+            )
+            """
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_document_ir_access ON document_ir (last_access)")
+        self._conn.commit()
+
+    def get(self, key: str) -> Optional[DocumentIR]:
+        with self._lock:
+            row = self._conn.execute("SELECT data FROM document_ir WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                return None
+            self._conn.execute("UPDATE document_ir SET last_access = ? WHERE key = ?", (time.time(), key))
+            self._conn.commit()
+        try:
+            return DocumentIR.from_bytes(row[0])
+        except (ValueError, struct.error):
+            return None
+
+    def set(self, key: str, ir: DocumentIR) -> None:
+        data = ir.to_bytes()
+        if len(data) > self.max_bytes:
+            return
+        with self._lock:
+            self._conn.execute("INSERT OR REPLACE INTO document_ir VALUES (?, ?, ?, ?)",
+                               (key, data, len(data), time.time()))
+            total = self._conn.execute("SELECT COALESCE(SUM(size), 0) FROM document_ir").fetchone()[0]
+            if total > self.max_bytes:
+                doomed = []
+                for old_key, size in self._conn.execute("SELECT key, size FROM document_ir ORDER BY last_access"):
+                    if total <= self.max_bytes:
+                        break
+                    doomed.append((old_key,))
+                    total -= size
+                self._conn.executemany("DELETE FROM document_ir WHERE key = ?", doomed)
+            self._conn.commit()
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def _get_cache() -> IRCache:
+    global _cache
+    with _cache_lock:
+        if _cache is None:
+            _cache = IRCache(IR_CACHE_PATH, IR_CACHE_MAX_BYTES)
+        return _cache
+
+
+def ir_version() -> str:
+    """What a cached IR holds: the IR layout and whether tables were detected"""
+    return f"ir{IR_VERSION}{'+tables' if IR_DETECT_TABLES else ''}"
+
+
+def extraction_version() -> str:
+    """Which extraction produces page text; "text" for plain get_text(), else the IR and rendering versions"""
+    if not STRUCTURED_EXTRACTION:
+        return "text"
+    return f"{ir_version()}.{TEXT_RENDER_VERSION}"
+
+
+def _source_hash(source: PdfSource) -> str:
+    digest = hashlib.sha256()
+    if isinstance(source, (bytes, bytearray, memoryview)):
+        digest.update(source)
+    else:
+        with open(source, "rb") as f:
+            for chunk in iter(lambda: f.read(1024 * 1024), b""):
+                digest.update(chunk)
+    return digest.hexdigest()
+
+
+def load_document_ir(source: PdfSource, pdf_hash: Optional[str] = None) -> DocumentIR:
+    """The document's IR from the cache, extracting and caching it on a miss"""
+    parser = PDFParser()
+    # Same IR settings as extraction_version(), so the IR and the analyses keyed on it agree
+    key = f"{pdf_hash or _source_hash(source)}:{ir_version()}:{parser.max_pages or 0}"
+    cache = _get_cache()
+    ir = cache.get(key)
+    if ir is None:
+        ir = build_document_ir(source, parser)
+        cache.set(key, ir)
+    return ir
+
+
+def structured_pages(source: PdfSource, pdf_hash: Optional[str] = None) -> List[str]:
+    """Page texts rendered from the cached IR, within the parser's page and byte budgets"""
+    parser = PDFParser()
+    texts: Iterator[str] = iter(load_document_ir(source, pdf_hash).page_texts())
+    return list(parser._budgeted(texts))
@@ -1,8 +1,37 @@
 # === Begin File: backend/utils/gpt_analyzer.py ===
-from openai import OpenAI
+import asyncio
 import os
+import queue
+import random
+import threading
+import time
+from typing import AsyncIterator, Dict, Iterator, List, Any, Optional, NamedTuple
 
-client = OpenAI(api_key=os.getenv("GPT_API_KEY"))
+from .metrics import LLM_REQUESTS, LLM_TOKENS, add_usage, current_labels, stage
+from .structured_output import parse_json_response
+
+GPT_MODEL = os.getenv("GPT_MODEL", "gpt-4")
+GPT_BASE_URL = os.getenv("GPT_BASE_URL") or None
+GPT_RPM = int(os.getenv("GPT_RPM", "500"))
+GPT_TPM = int(os.getenv("GPT_TPM", "80000"))
+GPT_MAX_RETRIES = int(os.getenv("GPT_MAX_RETRIES", "5"))
+GPT_TIMEOUT = float(os.getenv("GPT_TIMEOUT", "90"))
+GPT_MAX_CONNECTIONS = int(os.getenv("GPT_MAX_CONNECTIONS", "20"))
+# Less text than this is a scan OCR could not read, not something worth a model call
+GPT_MIN_TEXT_CHARS = int(os.getenv("GPT_MIN_TEXT_CHARS", "20"))
+# Context window (prompt and completion) by model name prefix, the longest match wins
+MODEL_CONTEXT_TOKENS = {
+    "gpt-3.5-turbo": 16385,
+    "gpt-4": 8192,
+    "gpt-4-32k": 32768,
+    "gpt-4-1106": 128000,
+    "gpt-4-0125": 128000,
+    "gpt-4-turbo": 128000,
+    "gpt-4o": 128000,
+    "gpt-4.1": 1047576,
+}
+# Overrides the table, e.g. for models behind GPT_BASE_URL
+GPT_CONTEXT_TOKENS = int(os.getenv("GPT_CONTEXT_TOKENS", "0"))
 
 SYSTEM_PROMPT = """
 You are a regulatory risk assistant. Given the extracted text of a supplier certificate, identify any potential issues.
@@ -12,19 +41,381 @@ Return a JSON object with:
 - summary: a one-paragraph plain-English explanation
 """
 
-def analyze_certificate_text(text: str) -> dict:
-    try:
-        response = client.chat.completions.create(
-            model="gpt-4",
-            messages=[
-                {"role": "system", "content": SYSTEM_PROMPT},
-                {"role": "user", "content": text}
-            ],
-            temperature=0.3,
-            max_tokens=400,
+
+class LLMError(Exception):
+    """The model call failed permanently or ran out of time"""
+
+
+class RateLimited(Exception):
+    """The upstream returned 429; retry_after is in seconds if it told us"""
+
+    def __init__(self, message: str = "rate limited", retry_after: Optional[float] = None):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+class TransientError(Exception):
+    """Timeouts, connection resets and 5xx responses worth retrying"""
+
+
+class Completion(NamedTuple):
+    text: str
+    prompt_tokens: int
+    completion_tokens: int
+    finish_reason: Optional[str]
+
+
+def estimate_tokens(text: str) -> int:
+    return (len(text) + 3) // 4
+
+
+def context_window(model: str) -> int:
+    """Tokens one call to model can hold; unknown models get the smallest window in the table"""
+    if GPT_CONTEXT_TOKENS:
+        return GPT_CONTEXT_TOKENS
+    matches = [prefix for prefix in MODEL_CONTEXT_TOKENS if model.startswith(prefix)]
+    if not matches:
+        return min(MODEL_CONTEXT_TOKENS.values())
+    return MODEL_CONTEXT_TOKENS[max(matches, key=len)]
+
+
+class TokenBucket:
+    """Continuously refilling bucket; acquire() waits until enough capacity exists"""
+
+    def __init__(self, per_minute: int):
+        self.capacity = float(per_minute)
+        self.rate = per_minute / 60.0
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    def _refill(self) -> None:
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    async def acquire(self, amount: float, deadline: float) -> None:
+        amount = min(amount, self.capacity)
+        async with self._lock:
+            while True:
+                self._refill()
+                if self.tokens >= amount:
+                    self.tokens -= amount
+                    return
+                wait = (amount - self.tokens) / self.rate
+                if time.monotonic() + wait > deadline:
+                    raise LLMError("Rate limit budget exhausted before deadline")
+                await asyncio.sleep(wait)
+
+    def penalize(self, seconds: float) -> None:
+        """Drain the bucket after an upstream 429 so callers back off together"""
+        self._refill()
+        self.tokens = min(self.tokens, -seconds * self.rate)
+
+
+class OpenAITransport:
+    """Async OpenAI-compatible transport over a keep-alive connection pool"""
+
+    def __init__(self, api_key: Optional[str] = None, base_url: Optional[str] = GPT_BASE_URL,
+                 max_connections: int = GPT_MAX_CONNECTIONS):
+        import httpx
+        from openai import AsyncOpenAI
+
+        self._client = AsyncOpenAI(
+            api_key=api_key or os.getenv("GPT_API_KEY"),
+            base_url=base_url,
+            max_retries=0,  # retries are scheduled by LLMClient
+            http_client=httpx.AsyncClient(
+                limits=httpx.Limits(max_connections=max_connections, max_keepalive_connections=max_connections),
+            ),
+        )
+
+    async def complete(self, messages: List[Dict[str, str]], model: str, temperature: float,
+                       max_tokens: int, timeout: float, **kwargs) -> Completion:
+        import openai
+
+        try:
+            response = await self._client.chat.completions.create(
+                model=model,
+                messages=messages,
+                temperature=temperature,
+                max_tokens=max_tokens,
+                timeout=timeout,
+                **kwargs,
+            )
+        except openai.RateLimitError as e:
+            retry_after = e.response.headers.get("retry-after") if e.response is not None else None
+            raise RateLimited(str(e), float(retry_after) if retry_after else None)
+        except (openai.APITimeoutError, openai.APIConnectionError, openai.InternalServerError) as e:
+            raise TransientError(str(e))
+
+        choice = response.choices[0]
+        usage = response.usage
+        return Completion(
+            text=choice.message.content or "",
+            prompt_tokens=usage.prompt_tokens if usage else 0,
+            completion_tokens=usage.completion_tokens if usage else 0,
+            finish_reason=choice.finish_reason,
         )
-        output = response.choices[0].message.content
-        return eval(output) if output.startswith("{") else {"summary": output}
-    except Exception as e:
-        return {"error": str(e)}
+
+    async def stream(self, messages: List[Dict[str, str]], model: str, temperature: float,
+                     max_tokens: int, timeout: float, **kwargs) -> AsyncIterator[str]:
+        """Yield content deltas as the model produces them"""
+        import openai
+
+        try:
+            response = await self._client.chat.completions.create(
+                model=model,
+                messages=messages,
+                temperature=temperature,
+                max_tokens=max_tokens,
+                timeout=timeout,
+                stream=True,
+                **kwargs,
+            )
+        except openai.RateLimitError as e:
+            retry_after = e.response.headers.get("retry-after") if e.response is not None else None
+            raise RateLimited(str(e), float(retry_after) if retry_after else None)
+        except (openai.APITimeoutError, openai.APIConnectionError, openai.InternalServerError) as e:
+            raise TransientError(str(e))
+
+        async for chunk in response:
+            if chunk.choices and chunk.choices[0].delta.content:
+                yield chunk.choices[0].delta.content
+
+
+class LLMClient:
+    """
+    Shared async client: one event loop thread, one connection pool, RPM/TPM token
+    buckets, jittered exponential backoff and a deadline per call
+    """
+
+    def __init__(self, transport=None, rpm: int = GPT_RPM, tpm: int = GPT_TPM,
+                 max_retries: int = GPT_MAX_RETRIES, timeout: float = GPT_TIMEOUT):
+        self.max_retries = max_retries
+        self.timeout = timeout
+        self._loop = asyncio.new_event_loop()
+        self._thread = threading.Thread(target=self._loop.run_forever, name="llm-client", daemon=True)
+        self._thread.start()
+        self._transport = transport
+        self._transport_factory = OpenAITransport
+        self._requests = None
+        self._tokens = None
+        self._rpm = rpm
+        self._tpm = tpm
+
+    async def _setup(self) -> None:
+        # Buckets and transport must be created on the client's own loop
+        if self._requests is None:
+            self._requests = TokenBucket(self._rpm)
+            self._tokens = TokenBucket(self._tpm)
+        if self._transport is None:
+            self._transport = self._transport_factory()
+
+    def warm_up(self) -> None:
+        """Create the transport and connection pool now rather than on the first request"""
+        asyncio.run_coroutine_threadsafe(self._setup(), self._loop).result()
+
+    async def acomplete(self, messages: List[Dict[str, str]], model: str = GPT_MODEL, temperature: float = 0.3,
+                        max_tokens: int = 1500, timeout: Optional[float] = None, **kwargs) -> Completion:
+        await self._setup()
+        deadline = time.monotonic() + (timeout or self.timeout)
+        expected_tokens = sum(estimate_tokens(m["content"]) for m in messages) + max_tokens
+
+        for attempt in range(self.max_retries + 1):
+            await self._requests.acquire(1, deadline)
+            await self._tokens.acquire(expected_tokens, deadline)
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                return await self._transport.complete(messages, model, temperature, max_tokens, remaining, **kwargs)
+            except RateLimited as e:
+                delay = e.retry_after if e.retry_after is not None else self._backoff(attempt)
+                self._requests.penalize(delay)
+            except TransientError:
+                delay = self._backoff(attempt)
+
+            if attempt == self.max_retries or time.monotonic() + delay >= deadline:
+                break
+            await asyncio.sleep(delay)
+
+        raise LLMError(f"Model call failed after {attempt + 1} attempts")
+
+    async def astream(self, messages: List[Dict[str, str]], model: str = GPT_MODEL, temperature: float = 0.3,
+                      max_tokens: int = 1500, timeout: Optional[float] = None, **kwargs) -> AsyncIterator[str]:
+        """Streaming variant of acomplete; retries only until the first delta arrives"""
+        await self._setup()
+        deadline = time.monotonic() + (timeout or self.timeout)
+        expected_tokens = sum(estimate_tokens(m["content"]) for m in messages) + max_tokens
+
+        for attempt in range(self.max_retries + 1):
+            await self._requests.acquire(1, deadline)
+            await self._tokens.acquire(expected_tokens, deadline)
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            started = False
+            try:
+                async for delta in self._transport.stream(messages, model, temperature, max_tokens, remaining, **kwargs):
+                    started = True
+                    yield delta
+                return
+            except RateLimited as e:
+                if started:
+                    raise LLMError(str(e))
+                delay = e.retry_after if e.retry_after is not None else self._backoff(attempt)
+                self._requests.penalize(delay)
+            except TransientError as e:
+                if started:
+                    raise LLMError(str(e))
+                delay = self._backoff(attempt)
+
+            if attempt == self.max_retries or time.monotonic() + delay >= deadline:
+                break
+            await asyncio.sleep(delay)
+
+        raise LLMError(f"Model stream failed after {attempt + 1} attempts")
+
+    @staticmethod
+    def _backoff(attempt: int, base: float = 0.5, cap: float = 20.0) -> float:
+        # Full jitter keeps many retrying callers from synchronising
+        return random.uniform(0, min(cap, base * (2 ** attempt)))
+
+    def complete(self, messages: List[Dict[str, str]], **kwargs) -> Completion:
+        """Blocking wrapper for request threads"""
+        future = asyncio.run_coroutine_threadsafe(self.acomplete(messages, **kwargs), self._loop)
+        return future.result()
+
+    def stream(self, messages: List[Dict[str, str]], **kwargs) -> Iterator[str]:
+        """Blocking iterator over streamed deltas for request threads"""
+        deltas = queue.Queue()
+        done = object()
+
+        async def pump():
+            try:
+                async for delta in self.astream(messages, **kwargs):
+                    deltas.put(delta)
+            except Exception as e:
+                deltas.put(e)
+            finally:
+                deltas.put(done)
+
+        future = asyncio.run_coroutine_threadsafe(pump(), self._loop)
+        try:
+            while True:
+                item = deltas.get()
+                if item is done:
+                    return
+                if isinstance(item, Exception):
+                    raise item
+                yield item
+        finally:
+            # Client went away mid-stream: stop pulling tokens from upstream
+            future.cancel()
+
+
+_client = None
+_client_lock = threading.Lock()
+
+
+def get_llm_client() -> LLMClient:
+    """Process-wide client, created on first use"""
+    global _client
+    with _client_lock:
+        if _client is None:
+            _client = LLMClient()
+        return _client
+
+
+def set_llm_client(client: Optional[LLMClient]) -> None:
+    """Swap the process-wide client, e.g. for one backed by a stub transport"""
+    global _client
+    with _client_lock:
+        _client = client
+
+
+class GPTAnalyzer:
+    """Base analyzer that sends prompts through the shared LLM client"""
+
+    def __init__(self, client: Optional[LLMClient] = None, model: str = GPT_MODEL):
+        self._client = client
+        self.model = model
+
+    @property
+    def client(self) -> LLMClient:
+        return self._client or get_llm_client()
+
+    def analyze_text(self, prompt: str, system_prompt: Optional[str] = None,
+                     max_tokens: int = 1500, temperature: float = 0.3, **kwargs) -> str:
+        """Send one prompt and return the model's text"""
+        messages = []
+        if system_prompt:
+            messages.append({"role": "system", "content": system_prompt})
+        messages.append({"role": "user", "content": prompt})
+        labels = current_labels()
+        try:
+            with stage("llm"):
+                completion = self.client.complete(messages, model=self.model, temperature=temperature,
+                                                  max_tokens=max_tokens, **kwargs)
+        except Exception:
+            LLM_REQUESTS.inc(outcome="error", **labels)
+            raise
+        LLM_REQUESTS.inc(outcome=completion.finish_reason or "stop", **labels)
+        LLM_TOKENS.inc(completion.prompt_tokens, kind="prompt", **labels)
+        LLM_TOKENS.inc(completion.completion_tokens, kind="completion", **labels)
+        add_usage("llm_tokens", completion.prompt_tokens + completion.completion_tokens)
+        return completion.text
+
+    def stream_text(self, prompt: str, system_prompt: Optional[str] = None,
+                    max_tokens: int = 1500, temperature: float = 0.3, **kwargs) -> Iterator[str]:
+        """Send one prompt and yield the model's text as it arrives"""
+        messages = []
+        if system_prompt:
+            messages.append({"role": "system", "content": system_prompt})
+        messages.append({"role": "user", "content": prompt})
+        labels = current_labels()
+        text = ""
+        deltas = self.client.stream(messages, model=self.model, temperature=temperature,
+                                    max_tokens=max_tokens, **kwargs)
+        try:
+            with stage("llm"):
+                for delta in deltas:
+                    text += delta
+                    yield delta
+        except Exception:
+            LLM_REQUESTS.inc(outcome="error", **labels)
+            raise
+        finally:
+            # Closing early must still cancel the upstream request
+            deltas.close()
+        # Streamed responses carry no usage block, so tokens are estimated
+        LLM_REQUESTS.inc(outcome="stream", **labels)
+        prompt_tokens = estimate_tokens(prompt + (system_prompt or ""))
+        LLM_TOKENS.inc(prompt_tokens, kind="prompt", **labels)
+        LLM_TOKENS.inc(estimate_tokens(text), kind="completion", **labels)
+        add_usage("llm_tokens", prompt_tokens + estimate_tokens(text))
+
+    def analyze(self, text: str) -> Dict[str, Any]:
+        """Supplier certificate risk review for non-CE documents"""
+        if len(text.strip()) < GPT_MIN_TEXT_CHARS:
+            return {
+                "risk_level": "Unknown",
+                "flags": ["No readable text found in the document"],
+                "summary": "The document could not be assessed because no text could be extracted from it, "
+                           "even with OCR. Upload a text-based PDF or a clearer scan.",
+                "llm_skipped": True
+            }
+        try:
+            output = self.analyze_text(text, system_prompt=SYSTEM_PROMPT, max_tokens=400)
+            data, truncated = parse_json_response(output)
+            if not isinstance(data, dict):
+                return {"summary": output}
+            return {**data, "truncated": True} if truncated else data
+        except Exception as e:
+            return {"error": str(e)}
+
+
+def analyze_certificate_text(text: str) -> dict:
+    return GPTAnalyzer().analyze(text)
 # === End File: backend/utils/gpt_analyzer.py ===
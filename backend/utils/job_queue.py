@@ -0,0 +1,300 @@
+import json
+import os
+import socket
+import sqlite3
+import threading
+import time
+import traceback
+import uuid
+from typing import Callable, Dict, Any, Iterable, Optional, Set
+
+QUEUED = "queued"
+RUNNING = "running"
+SUCCEEDED = "succeeded"
+FAILED = "failed"
+
+
+class QueueFull(Exception):
+    """Raised when the number of pending jobs is at the configured limit"""
+
+
+class JobQueue:
+    """Durable job queue on a local SQLite file, shared by web and worker processes"""
+
+    def __init__(self, path: str, max_pending: int = 500):
+        self.path = path
+        self.max_pending = max_pending
+        self._local = threading.local()
+        self._wakeup = threading.Condition()
+
+        if path != ":memory:":
+            os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        conn = self._conn()
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS jobs (
+                id TEXT PRIMARY KEY,
+                kind TEXT NOT NULL,
+                status TEXT NOT NULL,
+                payload TEXT NOT NULL,
+                result TEXT,
+                error TEXT,
+                attempts INTEGER NOT NULL DEFAULT 0,
+                created_at REAL NOT NULL,
+                started_at REAL,
+                finished_at REAL,
+                shop TEXT,
+                vfinish REAL NOT NULL DEFAULT 0,
+                claimed_by TEXT,
+                heartbeat_at REAL
+            )
+            """
+        )
+        # Queues created before fair scheduling or heartbeats lack those columns
+        columns = {row["name"] for row in conn.execute("PRAGMA table_info(jobs)")}
+        if "shop" not in columns:
+            conn.execute("ALTER TABLE jobs ADD COLUMN shop TEXT")
+        if "vfinish" not in columns:
+            conn.execute("ALTER TABLE jobs ADD COLUMN vfinish REAL NOT NULL DEFAULT 0")
+        if "claimed_by" not in columns:
+            conn.execute("ALTER TABLE jobs ADD COLUMN claimed_by TEXT")
+        if "heartbeat_at" not in columns:
+            conn.execute("ALTER TABLE jobs ADD COLUMN heartbeat_at REAL")
+        conn.execute("CREATE TABLE IF NOT EXISTS queue_clock (id INTEGER PRIMARY KEY CHECK (id = 1), vtime REAL NOT NULL)")
+        conn.execute("INSERT OR IGNORE INTO queue_clock (id, vtime) VALUES (1, 0)")
+        conn.execute("CREATE INDEX IF NOT EXISTS idx_jobs_status_created ON jobs (status, created_at)")
+        conn.execute("CREATE INDEX IF NOT EXISTS idx_jobs_status_vfinish ON jobs (status, vfinish)")
+        conn.execute("CREATE INDEX IF NOT EXISTS idx_jobs_shop_status ON jobs (shop, status)")
+
+    @classmethod
+    def from_config(cls, config) -> "JobQueue":
+        return cls(path=config["JOB_QUEUE_PATH"], max_pending=config["JOB_MAX_PENDING"])
+
+    def _conn(self) -> sqlite3.Connection:
+        # One connection per thread; autocommit with explicit transactions for claims
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            conn.row_factory = sqlite3.Row
+            self._local.conn = conn
+        return conn
+
+    def pending(self) -> int:
+        """Jobs queued or running, across all shops"""
+        return self._conn().execute(
+            "SELECT COUNT(*) FROM jobs WHERE status IN (?, ?)", (QUEUED, RUNNING)
+        ).fetchone()[0]
+
+    def pending_files(self) -> Set[str]:
+        """Absolute paths in the filepath of queued and running jobs, which must stay on disk"""
+        rows = self._conn().execute(
+            "SELECT json_extract(payload, '$.filepath') FROM jobs WHERE status IN (?, ?)", (QUEUED, RUNNING)
+        ).fetchall()
+        return {os.path.abspath(row[0]) for row in rows if row[0]}
+
+    def enqueue(self, kind: str, payload: Dict[str, Any], shop: Optional[str] = None,
+                weight: float = 1.0, cost: float = 1.0) -> str:
+        """
+        Add a job and return its id. Jobs are tagged for weighted fair queuing:
+        a shop's job finishes, in virtual time, cost / weight after the later of
+        the queue clock and the shop's previous job, and claim() takes the
+        smallest tag, so shops with long backlogs interleave with everyone else.
+        """
+        conn = self._conn()
+        job_id = str(uuid.uuid4())
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            pending = conn.execute(
+                "SELECT COUNT(*) FROM jobs WHERE status IN (?, ?)", (QUEUED, RUNNING)
+            ).fetchone()[0]
+            if pending >= self.max_pending:
+                raise QueueFull(f"{pending} jobs pending")
+
+            vtime = conn.execute("SELECT vtime FROM queue_clock WHERE id = 1").fetchone()[0]
+            last_finish = conn.execute(
+                "SELECT MAX(vfinish) FROM jobs WHERE shop IS ? AND status IN (?, ?)", (shop, QUEUED, RUNNING)
+            ).fetchone()[0]
+            vfinish = max(vtime, last_finish or 0.0) + cost / weight
+            conn.execute(
+                "INSERT INTO jobs (id, kind, status, payload, created_at, shop, vfinish) VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (job_id, kind, QUEUED, json.dumps(payload), time.time(), shop, vfinish),
+            )
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        with self._wakeup:
+            self._wakeup.notify()
+        return job_id
+
+    def claim(self, worker_id: Optional[str] = None) -> Optional[Dict[str, Any]]:
+        """
+        Atomically move the queued job with the smallest fair-queuing tag to running,
+        claimed by worker_id, and return it
+        """
+        conn = self._conn()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            row = conn.execute(
+                "SELECT id, vfinish FROM jobs WHERE status = ? ORDER BY vfinish, created_at LIMIT 1", (QUEUED,)
+            ).fetchone()
+            if row is None:
+                conn.execute("COMMIT")
+                return None
+            now = time.time()
+            conn.execute(
+                "UPDATE jobs SET status = ?, started_at = ?, attempts = attempts + 1, claimed_by = ?, heartbeat_at = ? "
+                "WHERE id = ?",
+                (RUNNING, now, worker_id, now, row["id"]),
+            )
+            # Self-clocked fair queuing: virtual time follows the tag of the job put into service
+            conn.execute("UPDATE queue_clock SET vtime = MAX(vtime, ?) WHERE id = 1", (row["vfinish"],))
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        return self.get(row["id"])
+
+    def complete(self, job_id: str, result: Dict[str, Any], worker_id: Optional[str] = None) -> bool:
+        """Store the result; False if the job was requeued and is no longer this worker's"""
+        cursor = self._conn().execute(
+            "UPDATE jobs SET status = ?, result = ?, finished_at = ? WHERE id = ? AND status = ? AND claimed_by IS ?",
+            (SUCCEEDED, json.dumps(result), time.time(), job_id, RUNNING, worker_id),
+        )
+        return cursor.rowcount > 0
+
+    def fail(self, job_id: str, error: str, worker_id: Optional[str] = None) -> bool:
+        cursor = self._conn().execute(
+            "UPDATE jobs SET status = ?, error = ?, finished_at = ? WHERE id = ? AND status = ? AND claimed_by IS ?",
+            (FAILED, error, time.time(), job_id, RUNNING, worker_id),
+        )
+        return cursor.rowcount > 0
+
+    def heartbeat(self, job_ids: Iterable[str], worker_id: Optional[str]) -> None:
+        """Mark the running jobs of a live worker as still being worked on"""
+        conn = self._conn()
+        now = time.time()
+        conn.executemany(
+            "UPDATE jobs SET heartbeat_at = ? WHERE id = ? AND status = ? AND claimed_by IS ?",
+            [(now, job_id, RUNNING, worker_id) for job_id in job_ids],
+        )
+
+    def requeue_stale(self, heartbeat_timeout: float) -> int:
+        """Put running jobs whose worker stopped sending heartbeats back on the queue"""
+        cursor = self._conn().execute(
+            "UPDATE jobs SET status = ?, started_at = NULL, claimed_by = NULL, heartbeat_at = NULL "
+            "WHERE status = ? AND COALESCE(heartbeat_at, started_at) < ?",
+            (QUEUED, RUNNING, time.time() - heartbeat_timeout),
+        )
+        if cursor.rowcount:
+            with self._wakeup:
+                self._wakeup.notify_all()
+        return cursor.rowcount
+
+    def get(self, job_id: str) -> Optional[Dict[str, Any]]:
+        row = self._conn().execute("SELECT * FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        if row is None:
+            return None
+        job = dict(row)
+        job["payload"] = json.loads(job["payload"])
+        job["result"] = json.loads(job["result"]) if job["result"] else None
+        return job
+
+    def wait_for_work(self, timeout: float) -> None:
+        """Block until a job is enqueued in this process or timeout elapses"""
+        with self._wakeup:
+            self._wakeup.wait(timeout)
+
+
+class WorkerPool:
+    """
+    Bounded pool of threads that drain a JobQueue. Jobs are claimed under a
+    host:pid:id worker id, and a heartbeat thread refreshes the running ones every
+    heartbeat_interval. The same thread requeues jobs of any pool, in any process,
+    whose heartbeat is older than heartbeat_timeout, so a dead worker's jobs run
+    again while slow ones that are still alive are left alone.
+    """
+
+    def __init__(self, queue: JobQueue, handlers: Dict[str, Callable[[Dict[str, Any]], Dict[str, Any]]],
+                 workers: int = 2, poll_interval: float = 1.0, heartbeat_interval: float = 10.0,
+                 heartbeat_timeout: float = 60.0):
+        self.queue = queue
+        self.handlers = handlers
+        self.workers = workers
+        self.poll_interval = poll_interval
+        self.heartbeat_interval = heartbeat_interval
+        self.heartbeat_timeout = heartbeat_timeout
+        self.worker_id = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+        self._running = set()
+        self._running_lock = threading.Lock()
+        self._threads = []
+        self._stopping = threading.Event()
+
+    def start(self) -> None:
+        if self._threads:
+            return
+        self.queue.requeue_stale(self.heartbeat_timeout)
+        for i in range(self.workers):
+            thread = threading.Thread(target=self._run, name=f"job-worker-{i}", daemon=True)
+            thread.start()
+            self._threads.append(thread)
+        thread = threading.Thread(target=self._heartbeat, name="job-heartbeat", daemon=True)
+        thread.start()
+        self._threads.append(thread)
+
+    def stop(self, timeout: float = 5.0) -> None:
+        self._stopping.set()
+        with self.queue._wakeup:
+            self.queue._wakeup.notify_all()
+        for thread in self._threads:
+            thread.join(timeout)
+        self._threads = []
+
+    def run_forever(self) -> None:
+        """Entry point for a dedicated worker process"""
+        self.start()
+        try:
+            while not self._stopping.is_set():
+                time.sleep(self.poll_interval)
+        except KeyboardInterrupt:
+            pass
+        finally:
+            self.stop()
+
+    def _heartbeat(self) -> None:
+        while not self._stopping.wait(self.heartbeat_interval):
+            try:
+                with self._running_lock:
+                    running = list(self._running)
+                if running:
+                    self.queue.heartbeat(running, self.worker_id)
+                self.queue.requeue_stale(self.heartbeat_timeout)
+            except sqlite3.Error:
+                traceback.print_exc()
+
+    def _run(self) -> None:
+        while not self._stopping.is_set():
+            job = self.queue.claim(self.worker_id)
+            if job is None:
+                self.queue.wait_for_work(self.poll_interval)
+                continue
+            with self._running_lock:
+                self._running.add(job["id"])
+            try:
+                self._execute(job)
+            finally:
+                with self._running_lock:
+                    self._running.discard(job["id"])
+
+    def _execute(self, job: Dict[str, Any]) -> None:
+        handler = self.handlers.get(job["kind"])
+        if handler is None:
+            self.queue.fail(job["id"], f"No handler for job kind '{job['kind']}'", self.worker_id)
+            return
+        try:
+            result = handler(job["payload"])
+            self.queue.complete(job["id"], result, self.worker_id)
+        except Exception as e:
+            traceback.print_exc()
+            self.queue.fail(job["id"], str(e), self.worker_id)
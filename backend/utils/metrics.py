@@ -0,0 +1,327 @@
+import atexit
+import contextvars
+import json
+import os
+import tempfile
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0)
+
+
+def _escape(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _label_text(names: Tuple[str, ...], values: Tuple[str, ...], extra: str = "") -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+class Counter:
+    def __init__(self, name: str, documentation: str, labelnames: Tuple[str, ...] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = labelnames
+        self._values: Dict[Tuple[str, ...], float] = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float = 1.0, **labels) -> None:
+        key = tuple(str(labels.get(name, "")) for name in self.labelnames)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def snapshot(self) -> Dict[Tuple[str, ...], float]:
+        with self._lock:
+            return dict(self._values)
+
+    @staticmethod
+    def merge(total: Dict[Tuple[str, ...], Any], values: Dict[Tuple[str, ...], Any]) -> None:
+        for key, value in values.items():
+            total[key] = total.get(key, 0.0) + value
+
+    def render(self, values: Optional[Dict[Tuple[str, ...], float]] = None) -> List[str]:
+        values = self.snapshot() if values is None else values
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} counter"]
+        for key, value in sorted(values.items()):
+            lines.append(f"{self.name}{_label_text(self.labelnames, key)} {value:g}")
+        return lines
+
+
+class Histogram:
+    def __init__(self, name: str, documentation: str, labelnames: Tuple[str, ...] = (),
+                 buckets: Tuple[float, ...] = DEFAULT_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = labelnames
+        self.buckets = tuple(sorted(buckets))
+        self._series: Dict[Tuple[str, ...], List[float]] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, **labels) -> None:
+        key = tuple(str(labels.get(name, "")) for name in self.labelnames)
+        with self._lock:
+            # Per-bucket (non-cumulative) counts followed by sum and count
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = [0.0] * (len(self.buckets) + 2)
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series[i] += 1
+                    break
+            series[-2] += value
+            series[-1] += 1
+
+    def snapshot(self) -> Dict[Tuple[str, ...], List[float]]:
+        with self._lock:
+            return {key: list(series) for key, series in self._series.items()}
+
+    @staticmethod
+    def merge(total: Dict[Tuple[str, ...], Any], values: Dict[Tuple[str, ...], Any]) -> None:
+        for key, series in values.items():
+            if key in total:
+                total[key] = [a + b for a, b in zip(total[key], series)]
+            else:
+                total[key] = list(series)
+
+    def render(self, values: Optional[Dict[Tuple[str, ...], List[float]]] = None) -> List[str]:
+        values = self.snapshot() if values is None else values
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} histogram"]
+        for key, series in sorted(values.items()):
+            cumulative = 0.0
+            for bound, count in zip(self.buckets, series):
+                cumulative += count
+                labels = _label_text(self.labelnames, key, 'le="%g"' % bound)
+                lines.append(f"{self.name}_bucket{labels} {cumulative:g}")
+            labels = _label_text(self.labelnames, key, 'le="+Inf"')
+            lines.append(f"{self.name}_bucket{labels} {series[-1]:g}")
+            lines.append(f"{self.name}_sum{_label_text(self.labelnames, key)} {series[-2]:g}")
+            lines.append(f"{self.name}_count{_label_text(self.labelnames, key)} {series[-1]:g}")
+        return lines
+
+
+class Registry:
+    """
+    The process's metrics. With a multiprocess directory (gunicorn runs several
+    workers, and the job worker is its own process) every process also writes its
+    values to <directory>/metrics-<pid>.json every flush interval and on exit, and
+    render() sums the files of all processes, so any worker can answer a scrape.
+    Files of exited processes are kept so counters never go backwards; the
+    directory is cleared when the gunicorn master starts.
+    """
+
+    def __init__(self):
+        self._metrics = []
+        self.directory: Optional[str] = None
+        self._flush_lock = threading.Lock()
+        self._flusher = None
+
+    def counter(self, name: str, documentation: str, labelnames: Tuple[str, ...] = ()) -> Counter:
+        metric = Counter(name, documentation, labelnames)
+        self._metrics.append(metric)
+        return metric
+
+    def histogram(self, name: str, documentation: str, labelnames: Tuple[str, ...] = (),
+                  buckets: Tuple[float, ...] = DEFAULT_BUCKETS) -> Histogram:
+        metric = Histogram(name, documentation, labelnames, buckets)
+        self._metrics.append(metric)
+        return metric
+
+    def enable_multiprocess(self, directory: str, interval: float = 5.0) -> None:
+        """Share this process's values through directory; safe to call once per process"""
+        if self._flusher is not None:
+            return
+        os.makedirs(directory, exist_ok=True)
+        self.directory = directory
+        self._flusher = threading.Thread(target=self._flush_forever, args=(interval,), name="metrics-flush",
+                                         daemon=True)
+        self._flusher.start()
+        atexit.register(self.flush)
+
+    def _flush_forever(self, interval: float) -> None:
+        while True:
+            time.sleep(interval)
+            self.flush()
+
+    def flush(self) -> None:
+        """Write this process's values to its file in the multiprocess directory"""
+        if self.directory is None:
+            return
+        data = {metric.name: [[list(key), value] for key, value in metric.snapshot().items()]
+                for metric in self._metrics}
+        with self._flush_lock:
+            fd, tmp = tempfile.mkstemp(dir=self.directory, suffix=".tmp")
+            with os.fdopen(fd, "w") as f:
+                json.dump(data, f)
+            os.replace(tmp, os.path.join(self.directory, f"metrics-{os.getpid()}.json"))
+
+    def _collect(self) -> Dict[str, Dict[Tuple[str, ...], Any]]:
+        """Values of every process that wrote to the directory, summed per metric and label set"""
+        self.flush()
+        by_name = {metric.name: metric for metric in self._metrics}
+        totals: Dict[str, Dict[Tuple[str, ...], Any]] = {name: {} for name in by_name}
+        for entry in os.listdir(self.directory):
+            if not (entry.startswith("metrics-") and entry.endswith(".json")):
+                continue
+            try:
+                with open(os.path.join(self.directory, entry)) as f:
+                    data = json.load(f)
+            except (FileNotFoundError, ValueError):
+                continue
+            for name, items in data.items():
+                if name in by_name:
+                    by_name[name].merge(totals[name], {tuple(key): value for key, value in items})
+        return totals
+
+    def render(self) -> str:
+        totals = self._collect() if self.directory is not None else {}
+        lines = []
+        for metric in self._metrics:
+            lines.extend(metric.render(totals.get(metric.name)))
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = Registry()
+
+DOC_LABELS = ("document_type", "product_category")
+# Label values come from form fields, so distinct values are capped per label
+MAX_LABEL_VALUES = 64
+
+HTTP_REQUEST_SECONDS = REGISTRY.histogram(
+    "compliance_http_request_seconds", "HTTP request latency until the response is returned",
+    ("endpoint", "method", "status"))
+STAGE_SECONDS = REGISTRY.histogram(
+    "compliance_stage_seconds", "Time spent per pipeline stage", ("stage",) + DOC_LABELS)
+UPLOAD_BYTES = REGISTRY.counter(
+    "compliance_upload_bytes_total", "Bytes of PDF received", DOC_LABELS)
+PAGES_EXTRACTED = REGISTRY.counter(
+    "compliance_pages_extracted_total", "PDF pages extracted", DOC_LABELS)
+TEXT_BYTES_EXTRACTED = REGISTRY.counter(
+    "compliance_text_bytes_extracted_total", "Characters of text extracted from PDFs", DOC_LABELS)
+OCR_PAGES = REGISTRY.counter(
+    "compliance_ocr_pages_total", "Pages without a text layer handled by the OCR lane", ("outcome",) + DOC_LABELS)
+LLM_REQUESTS = REGISTRY.counter(
+    "compliance_llm_requests_total", "Model calls by outcome", ("outcome",) + DOC_LABELS)
+LLM_TOKENS = REGISTRY.counter(
+    "compliance_llm_tokens_total", "Model tokens used", ("kind",) + DOC_LABELS)
+
+
+class RequestTimings:
+    """Per-request stage durations, metric labels and billable usage, carried in a context variable"""
+
+    def __init__(self, parent: Optional["RequestTimings"] = None):
+        self.labels = {"document_type": "", "product_category": ""}
+        self.stages: Dict[str, float] = {}
+        self.usage: Dict[str, int] = {}
+        self.parent = parent
+        self._lock = threading.Lock()
+
+    def add(self, stage: str, seconds: float) -> None:
+        with self._lock:
+            self.stages[stage] = self.stages.get(stage, 0.0) + seconds
+        if self.parent is not None:
+            self.parent.add(stage, seconds)
+
+    def count(self, name: str, amount: int) -> None:
+        with self._lock:
+            self.usage[name] = self.usage.get(name, 0) + amount
+
+    def drain(self) -> Dict[str, int]:
+        with self._lock:
+            usage, self.usage = self.usage, {}
+        return usage
+
+    def server_timing(self) -> str:
+        with self._lock:
+            return ", ".join(f"{stage};dur={seconds * 1000:.1f}" for stage, seconds in self.stages.items())
+
+
+_current: contextvars.ContextVar[Optional[RequestTimings]] = contextvars.ContextVar("request_timings", default=None)
+
+
+def begin_request() -> RequestTimings:
+    timings = RequestTimings()
+    _current.set(timings)
+    return timings
+
+
+def begin_document() -> RequestTimings:
+    """
+    Timings for one document of a batch, inside a propagate()d call: its own labels
+    and usage, with stage times also added to the request's
+    """
+    timings = RequestTimings(parent=_current.get())
+    _current.set(timings)
+    return timings
+
+
+def current_timings() -> Optional[RequestTimings]:
+    return _current.get()
+
+
+def current_labels() -> Dict[str, str]:
+    timings = _current.get()
+    return dict(timings.labels) if timings else {"document_type": "", "product_category": ""}
+
+
+_seen_label_values: Dict[str, set] = {name: set() for name in DOC_LABELS}
+_seen_lock = threading.Lock()
+
+
+def _bounded(label: str, value: str) -> str:
+    with _seen_lock:
+        seen = _seen_label_values[label]
+        if value in seen:
+            return value
+        if len(seen) >= MAX_LABEL_VALUES:
+            return "other"
+        seen.add(value)
+        return value
+
+
+def set_labels(document_type: Optional[str], product_category: Optional[str]) -> None:
+    """Label everything measured from here on in this request or job"""
+    timings = _current.get()
+    if timings is None:
+        timings = begin_request()
+    timings.labels = {
+        "document_type": _bounded("document_type", document_type or ""),
+        "product_category": _bounded("product_category", product_category or "general"),
+    }
+
+
+def add_usage(name: str, amount: int) -> None:
+    """Count billable usage (pages, model tokens) against the current request or job"""
+    timings = _current.get()
+    if timings is not None:
+        timings.count(name, amount)
+
+
+def drain_usage() -> Dict[str, int]:
+    """Usage counted since the last drain; batch threads drain once per document"""
+    timings = _current.get()
+    return timings.drain() if timings is not None else {}
+
+
+@contextmanager
+def stage(name: str) -> Iterator[None]:
+    """Time a pipeline stage into the histogram and the current request's Server-Timing"""
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - started
+        STAGE_SECONDS.observe(elapsed, stage=name, **current_labels())
+        timings = _current.get()
+        if timings is not None:
+            timings.add(name, elapsed)
+
+
+def propagate(fn):
+    """Wrap fn so it runs with the caller's request context when handed to another thread"""
+    context = contextvars.copy_context()
+    return lambda *args, **kwargs: context.copy().run(fn, *args, **kwargs)
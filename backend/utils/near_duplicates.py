@@ -0,0 +1,209 @@
+import json
+import os
+import re
+import sqlite3
+import threading
+import time
+import zlib
+from typing import Any, Dict, List, Optional, Tuple
+
+from .prescreen import PrescreenResult
+
+NUM_PERM = 128
+SHINGLE_WORDS = 5
+# Too few shingles and a handful of edits swings the estimate; short texts are left to the exact cache
+MIN_SHINGLES = 20
+MAX_CHARS = 400_000
+# Shingle hashes are permuted in blocks to bound the temporary (NUM_PERM x block) matrix
+HASH_BLOCK = 4096
+MERSENNE_PRIME = (1 << 31) - 1
+
+WORD = re.compile(r"[a-z0-9]+(?:[/.\-][a-z0-9]+)*")
+
+_permutations = None
+
+
+def _numpy():
+    """numpy and the fixed MinHash permutations, imported on first use"""
+    global _permutations
+    import numpy as np
+
+    if _permutations is None:
+        rng = np.random.RandomState(0x5EED)
+        _permutations = (
+            rng.randint(1, MERSENNE_PRIME, size=NUM_PERM).astype(np.uint64),
+            rng.randint(0, MERSENNE_PRIME, size=NUM_PERM).astype(np.uint64),
+        )
+    return np, _permutations
+
+
+def minhash_signature(text: str) -> Optional[Any]:
+    """MinHash (a uint32 array) of the document's word 5-shingles, or None if the text is too short"""
+    words = WORD.findall(text[:MAX_CHARS].lower())
+    shingles = {" ".join(words[i:i + SHINGLE_WORDS]) for i in range(max(0, len(words) - SHINGLE_WORDS + 1))}
+    if len(shingles) < MIN_SHINGLES:
+        return None
+    np, (perm_a, perm_b) = _numpy()
+    prime = np.uint64(MERSENNE_PRIME)
+    hashes = np.fromiter((zlib.crc32(shingle.encode("utf-8")) for shingle in shingles),
+                         dtype=np.uint64, count=len(shingles))
+    signature = np.full(NUM_PERM, prime, dtype=np.uint64)
+    for start in range(0, len(hashes), HASH_BLOCK):
+        block = hashes[start:start + HASH_BLOCK]
+        permuted = (np.outer(perm_a, block) + perm_b[:, None]) % prime
+        np.minimum(signature, permuted.min(axis=1), out=signature)
+    return signature.astype(np.uint32)
+
+
+def delta_key(screen: PrescreenResult, identities: Optional[Dict[str, List[str]]] = None) -> str:
+    """
+    What the local pre-screen found and which product it names: if a near-duplicate
+    differs here (a missing signature, another directive, another model or
+    manufacturer on the same template), its cached analysis cannot be reused
+    """
+    return json.dumps({
+        "decision": screen.decision,
+        "satisfied": sorted(screen.satisfied),
+        "directives": sorted(set(screen.evidence.get("directive", []))),
+        "identities": identities or {}
+    }, sort_keys=True)
+
+
+class NearDuplicateIndex:
+    """
+    MinHash index over analyzed documents, searched with one vectorized comparison
+    against every stored signature of the same shop, document type, category and
+    prompt version. Signatures persist in SQLite and are loaded into memory on first use.
+    """
+
+    def __init__(self, path: str, threshold: float = 0.9, max_entries: int = 20000):
+        self.path = path
+        self.threshold = threshold
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._groups: Dict[str, int] = {}
+
+        if path != ":memory:":
+            os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS near_duplicates (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                cache_key TEXT NOT NULL,
+                group_key TEXT NOT NULL,
+                delta_key TEXT NOT NULL,
+                signature BLOB NOT NULL,
+                created_at REAL NOT NULL
+            )
+            """
+        )
+        self._conn.commit()
+        self._size = 0
+        self._loaded = False
+
+    @classmethod
+    def from_config(cls, config) -> "NearDuplicateIndex":
+        return cls(
+            path=config["NEAR_DUP_PATH"],
+            threshold=config["NEAR_DUP_THRESHOLD"],
+            max_entries=config["NEAR_DUP_MAX_ENTRIES"],
+        )
+
+    @staticmethod
+    def group_key(shop: str, document_type: str, product_category: Optional[str], prompt_version: str) -> str:
+        """Documents are only ever matched within one shop"""
+        return f"{shop}:{document_type}:{product_category or 'general'}:{prompt_version}"
+
+    def _group_id(self, group_key: str) -> int:
+        return self._groups.setdefault(group_key, len(self._groups))
+
+    def _load(self) -> None:
+        np, _ = _numpy()
+        rows = self._conn.execute(
+            "SELECT id, cache_key, group_key, delta_key, signature FROM near_duplicates ORDER BY id DESC LIMIT ?",
+            (self.max_entries,)
+        ).fetchall()[::-1]
+        capacity = max(1024, len(rows) * 2)
+        self._size = len(rows)
+        self._ids = np.zeros(capacity, dtype=np.int64)
+        self._group_ids = np.zeros(capacity, dtype=np.int32)
+        self._signatures = np.zeros((capacity, NUM_PERM), dtype=np.uint32)
+        self._cache_keys: List[str] = [row[1] for row in rows]
+        self._delta_keys: List[str] = [row[3] for row in rows]
+        for i, row in enumerate(rows):
+            self._ids[i] = row[0]
+            self._group_ids[i] = self._group_id(row[2])
+            self._signatures[i] = np.frombuffer(row[4], dtype=np.uint32)
+        self._loaded = True
+
+    def _grow(self) -> None:
+        np, _ = _numpy()
+        capacity = len(self._ids) * 2
+        self._ids = np.resize(self._ids, capacity)
+        self._group_ids = np.resize(self._group_ids, capacity)
+        signatures = np.zeros((capacity, NUM_PERM), dtype=np.uint32)
+        signatures[:self._size] = self._signatures[:self._size]
+        self._signatures = signatures
+
+    def find(self, signature, group_key: str) -> Optional[Tuple[str, str, float]]:
+        """(cache_key, delta_key, similarity) of the most similar stored document above the threshold"""
+        np, _ = _numpy()
+        with self._lock:
+            if not self._loaded:
+                self._load()
+            group_id = self._groups.get(group_key)
+            candidates = (np.flatnonzero(self._group_ids[:self._size] == group_id)
+                          if group_id is not None else np.empty(0, dtype=np.int64))
+            if not len(candidates):
+                self.misses += 1
+                return None
+            # Share of equal MinHash slots estimates the Jaccard similarity of the shingle sets
+            similarity = (self._signatures[candidates] == signature).mean(axis=1)
+            best = int(similarity.argmax())
+            if similarity[best] < self.threshold:
+                self.misses += 1
+                return None
+            self.hits += 1
+            index = candidates[best]
+            return self._cache_keys[index], self._delta_keys[index], float(similarity[best])
+
+    def add(self, signature, cache_key: str, group_key: str, delta: str) -> None:
+        with self._lock:
+            if not self._loaded:
+                self._load()
+            cursor = self._conn.execute(
+                "INSERT INTO near_duplicates (cache_key, group_key, delta_key, signature, created_at) VALUES (?, ?, ?, ?, ?)",
+                (cache_key, group_key, delta, signature.tobytes(), time.time())
+            )
+            if self._size == len(self._ids):
+                self._grow()
+            self._ids[self._size] = cursor.lastrowid
+            self._group_ids[self._size] = self._group_id(group_key)
+            self._signatures[self._size] = signature
+            self._cache_keys.append(cache_key)
+            self._delta_keys.append(delta)
+            self._size += 1
+            if self._size > self.max_entries * 1.1:
+                # Trim in batches so the arrays are not rebuilt on every insert
+                self._conn.execute("DELETE FROM near_duplicates WHERE id < ?",
+                                   (int(self._ids[self._size - self.max_entries]),))
+                self._conn.commit()
+                self._load()
+                return
+            self._conn.commit()
+
+    def stats(self) -> Dict[str, float]:
+        with self._lock:
+            if not self._loaded:
+                self._load()
+        total = self.hits + self.misses
+        return {
+            "entries": self._size,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / total, 4) if total else 0.0,
+        }
@@ -0,0 +1,267 @@
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+from concurrent.futures import Future, ProcessPoolExecutor, wait
+from concurrent.futures.process import BrokenProcessPool
+from typing import Dict, List, Optional, Tuple
+
+from .pdf_parser import PdfSource, _fitz, _open
+
+OCR_ENABLED = os.getenv("OCR_ENABLED", "true").lower() in ("1", "true", "yes")
+OCR_LANGUAGE = os.getenv("OCR_LANGUAGE", "eng")
+OCR_DPI = int(os.getenv("OCR_DPI", "300"))
+# Cores the OCR lane may use; it has its own pool so scans never queue ahead of text extraction
+OCR_CPU_BUDGET = int(os.getenv("OCR_CPU_BUDGET", "0")) or max(1, (os.cpu_count() or 1) // 4)
+OCR_NICE = int(os.getenv("OCR_NICE", "10"))
+# Pages with less extracted text than this are treated as having no text layer
+OCR_MIN_CHARS = int(os.getenv("OCR_MIN_CHARS", "20"))
+OCR_MAX_PAGES = int(os.getenv("OCR_MAX_PAGES", "50"))
+# Seconds a document waits for all of its OCR pages together
+OCR_TIMEOUT = float(os.getenv("OCR_TIMEOUT", "60"))
+OCR_CACHE_PATH = os.getenv("OCR_CACHE_PATH", "cache/ocr.sqlite3")
+OCR_CACHE_MAX_ENTRIES = int(os.getenv("OCR_CACHE_MAX_ENTRIES", "100000"))
+# Pages whose OCR failed or timed out are not retried for this long
+OCR_FAILURE_TTL = float(os.getenv("OCR_FAILURE_TTL", "900"))
+# Tesseract is a system package (see requirements.txt); PyMuPDF finds its language data here
+TESSDATA_PREFIX = os.getenv("TESSDATA_PREFIX")
+
+_pool = None
+_pool_lock = threading.Lock()
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def needs_ocr(text: str) -> bool:
+    return len(text.strip()) < OCR_MIN_CHARS
+
+
+def _init_worker() -> None:
+    """Keep each OCR process to one core at low priority"""
+    # Tesseract otherwise starts an OpenMP thread per core in every worker
+    os.environ["OMP_THREAD_LIMIT"] = "1"
+    try:
+        os.nice(OCR_NICE)
+    except (AttributeError, OSError):
+        pass
+
+
+def _ocr_page(page_pdf: bytes, dpi: int, language: str) -> str:
+    """Worker entry point: rasterize the one page of page_pdf and OCR it"""
+    fitz = _fitz()
+    with fitz.open(stream=page_pdf, filetype="pdf") as doc:
+        page = doc[0]
+        textpage = page.get_textpage_ocr(dpi=dpi, language=language, full=True)
+        return page.get_text(textpage=textpage)
+
+
+def _get_pool() -> ProcessPoolExecutor:
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = ProcessPoolExecutor(max_workers=OCR_CPU_BUDGET, initializer=_init_worker)
+        return _pool
+
+
+def _reset_pool() -> None:
+    global _pool
+    with _pool_lock:
+        if _pool is not None:
+            _pool.shutdown(wait=False, cancel_futures=True)
+        _pool = None
+
+
+def page_hash(doc, page) -> str:
+    """Identity of a scanned page: its content stream and embedded images, plus the OCR settings"""
+    digest = hashlib.sha256(f"{OCR_LANGUAGE}:{OCR_DPI}".encode("utf-8"))
+    digest.update(page.read_contents())
+    for image in page.get_images(full=True):
+        digest.update(doc.xref_stream_raw(image[0]) or b"")
+    return digest.hexdigest()[:32]
+
+
+def _single_page_pdf(doc, index: int) -> bytes:
+    """Copy one page into its own PDF so workers receive that page, not the whole upload"""
+    single = _fitz().open()
+    try:
+        single.insert_pdf(doc, from_page=index, to_page=index)
+        return single.tobytes()
+    finally:
+        single.close()
+
+
+class OcrCache:
+    """
+    OCR text per page hash in SQLite, so re-uploads and revisions of a scan skip OCR.
+    Failures are kept for failure_ttl seconds, so a page that times out is not
+    rasterized again on every re-upload but still gets another try later.
+    """
+
+    def __init__(self, path: str, max_entries: int = 100000, failure_ttl: float = 900):
+        self.path = path
+        self.max_entries = max_entries
+        self.failure_ttl = failure_ttl
+        self._lock = threading.Lock()
+        self._writes = 0
+
+        if path != ":memory:":
+            os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS ocr_pages (page_hash TEXT PRIMARY KEY, text TEXT NOT NULL, created_at REAL NOT NULL)"
+        )
+        # Caches created before failures were recorded lack the column
+        columns = {row[1] for row in self._conn.execute("PRAGMA table_info(ocr_pages)")}
+        if "failed" not in columns:
+            self._conn.execute("ALTER TABLE ocr_pages ADD COLUMN failed INTEGER NOT NULL DEFAULT 0")
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_ocr_pages_created ON ocr_pages (created_at)")
+        self._conn.commit()
+
+    def get(self, key: str) -> Optional[str]:
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT text FROM ocr_pages WHERE page_hash = ? AND failed = 0", (key,)
+            ).fetchone()
+        return row[0] if row else None
+
+    def recently_failed(self, key: str) -> bool:
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT 1 FROM ocr_pages WHERE page_hash = ? AND failed = 1 AND created_at > ?",
+                (key, time.time() - self.failure_ttl)
+            ).fetchone()
+        return row is not None
+
+    def set(self, key: str, text: str) -> None:
+        self._write(key, text, failed=False)
+
+    def set_failed(self, key: str) -> None:
+        self._write(key, "", failed=True)
+
+    def _write(self, key: str, text: str, failed: bool) -> None:
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO ocr_pages (page_hash, text, created_at, failed) VALUES (?, ?, ?, ?)",
+                (key, text, time.time(), int(failed))
+            )
+            self._writes += 1
+            # Trim every so often rather than counting rows on every insert
+            if self._writes % 1000 == 0:
+                self._conn.execute(
+                    "DELETE FROM ocr_pages WHERE page_hash NOT IN "
+                    "(SELECT page_hash FROM ocr_pages ORDER BY created_at DESC LIMIT ?)",
+                    (self.max_entries,)
+                )
+            self._conn.commit()
+
+
+def _get_cache() -> OcrCache:
+    global _cache
+    with _cache_lock:
+        if _cache is None:
+            _cache = OcrCache(OCR_CACHE_PATH, OCR_CACHE_MAX_ENTRIES, OCR_FAILURE_TTL)
+        return _cache
+
+
+def _collect(futures: Dict[int, Future], keys: Dict[int, str], cache: OcrCache,
+             timeout: float) -> Tuple[Dict[int, str], Dict[str, int]]:
+    """
+    OCR text per page of the futures that finish within one deadline for all of them,
+    and a count per outcome. Pages still queued at the deadline are cancelled. A page
+    Tesseract is already working on cannot be stopped: it keeps its OCR worker busy
+    until it finishes, its result unused, and is cached as failed.
+    """
+    texts: Dict[int, str] = {}
+    outcomes: Dict[str, int] = {}
+
+    def count(outcome: str) -> None:
+        outcomes[outcome] = outcomes.get(outcome, 0) + 1
+
+    wait(futures.values(), timeout=timeout)
+    broken = False
+    for index, future in futures.items():
+        if not future.done():
+            if future.cancel():
+                count("skipped")
+            else:
+                cache.set_failed(keys[index])
+                count("failed")
+            continue
+        try:
+            text = future.result()
+        except BrokenProcessPool:
+            broken = True
+            count("failed")
+            continue
+        except Exception:
+            # Tesseract failed; the page stays without text until the failure expires
+            cache.set_failed(keys[index])
+            count("failed")
+            continue
+        # Blank scans are cached too, so they are not rasterized again
+        cache.set(keys[index], text)
+        texts[index] = text
+        count("ocr")
+    if broken:
+        _reset_pool()
+    return texts, outcomes
+
+
+def ocr_missing_pages(source: PdfSource, pages: List[str]) -> Tuple[List[str], Dict[str, int]]:
+    """
+    Fill in pages that have no text layer with OCR text. Only pages that carry
+    images are rasterized, each in the OCR pool, with results cached by page hash.
+    Returns the pages and a count per outcome (cached, ocr, failed, failed_recently,
+    skipped, unavailable).
+    """
+    outcomes: Dict[str, int] = {}
+    candidates = [index for index, text in enumerate(pages) if needs_ocr(text)]
+    if not OCR_ENABLED or not candidates:
+        return pages, outcomes
+    # PyMuPDF refuses OCR without it; counted so a missing Tesseract shows up in the metrics
+    if not TESSDATA_PREFIX:
+        outcomes["unavailable"] = len(candidates)
+        return pages, outcomes
+
+    def count(outcome: str) -> None:
+        outcomes[outcome] = outcomes.get(outcome, 0) + 1
+
+    pages = list(pages)
+    cache = _get_cache()
+    todo: Dict[int, Tuple[str, bytes]] = {}
+    with _open(source) as doc:
+        for index in candidates:
+            page = doc[index]
+            # Blank and vector-only pages have nothing for OCR to read
+            if not page.get_images():
+                continue
+            key = page_hash(doc, page)
+            text = cache.get(key)
+            if text is not None:
+                pages[index] = text
+                count("cached")
+            elif cache.recently_failed(key):
+                count("failed_recently")
+            elif len(todo) >= OCR_MAX_PAGES:
+                count("skipped")
+            else:
+                todo[index] = (key, _single_page_pdf(doc, index))
+
+    if not todo:
+        return pages, outcomes
+    try:
+        pool = _get_pool()
+        futures = {index: pool.submit(_ocr_page, data, OCR_DPI, OCR_LANGUAGE) for index, (_, data) in todo.items()}
+    except BrokenProcessPool:
+        _reset_pool()
+        outcomes["failed"] = outcomes.get("failed", 0) + len(todo)
+        return pages, outcomes
+
+    texts, collected = _collect(futures, {index: key for index, (key, _) in todo.items()}, cache, OCR_TIMEOUT)
+    for index, text in texts.items():
+        pages[index] = text
+    for outcome, amount in collected.items():
+        outcomes[outcome] = outcomes.get(outcome, 0) + amount
+    return pages, outcomes
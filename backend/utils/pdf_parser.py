@@ -1,13 +1,165 @@
 # === Begin File: backend/utils/pdf_parser.py ===
-import fitz  # PyMuPDF
+import os
+import tempfile
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from typing import Any, Callable, Iterator, List, Optional, Union
+
+PdfSource = Union[str, bytes]
+
+DEFAULT_MAX_PAGES = int(os.getenv("PDF_MAX_PAGES", "0")) or None
+DEFAULT_MAX_BYTES = int(os.getenv("PDF_MAX_BYTES", "0")) or None
+DEFAULT_WORKERS = int(os.getenv("PDF_WORKERS", "0")) or os.cpu_count() or 1
+# Below this many pages a single process is faster than shipping work to the pool
+PARALLEL_MIN_PAGES = int(os.getenv("PDF_PARALLEL_MIN_PAGES", "64"))
+# In-memory PDFs are written here once for the pool; the upload spool janitor sweeps leftovers
+SHARE_DIR = os.getenv("PDF_SHARE_DIR") or os.getenv("UPLOAD_SPOOL_DIR", "temp_uploads/spool")
+
+_pool = None
+_pool_workers = 0
+_pool_lock = threading.Lock()
+
+
+def _fitz():
+    """PyMuPDF, imported on first use so importing this module stays cheap"""
+    import fitz  # PyMuPDF
+    return fitz
+
+
+def _open(source: PdfSource):
+    fitz = _fitz()
+    if isinstance(source, (bytes, bytearray, memoryview)):
+        return fitz.open(stream=source, filetype="pdf")
+    return fitz.open(source)
+
+
+def _extract_page_range(path: str, start: int, stop: int) -> List[str]:
+    """Worker entry point: text of pages [start, stop) of one document"""
+    with _open(path) as doc:
+        return [doc[i].get_text() for i in range(start, stop)]
+
+
+def _get_pool(workers: int) -> ProcessPoolExecutor:
+    global _pool, _pool_workers
+    # Request threads and job workers extract concurrently; only one of them may create the pool
+    with _pool_lock:
+        if _pool is None or _pool_workers != workers:
+            if _pool is not None:
+                _pool.shutdown(wait=False)
+            _pool = ProcessPoolExecutor(max_workers=workers)
+            _pool_workers = workers
+        return _pool
+
+
+class PageRangeJob:
+    """
+    fn(path, start, stop) over consecutive page ranges of one document in the
+    extraction pool. Workers open the document by path, so each task carries only
+    its range; an in-memory source is written once to a temp file in SHARE_DIR
+    rather than pickled into every task. close() cancels what has not started and
+    removes the temp file.
+    """
+
+    def __init__(self, fn: Callable[[str, int, int], Any], source: PdfSource, page_count: int, workers: int):
+        self._temporary = None
+        path = source
+        if not isinstance(source, str):
+            os.makedirs(SHARE_DIR, exist_ok=True)
+            fd, self._temporary = tempfile.mkstemp(suffix=".pdf", dir=SHARE_DIR)
+            with os.fdopen(fd, "wb") as f:
+                f.write(source)
+            path = self._temporary
+        pool = _get_pool(workers)
+        # A few ranges per worker so one slow range does not idle the others
+        step = max(1, -(-page_count // (workers * 4)))
+        self.futures = [pool.submit(fn, path, start, min(start + step, page_count))
+                        for start in range(0, page_count, step)]
+
+    def results(self) -> Iterator[Any]:
+        """Range results in page order"""
+        for future in self.futures:
+            yield future.result()
+
+    def close(self) -> None:
+        for future in self.futures:
+            future.cancel()
+        if self._temporary is not None:
+            # Ranges still running already hold the file open
+            try:
+                os.remove(self._temporary)
+            except FileNotFoundError:
+                pass
+            self._temporary = None
+
+
+class PDFParser:
+    """Streaming, optionally page-parallel PDF text extractor"""
+
+    def __init__(self, max_pages: Optional[int] = DEFAULT_MAX_PAGES, max_bytes: Optional[int] = DEFAULT_MAX_BYTES,
+                 workers: int = DEFAULT_WORKERS, parallel_min_pages: int = PARALLEL_MIN_PAGES):
+        self.max_pages = max_pages
+        self.max_bytes = max_bytes
+        self.workers = workers
+        self.parallel_min_pages = parallel_min_pages
+
+    def page_count(self, source: PdfSource) -> int:
+        with _open(source) as doc:
+            return self._limit(doc.page_count)
+
+    def _limit(self, page_count: int) -> int:
+        return min(page_count, self.max_pages) if self.max_pages else page_count
+
+    def _budgeted(self, pages: Iterator[str]) -> Iterator[str]:
+        """Stop yielding once the per-document byte budget is spent"""
+        if not self.max_bytes:
+            yield from pages
+            return
+        remaining = self.max_bytes
+        for text in pages:
+            data = text.encode("utf-8")
+            if len(data) >= remaining:
+                yield data[:remaining].decode("utf-8", errors="ignore")
+                return
+            remaining -= len(data)
+            yield text
+
+    def iter_pages(self, source: PdfSource) -> Iterator[str]:
+        """Yield the text of each page in order, one page in memory at a time"""
+        def pages():
+            with _open(source) as doc:
+                for i in range(self._limit(doc.page_count)):
+                    yield doc[i].get_text()
+        return self._budgeted(pages())
+
+    def iter_pages_parallel(self, source: PdfSource) -> Iterator[str]:
+        """Yield page text in order, extracting page ranges across worker processes"""
+        page_count = self.page_count(source)
+        if self.workers <= 1 or page_count < self.parallel_min_pages:
+            return self.iter_pages(source)
+
+        job = PageRangeJob(_extract_page_range, source, page_count, self.workers)
+
+        def pages():
+            try:
+                for texts in job.results():
+                    yield from texts
+            finally:
+                job.close()
+        return self._budgeted(pages())
+
+    def extract_pages(self, source: PdfSource) -> List[str]:
+        return list(self.iter_pages_parallel(source))
+
+    def extract_text(self, source: PdfSource) -> str:
+        """Full document text, joined once"""
+        return "".join(self.iter_pages_parallel(source)).strip()
+
 
 def extract_text_from_pdf(file_path: str) -> str:
     """
-    Extracts all text from a PDF file using PyMuPDF.
+    Extracts all text from a PDF file using PyMuPDF, with OCR for scanned pages.
     """
-    text = ""
-    with fitz.open(file_path) as doc:
-        for page in doc:
-            text += page.get_text()
-    return text.strip()
-# === End File: backend/utils/pdf_parser.py ===
\ No newline at end of file
+    from .ocr import ocr_missing_pages
+    pages, _ = ocr_missing_pages(file_path, PDFParser().extract_pages(file_path))
+    return "".join(pages).strip()
+# === End File: backend/utils/pdf_parser.py ===
@@ -0,0 +1,364 @@
+import hashlib
+import json
+import os
+import uuid
+from typing import Dict, Any, Iterator, List, Optional, Tuple
+
+from .analysis_cache import make_cache_key
+from .ce_analyzer import CEAnalyzer, RISK_ORDER, ce_prompt_version, chunk_token_budget
+from .ce_registry import DOCUMENT_TYPES
+from .chunker import chunk_pages, estimate_tokens
+from .consistency import extract_entities, identity_keys
+from .document_ir import STRUCTURED_EXTRACTION, extraction_version, structured_pages
+from .metrics import (
+    OCR_PAGES, PAGES_EXTRACTED, TEXT_BYTES_EXTRACTED, add_usage, begin_request, current_labels, drain_usage, set_labels, stage
+)
+from .near_duplicates import NearDuplicateIndex, delta_key, minhash_signature
+from .ocr import needs_ocr, ocr_missing_pages
+from .pdf_parser import PDFParser, PdfSource
+from .prescreen import prescreen
+from .revisions import REVISION_MAX_CHANGED_RATIO, REVISION_MIN_SHARED_RATIO, Lineage, diff_pages, page_fingerprint
+from .traffic import note_pages
+from .upload_buffer import UploadBuffer
+
+UPLOAD_FOLDER = 'temp_uploads'
+CE_DOCUMENT_TYPES = list(DOCUMENT_TYPES)
+
+
+def prompt_version_for(document_type: str, product_category: Optional[str]) -> str:
+    """
+    Version of the prompt, and of the extraction that fills it, used for this
+    document. Text extraction keeps the bare prompt hash, so existing cache keys
+    and revisions stay valid; structured extraction appends its version.
+    """
+    if document_type in CE_DOCUMENT_TYPES:
+        version = ce_prompt_version(document_type)
+    else:
+        from .gpt_analyzer import SYSTEM_PROMPT
+        version = hashlib.sha256(SYSTEM_PROMPT.encode("utf-8")).hexdigest()[:16]
+    if STRUCTURED_EXTRACTION:
+        version = f"{version}:{extraction_version()}"
+    return version
+
+
+def cache_key_for(pdf_hash: str, document_type: str, product_category: Optional[str]) -> str:
+    """Content-addressed cache key for one upload"""
+    prompt_version = prompt_version_for(document_type, product_category)
+    return make_cache_key(pdf_hash, document_type, product_category, prompt_version)
+
+
+def analyze_pages(pages: List[str], document_type: str, product_category: Optional[str]) -> Dict[str, Any]:
+    """Run the analyzer matching document_type over extracted page text"""
+    if document_type in CE_DOCUMENT_TYPES:
+        ce_analyzer = CEAnalyzer()
+        return ce_analyzer.analyze_ce_pages(pages, document_type, product_category)
+
+    # Fallback to the original analyzer for non-CE documents
+    from .gpt_analyzer import GPTAnalyzer
+    analyzer = GPTAnalyzer()
+    return analyzer.analyze("".join(pages).strip())
+
+
+def extract_pages(source: PdfSource, pdf_hash: Optional[str] = None) -> List[str]:
+    """Extract page text, OCR pages without a text layer, and record both stages and their volume"""
+    with stage('extraction'):
+        if STRUCTURED_EXTRACTION:
+            # Layout-aware text rendered from the document IR, cached by PDF hash
+            pages = structured_pages(source, pdf_hash)
+        else:
+            pages = PDFParser().extract_pages(source)
+    labels = current_labels()
+    if any(needs_ocr(page) for page in pages):
+        with stage('ocr'):
+            pages, outcomes = ocr_missing_pages(source, pages)
+        for outcome, count in outcomes.items():
+            OCR_PAGES.inc(count, outcome=outcome, **labels)
+    PAGES_EXTRACTED.inc(len(pages), **labels)
+    TEXT_BYTES_EXTRACTED.inc(sum(len(page) for page in pages), **labels)
+    add_usage('pages', len(pages))
+    note_pages(pdf_hash, len(pages))
+    return pages
+
+
+def find_revision(pages: List[str], document_type: str, product_category: Optional[str],
+                  lineage: Optional[Lineage] = None, revisions=None) -> Optional[Dict[str, Any]]:
+    """
+    Previous revision of this upload to diff against: the explicit parent or the latest
+    document of its lineage, if enough pages carry over. None when there is nothing to reuse.
+    """
+    if revisions is None or lineage is None or document_type not in CE_DOCUMENT_TYPES:
+        return None
+    prior = revisions.find_prior(lineage, document_type, product_category,
+                                 prompt_version_for(document_type, product_category))
+    if prior is None:
+        return None
+    diff = diff_pages(prior['fingerprints'], [page_fingerprint(page) for page in pages])
+    if diff.shared_ratio < REVISION_MIN_SHARED_RATIO:
+        return None
+    return {**prior, 'diff': diff}
+
+
+def analyze_revision(pages: List[str], document_type: str, product_category: Optional[str],
+                     prior: Dict[str, Any]) -> Dict[str, Any]:
+    """Analyze a revision of prior: only changed pages go to the model, which updates the earlier findings"""
+    diff = prior['diff']
+    revision = {
+        'parent_file_id': prior['file_id'],
+        'pages_total': diff.total,
+        'pages_changed': [index + 1 for index in diff.changed],
+        'pages_removed': diff.removed
+    }
+    if diff.unchanged:
+        return {**prior['result'], 'revision': {**revision, 'incremental': True}}
+    # The changed pages and the previous findings go into one prompt, so they must fit one chunk's budget
+    changed_tokens = estimate_tokens("".join(pages[index] for index in diff.changed) + json.dumps(prior['result']))
+    if diff.changed_ratio <= REVISION_MAX_CHANGED_RATIO and changed_tokens <= chunk_token_budget(document_type):
+        with stage('revision_diff_analysis'):
+            candidate = CEAnalyzer().analyze_ce_revision(prior['result'], pages, diff, document_type, product_category)
+        # A failed delta analysis falls back to analyzing the whole revision
+        if 'error' not in candidate:
+            return {**candidate, 'revision': {**revision, 'incremental': True}}
+    return {
+        **analyze_pages(pages, document_type, product_category),
+        'revision': {**revision, 'incremental': False}
+    }
+
+
+def record_revision(revisions, lineage: Optional[Lineage], file_id: str, pages: List[str], document_type: str,
+                    product_category: Optional[str], analysis_result: Dict[str, Any]) -> None:
+    """Keep a successful analysis as the base for later revisions of the same document"""
+    if revisions is None or lineage is None or lineage.empty or 'error' in analysis_result:
+        return
+    revisions.record(lineage, file_id, document_type, product_category,
+                     prompt_version_for(document_type, product_category),
+                     [page_fingerprint(page) for page in pages], analysis_result)
+
+
+def analyze_revision_aware(pages: List[str], document_type: str, product_category: Optional[str], file_id: str,
+                           lineage: Optional[Lineage] = None, revisions=None) -> Dict[str, Any]:
+    """Analyze pages, reusing the previous revision of the same lineage when there is one"""
+    prior = find_revision(pages, document_type, product_category, lineage, revisions)
+    if prior is not None:
+        analysis_result = analyze_revision(pages, document_type, product_category, prior)
+    else:
+        analysis_result = analyze_pages(pages, document_type, product_category)
+    record_revision(revisions, lineage, file_id, pages, document_type, product_category, analysis_result)
+    return analysis_result
+
+
+def find_near_duplicate(pages: List[str], document_type: str, product_category: Optional[str],
+                        near_duplicates=None, cache=None,
+                        shop: Optional[str] = None) -> Tuple[Optional[Dict[str, Any]], Optional[Tuple]]:
+    """
+    Cached analysis of a near-identical earlier document of the same shop, if the local
+    pre-screen and the product identifiers find nothing that tells them apart. Otherwise
+    returns the index entry to add once this document has been analyzed. Uploads made
+    without a shop are never matched, since nothing scopes them to one owner.
+    """
+    if near_duplicates is None or cache is None or not shop or document_type not in CE_DOCUMENT_TYPES:
+        return None, None
+    text = "".join(pages)
+    with stage('near_duplicate_search'):
+        signature = minhash_signature(text)
+        if signature is None:
+            return None, None
+        group_key = NearDuplicateIndex.group_key(shop, document_type, product_category,
+                                                 prompt_version_for(document_type, product_category))
+        delta = delta_key(prescreen(text, document_type), identity_keys(extract_entities(text)))
+        match = near_duplicates.find(signature, group_key)
+    if match is not None:
+        cache_key, matched_delta, similarity = match
+        cached = cache.get(cache_key) if matched_delta == delta else None
+        if cached is not None:
+            return {
+                **cached['analysis'],
+                'near_duplicate': {'file_id': cached['file_id'], 'similarity': round(similarity, 3)}
+            }, None
+    return None, (signature, group_key, delta)
+
+
+def index_near_duplicate(near_duplicates, entry: Optional[Tuple], cache_key: Optional[str],
+                         analysis_result: Dict[str, Any]) -> None:
+    """Make a freshly analyzed document findable by later near-duplicates"""
+    if near_duplicates is None or entry is None or not cache_key or 'error' in analysis_result:
+        return
+    signature, group_key, delta = entry
+    near_duplicates.add(signature, cache_key, group_key, delta)
+
+
+def build_upload_response(file_id: str, analysis_result: Dict[str, Any], document_type: str,
+                          product_category: Optional[str], cache=None, cache_key: Optional[str] = None,
+                          pages: Optional[List[str]] = None) -> Dict[str, Any]:
+    """Shape an analysis into the upload response and cache it if it succeeded"""
+    response = {
+        'file_id': file_id,
+        'analysis': analysis_result,
+        'document_type': document_type,
+        'product_category': product_category
+    }
+    # Identifiers for cross-document consistency checks, kept with the cached and stored result
+    if pages is not None:
+        response['entities'] = extract_entities("".join(pages))
+    # Failed analyses are not cached so the next upload retries them
+    if cache is not None and cache_key and 'error' not in analysis_result:
+        cache.set(cache_key, response)
+    return response
+
+
+def cached_response(cached: Dict[str, Any], filename: str) -> Dict[str, Any]:
+    """
+    A cache hit as the response to this upload. The cache is content-addressed, so the
+    analysis may have been made for another shop; the upload gets its own file_id.
+    """
+    return {**cached, 'file_id': str(uuid.uuid4()), 'filename': filename, 'cached': True}
+
+
+def record_result(results, shop: Optional[str], response: Dict[str, Any]) -> None:
+    """Keep an analysis, fresh or cached, for the verified shop's /api/reports; anonymous uploads are not kept"""
+    if results is None or not shop or 'error' in response.get('analysis', {'error': None}):
+        return
+    results.save(shop, response)
+
+
+def meter_usage(usage, shop: Optional[str], response: Dict[str, Any], upload_bytes: int = 0) -> None:
+    """Charge one processed document, with the pages and model tokens it used, to the shop"""
+    counts = drain_usage()
+    if usage is None:
+        return
+    usage.record(
+        shop,
+        documents=1,
+        cached=1 if response.get('cached') else 0,
+        failed=1 if 'error' in response or 'error' in response.get('analysis', {}) else 0,
+        upload_bytes=upload_bytes,
+        **counts
+    )
+
+
+def process_upload(upload: UploadBuffer, filename: str, document_type: str, product_category: Optional[str],
+                   cache=None, lineage: Optional[Lineage] = None, revisions=None,
+                   near_duplicates=None, shop: Optional[str] = None) -> Dict[str, Any]:
+    """Cache lookup, extract and analyze one uploaded PDF without writing it to disk"""
+    set_labels(document_type, product_category)
+    cache_key = cache_key_for(upload.sha256, document_type, product_category)
+    if cache is not None:
+        cached = cache.get(cache_key)
+        if cached is not None:
+            return cached_response(cached, filename)
+
+    file_id = str(uuid.uuid4())
+    pages = extract_pages(upload.source, upload.sha256)
+    analysis_result, entry = find_near_duplicate(pages, document_type, product_category, near_duplicates, cache, shop)
+    if analysis_result is None:
+        analysis_result = analyze_revision_aware(pages, document_type, product_category, file_id, lineage, revisions)
+    response = build_upload_response(
+        file_id, analysis_result, document_type, product_category,
+        cache=cache, cache_key=cache_key, pages=pages
+    )
+    index_near_duplicate(near_duplicates, entry, cache_key, analysis_result)
+    return {**response, 'filename': filename, 'cached': False}
+
+
+def stream_upload(upload: UploadBuffer, filename: str, document_type: str, product_category: Optional[str],
+                  cache=None, lineage: Optional[Lineage] = None, revisions=None,
+                  near_duplicates=None, shop: Optional[str] = None) -> Iterator[Tuple[str, Any]]:
+    """
+    Streaming counterpart of process_upload, yielding (event, data) pairs. Single-chunk
+    CE documents stream model tokens; everything else reports progress and the result.
+    """
+    set_labels(document_type, product_category)
+    cache_key = cache_key_for(upload.sha256, document_type, product_category)
+    if cache is not None:
+        cached = cache.get(cache_key)
+        if cached is not None:
+            yield 'result', cached_response(cached, filename)
+            return
+
+    file_id = str(uuid.uuid4())
+    yield 'status', {'stage': 'extracting', 'file_id': file_id}
+    pages = extract_pages(upload.source, upload.sha256)
+
+    analysis_result, entry = find_near_duplicate(pages, document_type, product_category, near_duplicates, cache, shop)
+    prior = None
+    if analysis_result is None:
+        prior = find_revision(pages, document_type, product_category, lineage, revisions)
+    if analysis_result is not None:
+        yield 'status', {'stage': 'near_duplicate', **analysis_result['near_duplicate']}
+    elif prior is not None:
+        # Revision-aware analysis answers in one piece rather than token by token
+        yield 'status', {'stage': 'analyzing', 'pages': len(pages), 'streaming': False}
+        analysis_result = analyze_revision(pages, document_type, product_category, prior)
+    elif document_type in CE_DOCUMENT_TYPES and len(chunk_pages(pages, chunk_token_budget(document_type))) <= 1:
+        yield 'status', {'stage': 'analyzing', 'pages': len(pages)}
+        ce_analyzer = CEAnalyzer()
+        for event, data in ce_analyzer.stream_ce_document("".join(pages).strip(), document_type, product_category):
+            if event == 'result':
+                analysis_result = data
+            else:
+                yield event, data
+    else:
+        yield 'status', {'stage': 'analyzing', 'pages': len(pages), 'streaming': False}
+        analysis_result = analyze_pages(pages, document_type, product_category)
+    if 'near_duplicate' not in analysis_result:
+        record_revision(revisions, lineage, file_id, pages, document_type, product_category, analysis_result)
+
+    response = build_upload_response(
+        file_id, analysis_result, document_type, product_category,
+        cache=cache, cache_key=cache_key, pages=pages
+    )
+    index_near_duplicate(near_duplicates, entry, cache_key, analysis_result)
+    yield 'result', {**response, 'filename': filename, 'cached': False}
+
+
+def aggregate_product_risk(results: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """Roll per-document results of one technical file up to a product-level risk"""
+    analyses = [result['analysis'] for result in results if 'analysis' in result]
+    failed = [result for result in results if 'error' in result or 'error' in result.get('analysis', {})]
+    risk_levels = [analysis.get('risk_level') for analysis in analyses if analysis.get('risk_level') in RISK_ORDER]
+    provided = {result.get('document_type') for result in results}
+
+    return {
+        'risk_level': max(risk_levels, key=RISK_ORDER.index) if risk_levels else 'UNKNOWN',
+        'documents_analyzed': len(results) - len(failed),
+        'documents_failed': len(failed),
+        'risk_breakdown': {level: risk_levels.count(level) for level in RISK_ORDER},
+        'missing_document_types': [t for t in CE_DOCUMENT_TYPES if t not in provided],
+        'compliance_gaps': sum(len(analysis.get('compliance_gaps', [])) for analysis in analyses)
+    }
+
+
+def make_job_handlers(cache=None, revisions=None, near_duplicates=None, results=None, usage=None) -> Dict[str, Any]:
+    """Job kinds understood by the upload worker pool"""
+
+    def analyze_upload(payload: Dict[str, Any]) -> Dict[str, Any]:
+        begin_request()
+        set_labels(payload['document_type'], payload['product_category'])
+        lineage = Lineage(payload.get('lineage_key'), payload.get('parent_file_id'), payload.get('shop'))
+        try:
+            pages = extract_pages(payload['filepath'], payload.get('sha256'))
+            analysis_result, entry = find_near_duplicate(
+                pages, payload['document_type'], payload['product_category'], near_duplicates, cache,
+                payload.get('shop')
+            )
+            if analysis_result is None:
+                analysis_result = analyze_revision_aware(
+                    pages, payload['document_type'], payload['product_category'], payload['file_id'],
+                    None if lineage.empty else lineage, revisions
+                )
+        finally:
+            # The queued copy is only needed until extraction has run
+            try:
+                os.remove(payload['filepath'])
+            except FileNotFoundError:
+                pass
+        response = build_upload_response(
+            payload['file_id'], analysis_result, payload['document_type'], payload['product_category'],
+            cache=cache, cache_key=payload.get('cache_key'), pages=pages
+        )
+        index_near_duplicate(near_duplicates, entry, payload.get('cache_key'), analysis_result)
+        response = {**response, 'filename': payload['filename'], 'cached': False}
+        record_result(results, payload.get('shop'), response)
+        meter_usage(usage, payload.get('shop'), response, payload.get('size', 0))
+        return response
+
+    return {'analyze_upload': analyze_upload}
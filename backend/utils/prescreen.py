@@ -0,0 +1,136 @@
+import os
+import re
+from typing import Dict, List, Any, NamedTuple
+
+PRESCREEN_MIN_CHARS = int(os.getenv("PRESCREEN_MIN_CHARS", "200"))
+# Keyword hits say an element is mentioned, not that it is adequate or current, so
+# answering "complete" documents without the model is opt-in
+PRESCREEN_SKIP_COMPLETE = os.getenv("PRESCREEN_SKIP_COMPLETE", "false").lower() in ("1", "true", "yes")
+MAX_EVIDENCE_PER_RULE = 5
+
+# Every rule is one named alternative of a single compiled pattern, so the text is
+# scanned once no matter how many rules exist. Order matters where rules overlap.
+RULES = {
+    "sole_responsibility": r"(?:issued\s+)?under\s+(?:the\s+|our\s+)?sole\s+responsibility",
+    "notified_body": r"\b(?:notified\s+body|NB)\s*(?:no\.?|number|nr\.?)?\s*[:#]?\s*\d{4}\b",
+    "directive": r"\b(?:19|20)\d{2}/\d{1,4}/(?:EU|EC|EEC)\b|\bRegulation\s*\((?:EU|EC)\)\s*(?:No\.?\s*)?\d{1,4}/\d{1,4}\b|\b(?:2017/745|2016/425|1223/2009|2019/1020)\b",
+    "standard": r"\b(?:EN|IEC|ISO)\s?(?:IEC\s?|ISO\s?)?\d{3,5}(?:-\d+)*(?::\d{4}(?:\+A\d+:\d{4})*)?",
+    "date_of_issue": r"\b(?:date\s+of\s+issue|issued\s+on|place\s+and\s+date|date)\s*[:\-]?[^\n\d]{0,40}?(?:\d{1,2}[./-]\d{1,2}[./-]\d{2,4}|\d{4}-\d{2}-\d{2}|\d{1,2}\s+[A-Z][a-z]+\s+\d{4})",
+    "signature": r"\b(?:signed\s+(?:for\s+and\s+)?on\s+behalf\s+of|signature|signed\s+by|authori[sz]ed\s+signatory)\b",
+    "manufacturer": r"\b(?:manufacturer|manufactured\s+by|hersteller)\b",
+    "address": r"\b\d{1,5}\s+[A-Z][\w.\- ]{2,40}\s(?:street|st\.|road|rd\.|avenue|ave\.|strasse|straße|str\.|lane|way|boulevard|blvd\.)|\b(?:GmbH|Ltd\.?|Limited|Inc\.|S\.A\.|S\.r\.l\.|B\.V\.|Co\.,?\s*Ltd\.?)",
+    "product_identification": r"\b(?:model|type|serial|batch|article)\s*(?:no\.?|number|nr\.?|designation)?\s*[:#]",
+    "authorised_representative": r"\bauthori[sz]ed\s+representative\b",
+    "conformity_procedure": r"\b(?:module\s+[A-H]\d?|conformity\s+assessment\s+procedure|EU[\s-]type\s+examination)\b",
+    "test_report": r"\b(?:test\s+report|report\s+no\.?|laboratory|accredit(?:ed|ation))\b",
+    "risk_analysis": r"\b(?:risk\s+(?:assessment|analysis|evaluation)|hazard\s+identification|residual\s+risk)\b",
+    "intended_use": r"\b(?:intended\s+(?:use|purpose)|product\s+description)\b",
+    "user_instructions": r"\b(?:user\s+(?:manual|instructions)|instructions\s+for\s+use|safety\s+information)\b",
+    "drawings": r"\b(?:drawing|schematic|circuit\s+diagram|bill\s+of\s+materials|specifications?)\b",
+    "doc_reference": r"\b(?:declaration\s+of\s+conformity|EU\s+DoC)\b",
+}
+
+COMBINED_RULES = re.compile(
+    "|".join(f"(?P<{name}>{pattern})" for name, pattern in RULES.items()),
+    re.IGNORECASE,
+)
+
+# Checklist items per document type, each satisfied when all of its rules fire
+CHECKLISTS = {
+    "declaration_of_conformity": {
+        "Manufacturer identification (name, address)": ["manufacturer", "address"],
+        "Product identification (model, type, batch, serial)": ["product_identification"],
+        "Sole responsibility statement": ["sole_responsibility"],
+        "Applicable EU legislation references": ["directive"],
+        "Harmonised standards referenced": ["standard"],
+        "Place and date of issue": ["date_of_issue"],
+        "Authorized person name and signature": ["signature"],
+    },
+    "technical_file": {
+        "Manufacturer name and complete business address": ["manufacturer", "address"],
+        "Product description and intended use statement": ["intended_use"],
+        "Design drawings, technical specifications": ["drawings"],
+        "List of applicable EU directives/regulations": ["directive"],
+        "Harmonised standards applied": ["standard"],
+        "Risk analysis documentation": ["risk_analysis"],
+        "Test reports from accredited/notified bodies": ["test_report"],
+        "Declaration of Conformity reference": ["doc_reference"],
+        "User instructions and safety information": ["user_instructions"],
+    },
+    "test_reports": {
+        "Laboratory accreditation status and scope": ["test_report"],
+        "Test standard versions": ["standard"],
+        "Product identification": ["product_identification"],
+        "Date of issue": ["date_of_issue"],
+    },
+    "risk_assessment": {
+        "Systematic hazard identification": ["risk_analysis"],
+        "User information and warnings": ["user_instructions"],
+    },
+}
+
+
+PRESCREEN_SECTION = """
+PRE-SCREEN HINTS (keyword matches only; still check they are adequate, specific and current):
+{found}
+
+NO KEYWORD EVIDENCE FOUND FOR:
+{unresolved}
+"""
+
+
+class PrescreenResult(NamedTuple):
+    decision: str  # "empty", "complete" or "partial"
+    evidence: Dict[str, List[str]]
+    satisfied: List[str]
+    unresolved: List[str]
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "decision": self.decision,
+            "evidence": self.evidence,
+            "satisfied": self.satisfied,
+            "unresolved": self.unresolved,
+        }
+
+
+def scan(text: str) -> Dict[str, List[str]]:
+    """Run every rule over the text in one pass and collect distinct evidence per rule"""
+    evidence: Dict[str, List[str]] = {}
+    for match in COMBINED_RULES.finditer(text):
+        rule = match.lastgroup
+        values = evidence.setdefault(rule, [])
+        value = " ".join(match.group(rule).split())
+        if len(values) < MAX_EVIDENCE_PER_RULE and value not in values:
+            values.append(value)
+    return evidence
+
+
+def prescreen(text: str, document_type: str) -> PrescreenResult:
+    """
+    Classify a document as empty (too little text to assess), complete (every checklist
+    item has keyword evidence) or partial. Only "empty" is a verdict; the rest are hints.
+    """
+    evidence = scan(text)
+    checklist = CHECKLISTS.get(document_type, {})
+    satisfied = [item for item, rules in checklist.items() if all(rule in evidence for rule in rules)]
+    unresolved = [item for item in checklist if item not in satisfied]
+
+    # Rules are English-only, so text without hits (e.g. a German manual) still goes to the model
+    if len(text.strip()) < PRESCREEN_MIN_CHARS:
+        decision = "empty"
+    elif checklist and not unresolved:
+        decision = "complete"
+    else:
+        decision = "partial"
+    return PrescreenResult(decision, evidence, satisfied, unresolved)
+
+
+def prescreen_prompt_section(result: PrescreenResult) -> str:
+    """Prompt addendum telling the model what a local keyword scan found and missed"""
+    if not result.satisfied:
+        return ""
+    return PRESCREEN_SECTION.format(
+        found="\n".join(f"- {item}" for item in result.satisfied),
+        unresolved="\n".join(f"? {item}" for item in result.unresolved) or "None",
+    )
@@ -0,0 +1,209 @@
+import hashlib
+import hmac
+import json
+import marshal
+import os
+import random
+import re
+import sys
+import threading
+import time
+import uuid
+from typing import Any, Dict, List, Optional, Tuple
+
+from .metrics import current_labels
+
+PROFILE_HEADER = "X-Profile-Request"
+# Signed profiling requests are accepted for this long after being signed
+SIGNATURE_MAX_AGE = 300
+PROFILE_NAME = re.compile(r"^[0-9]+-[0-9a-f]{8}$")
+
+
+def sign_profile_request(secret: str, timestamp: Optional[int] = None) -> str:
+    """Header value that opts one request into profiling, as <unix time>.<hmac>"""
+    timestamp = int(time.time()) if timestamp is None else int(timestamp)
+    signature = hmac.new(secret.encode("utf-8"), str(timestamp).encode("ascii"), hashlib.sha256).hexdigest()
+    return f"{timestamp}.{signature}"
+
+
+Func = Tuple[str, int, str]
+
+
+class StackSampler:
+    """
+    Wall-clock sampling profiler over every thread of the process. A background
+    thread reads all stacks (sys._current_frames) every interval, so chunk threads,
+    batch threads and the LLM event loop are captured along with the request thread.
+    Each thread's stacks are rooted at a ("<thread>", 0, name) entry, and the
+    samples are kept in the pstats layout that cProfile dumps, so the same tools
+    read them.
+
+    Other requests served by the same process at the time, and idle background
+    threads, are sampled too (under their own thread names). Work in other
+    processes (the PDF process pool, the standalone job worker) is not.
+    """
+
+    def __init__(self, interval: float = 0.005):
+        self.interval = interval
+        self.samples = 0
+        self.threads = set()
+        # func -> [primitive calls, calls, own time, cumulative time, {caller: [nc, cc, tt, ct]}]
+        self._stats: Dict[Func, list] = {}
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="profile-sampler", daemon=True)
+
+    def start(self) -> "StackSampler":
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        self._stop.set()
+        self._thread.join()
+
+    def _run(self) -> None:
+        own = threading.get_ident()
+        last = time.perf_counter()
+        while not self._stop.wait(self.interval):
+            now = time.perf_counter()
+            elapsed, last = now - last, now
+            names = {thread.ident: thread.name for thread in threading.enumerate()}
+            for ident, frame in sys._current_frames().items():
+                if ident != own:
+                    self._record(names.get(ident, str(ident)), frame, elapsed)
+            self.samples += 1
+
+    def _record(self, thread_name: str, frame, elapsed: float) -> None:
+        self.threads.add(thread_name)
+        stack: List[Func] = []
+        while frame is not None:
+            code = frame.f_code
+            stack.append((code.co_filename, code.co_firstlineno, code.co_name))
+            frame = frame.f_back
+        stack.append(("<thread>", 0, thread_name))
+        stack.reverse()
+
+        counted = set()
+        for depth, func in enumerate(stack):
+            own_time = elapsed if depth == len(stack) - 1 else 0.0
+            entry = self._stats.get(func)
+            if entry is None:
+                entry = self._stats[func] = [0, 0, 0.0, 0.0, {}]
+            entry[2] += own_time
+            # Recursive frames count once towards cumulative time, as in cProfile
+            if func not in counted:
+                counted.add(func)
+                entry[0] += 1
+                entry[1] += 1
+                entry[3] += elapsed
+            if depth:
+                edge = entry[4].setdefault(stack[depth - 1], [0, 0, 0.0, 0.0])
+                edge[0] += 1
+                edge[1] += 1
+                edge[2] += own_time
+                edge[3] += elapsed
+
+    def dump_stats(self, path: str) -> None:
+        """Write the samples as a pstats file (python -m pstats, snakeviz)"""
+        stats = {
+            func: (cc, nc, tt, ct, {caller: tuple(edge) for caller, edge in callers.items()})
+            for func, (cc, nc, tt, ct, callers) in self._stats.items()
+        }
+        with open(path, "wb") as f:
+            marshal.dump(stats, f)
+
+
+class RequestProfiler:
+    """
+    Opt-in sampling capture of whole requests across all threads (see StackSampler),
+    either sampled at a fixed rate or requested with a signed header. Profiles go to
+    a directory that keeps only the newest max_profiles captures. When disabled no
+    hook is installed at all.
+    """
+
+    def __init__(self, directory: str, max_profiles: int = 50, sample_rate: float = 0.0,
+                 secret: Optional[str] = None, interval: float = 0.005):
+        self.directory = directory
+        self.max_profiles = max_profiles
+        self.sample_rate = sample_rate
+        self.secret = secret
+        self.interval = interval
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_config(cls, config) -> "RequestProfiler":
+        return cls(
+            directory=config["PROFILE_DIR"],
+            max_profiles=config["PROFILE_MAX_PROFILES"],
+            sample_rate=config["PROFILE_SAMPLE_RATE"],
+            secret=config["PROFILE_SECRET"],
+            interval=config["PROFILE_INTERVAL"],
+        )
+
+    @property
+    def enabled(self) -> bool:
+        return self.sample_rate > 0 or bool(self.secret)
+
+    def is_admin(self, token: Optional[str]) -> bool:
+        return bool(self.secret and token) and hmac.compare_digest(token, self.secret)
+
+    def trigger(self, header_value: Optional[str]) -> Optional[str]:
+        """Why this request should be profiled ("signed" or "sampled"), or None"""
+        if header_value and self.secret and self._valid_signature(header_value):
+            return "signed"
+        if self.sample_rate > 0 and random.random() < self.sample_rate:
+            return "sampled"
+        return None
+
+    def _valid_signature(self, header_value: str) -> bool:
+        timestamp, _, signature = header_value.partition(".")
+        if not timestamp.isdigit() or abs(time.time() - int(timestamp)) > SIGNATURE_MAX_AGE:
+            return False
+        expected = sign_profile_request(self.secret, int(timestamp)).partition(".")[2]
+        return hmac.compare_digest(signature, expected)
+
+    def start(self) -> StackSampler:
+        return StackSampler(self.interval).start()
+
+    def finish(self, sampler: StackSampler, metadata: Dict[str, Any]) -> str:
+        """Stop sampling, write the .prof file with a JSON sidecar and trim the ring"""
+        sampler.stop()
+        os.makedirs(self.directory, exist_ok=True)
+        # Names sort chronologically, which is what the ring trims by
+        name = f"{time.time_ns()}-{uuid.uuid4().hex[:8]}"
+        sampler.dump_stats(os.path.join(self.directory, f"{name}.prof"))
+        with open(os.path.join(self.directory, f"{name}.json"), "w") as f:
+            json.dump({"name": name, **current_labels(), **metadata, "samples": sampler.samples,
+                       "interval_ms": self.interval * 1000, "threads": sorted(sampler.threads)}, f)
+        self._trim()
+        return name
+
+    def _trim(self) -> None:
+        with self._lock:
+            names = sorted(entry[:-5] for entry in os.listdir(self.directory) if entry.endswith(".prof"))
+            for name in names[:max(0, len(names) - self.max_profiles)]:
+                for suffix in (".prof", ".json"):
+                    try:
+                        os.remove(os.path.join(self.directory, name + suffix))
+                    except FileNotFoundError:
+                        pass
+
+    def list(self) -> List[Dict[str, Any]]:
+        """Metadata of stored profiles, newest first"""
+        if not os.path.isdir(self.directory):
+            return []
+        profiles = []
+        for entry in sorted(os.listdir(self.directory), reverse=True):
+            if not entry.endswith(".json"):
+                continue
+            try:
+                with open(os.path.join(self.directory, entry)) as f:
+                    profiles.append(json.load(f))
+            except (FileNotFoundError, ValueError):
+                continue
+        return profiles
+
+    def path_for(self, name: str) -> Optional[str]:
+        if not PROFILE_NAME.match(name):
+            return None
+        path = os.path.join(self.directory, f"{name}.prof")
+        return path if os.path.exists(path) else None
@@ -0,0 +1,163 @@
+import base64
+import json
+import os
+import sqlite3
+import threading
+import time
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+SUMMARY_FIELDS = (
+    "file_id", "shop", "filename", "document_type", "product_category",
+    "risk_level", "confidence_score", "gap_count", "created_at"
+)
+
+
+def encode_cursor(created_at: float, file_id: str) -> str:
+    return base64.urlsafe_b64encode(json.dumps([created_at, file_id]).encode("utf-8")).decode("ascii")
+
+
+def decode_cursor(cursor: str) -> Tuple[float, str]:
+    """Keyset position of the last row of the previous page; ValueError if malformed"""
+    try:
+        created_at, file_id = json.loads(base64.urlsafe_b64decode(cursor.encode("ascii")))
+        return float(created_at), str(file_id)
+    except Exception:
+        raise ValueError("Invalid cursor")
+
+
+class ResultsStore:
+    """
+    Interface of the persistent store of analysis results behind /api/reports.
+    Backends register themselves in RESULTS_BACKENDS under their URL scheme.
+    """
+
+    def save(self, shop: Optional[str], response: Dict[str, Any]) -> None:
+        raise NotImplementedError
+
+    def get(self, file_id: str, shop: Optional[str]) -> Optional[Dict[str, Any]]:
+        raise NotImplementedError
+
+    def query(self, shop: Optional[str], document_type: Optional[str] = None, risk_level: Optional[str] = None,
+              since: Optional[float] = None, until: Optional[float] = None, cursor: Optional[str] = None,
+              limit: int = 50, full: bool = False) -> Tuple[List[Dict[str, Any]], Optional[str]]:
+        """One page of result summaries (or full results), newest first, and the cursor of the next page"""
+        raise NotImplementedError
+
+    def export(self, shop: Optional[str], batch_size: int = 500, **filters) -> Iterator[Dict[str, Any]]:
+        """Every matching full result, fetched page by page so no lock is held while streaming"""
+        cursor = None
+        while True:
+            rows, cursor = self.query(shop, cursor=cursor, limit=batch_size, full=True, **filters)
+            yield from rows
+            if cursor is None:
+                return
+
+
+class SQLiteResultsStore(ResultsStore):
+    """Results in one SQLite table, with indexes for the report filters"""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+
+        if path != ":memory:":
+            os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.row_factory = sqlite3.Row
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS results (
+                file_id TEXT PRIMARY KEY,
+                shop TEXT NOT NULL,
+                filename TEXT,
+                document_type TEXT NOT NULL,
+                product_category TEXT,
+                risk_level TEXT,
+                confidence_score REAL,
+                gap_count INTEGER NOT NULL,
+                created_at REAL NOT NULL,
+                result TEXT NOT NULL
+            )
+            """
+        )
+        # Every listing is per shop and newest first; the filters narrow that range
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_results_shop_date ON results (shop, created_at, file_id)")
+        self._conn.execute(
+            "CREATE INDEX IF NOT EXISTS idx_results_shop_type_date ON results (shop, document_type, created_at, file_id)"
+        )
+        self._conn.execute(
+            "CREATE INDEX IF NOT EXISTS idx_results_shop_risk_date ON results (shop, risk_level, created_at, file_id)"
+        )
+        self._conn.commit()
+
+    def save(self, shop: Optional[str], response: Dict[str, Any]) -> None:
+        analysis = response.get("analysis", {})
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO results VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (
+                    response["file_id"], shop or "", response.get("filename"), response.get("document_type"),
+                    response.get("product_category"), analysis.get("risk_level"), analysis.get("confidence_score"),
+                    len(analysis.get("compliance_gaps", [])), time.time(), json.dumps(response)
+                )
+            )
+            self._conn.commit()
+
+    def get(self, file_id: str, shop: Optional[str]) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT result FROM results WHERE file_id = ? AND shop = ?", (file_id, shop or "")
+            ).fetchone()
+        return json.loads(row["result"]) if row else None
+
+    def query(self, shop: Optional[str], document_type: Optional[str] = None, risk_level: Optional[str] = None,
+              since: Optional[float] = None, until: Optional[float] = None, cursor: Optional[str] = None,
+              limit: int = 50, full: bool = False) -> Tuple[List[Dict[str, Any]], Optional[str]]:
+        where, args = ["shop = ?"], [shop or ""]
+        if document_type:
+            where.append("document_type = ?")
+            args.append(document_type)
+        if risk_level:
+            where.append("risk_level = ?")
+            args.append(risk_level)
+        if since is not None:
+            where.append("created_at >= ?")
+            args.append(since)
+        if until is not None:
+            where.append("created_at < ?")
+            args.append(until)
+        if cursor:
+            created_at, file_id = decode_cursor(cursor)
+            where.append("(created_at, file_id) < (?, ?)")
+            args.extend([created_at, file_id])
+
+        columns = ", ".join(SUMMARY_FIELDS) + (", result" if full else "")
+        with self._lock:
+            rows = self._conn.execute(
+                f"SELECT {columns} FROM results WHERE {' AND '.join(where)} "
+                "ORDER BY created_at DESC, file_id DESC LIMIT ?",
+                args + [limit + 1]
+            ).fetchall()
+
+        next_cursor = None
+        if len(rows) > limit:
+            rows = rows[:limit]
+            next_cursor = encode_cursor(rows[-1]["created_at"], rows[-1]["file_id"])
+        if full:
+            return [{**json.loads(row["result"]), "created_at": row["created_at"]} for row in rows], next_cursor
+        return [dict(row) for row in rows], next_cursor
+
+
+RESULTS_BACKENDS = {"sqlite": SQLiteResultsStore}
+
+
+def results_store_from_config(config) -> ResultsStore:
+    """Build the store named by RESULTS_STORE_URL, e.g. sqlite:///cache/results.sqlite3"""
+    url = config["RESULTS_STORE_URL"]
+    scheme, _, location = url.partition("://")
+    if scheme not in RESULTS_BACKENDS:
+        raise ValueError(f"Unsupported RESULTS_STORE_URL scheme '{scheme}'")
+    # sqlite:///relative/path and sqlite:////absolute/path, as in SQLAlchemy URLs
+    path = location[1:] if location.startswith("/") else location
+    return RESULTS_BACKENDS[scheme](path)
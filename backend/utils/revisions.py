@@ -0,0 +1,182 @@
+import hashlib
+import json
+import os
+import re
+import sqlite3
+import threading
+import time
+from collections import Counter
+from typing import Any, Dict, List, NamedTuple, Optional
+
+# Above this share of changed pages a full analysis is cheaper and more reliable
+REVISION_MAX_CHANGED_RATIO = float(os.getenv("REVISION_MAX_CHANGED_RATIO", "0.5"))
+# A prior document only counts as a revision when at least this share of pages is carried over
+REVISION_MIN_SHARED_RATIO = float(os.getenv("REVISION_MIN_SHARED_RATIO", "0.5"))
+
+WHITESPACE = re.compile(r"\s+")
+SEPARATORS = re.compile(r"[\s_\-.]+")
+# Trailing revision markers: "_v2", "-rev3", " revision 4", "(1)", "final"
+VERSION_SUFFIX = re.compile(
+    r"(?:[\s_\-.]*(?:v|ver|version|rev|revision|r)[\s_\-.]*\d+[a-z]?|[\s_\-.]*\(\d+\)|[\s_\-.]*final)+$"
+)
+
+
+def page_fingerprint(text: str) -> str:
+    """Hash of a page's text, insensitive to whitespace and layout-only changes"""
+    normalized = WHITESPACE.sub(" ", text).strip().lower()
+    return hashlib.sha256(normalized.encode("utf-8")).hexdigest()[:16]
+
+
+class Lineage(NamedTuple):
+    key: Optional[str]
+    parent_file_id: Optional[str]
+    shop: Optional[str] = None
+
+    @property
+    def empty(self) -> bool:
+        """Nothing to look a prior revision up by, so nothing worth recording either"""
+        return not self.key and not self.parent_file_id
+
+
+def document_stem(filename: Optional[str]) -> str:
+    """File name without extension and revision markers, e.g. "doc" for DoC_v2.pdf"""
+    stem = os.path.splitext(filename or "")[0].lower()
+    return SEPARATORS.sub(" ", VERSION_SUFFIX.sub("", stem)).strip()
+
+
+def lineage_for(filename: Optional[str], supplier: Optional[str] = None, parent_file_id: Optional[str] = None,
+                shop: Optional[str] = None) -> Lineage:
+    """
+    Identify the document family an upload belongs to; an explicit parent wins. Only
+    uploads of a verified shop get a lineage: by supplier and file name, so generic file
+    names like doc.pdf from unrelated uploads are never treated as one family, or by a
+    parent file_id, which is only looked up among that shop's own revisions.
+    """
+    if not shop:
+        return Lineage(None, None)
+    stem = document_stem(filename)
+    supplier = (supplier or "").strip().lower()
+    key = None
+    if supplier:
+        raw = f"{shop}:{supplier}:{stem}"
+        key = hashlib.sha256(raw.encode("utf-8")).hexdigest()[:32]
+    return Lineage(key, parent_file_id or None, shop)
+
+
+class PageDiff(NamedTuple):
+    changed: List[int]  # 0-based indexes of new or edited pages in the revision
+    removed: int        # pages of the previous revision that no longer appear
+    total: int
+
+    @property
+    def changed_ratio(self) -> float:
+        return (len(self.changed) + self.removed) / max(1, self.total)
+
+    @property
+    def unchanged(self) -> bool:
+        return not self.changed and not self.removed
+
+    @property
+    def shared_ratio(self) -> float:
+        """Share of pages found in both documents, relative to the longer one"""
+        shared = self.total - len(self.changed)
+        return shared / max(1, self.total, shared + self.removed)
+
+
+def diff_pages(previous: List[str], current: List[str]) -> PageDiff:
+    """Compare fingerprint lists as multisets, so inserted or moved pages do not count as edits"""
+    remaining = Counter(previous)
+    changed = []
+    for index, fingerprint in enumerate(current):
+        if remaining[fingerprint] > 0:
+            remaining[fingerprint] -= 1
+        else:
+            changed.append(index)
+    return PageDiff(changed, sum(remaining.values()), len(current))
+
+
+class RevisionStore:
+    """SQLite record of analyzed revisions per lineage, with their page fingerprints"""
+
+    def __init__(self, path: str, max_per_lineage: int = 10):
+        self.path = path
+        self.max_per_lineage = max_per_lineage
+        self._lock = threading.Lock()
+
+        if path != ":memory:":
+            os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS revisions (
+                file_id TEXT PRIMARY KEY,
+                shop TEXT NOT NULL DEFAULT '',
+                lineage_key TEXT,
+                document_type TEXT NOT NULL,
+                product_category TEXT NOT NULL,
+                prompt_version TEXT NOT NULL,
+                fingerprints TEXT NOT NULL,
+                result TEXT NOT NULL,
+                created_at REAL NOT NULL
+            )
+            """
+        )
+        # Stores created before revisions were scoped to a shop lack the column; their rows match no shop
+        columns = {row[1] for row in self._conn.execute("PRAGMA table_info(revisions)")}
+        if "shop" not in columns:
+            self._conn.execute("ALTER TABLE revisions ADD COLUMN shop TEXT NOT NULL DEFAULT ''")
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_revisions_lineage ON revisions (lineage_key, created_at)")
+        self._conn.commit()
+
+    @classmethod
+    def from_config(cls, config) -> "RevisionStore":
+        return cls(
+            path=config["REVISION_STORE_PATH"],
+            max_per_lineage=config["REVISION_MAX_PER_LINEAGE"],
+        )
+
+    def record(self, lineage: Lineage, file_id: str, document_type: str, product_category: Optional[str],
+               prompt_version: str, fingerprints: List[str], result: Dict[str, Any]) -> None:
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO revisions (file_id, shop, lineage_key, document_type, product_category, "
+                "prompt_version, fingerprints, result, created_at) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (file_id, lineage.shop or "", lineage.key, document_type, product_category or "general", prompt_version,
+                 json.dumps(fingerprints), json.dumps(result), time.time())
+            )
+            if lineage.key is not None:
+                # Only the newest revisions of a lineage are ever diffed against
+                self._conn.execute(
+                    """
+                    DELETE FROM revisions WHERE lineage_key = ? AND file_id NOT IN (
+                        SELECT file_id FROM revisions WHERE lineage_key = ? ORDER BY created_at DESC LIMIT ?
+                    )
+                    """,
+                    (lineage.key, lineage.key, self.max_per_lineage)
+                )
+            self._conn.commit()
+
+    def find_prior(self, lineage: Lineage, document_type: str, product_category: Optional[str],
+                   prompt_version: str) -> Optional[Dict[str, Any]]:
+        """Previous revision of the lineage's shop to diff against, analyzed with the same prompt and settings"""
+        if not lineage.shop:
+            return None
+        if lineage.parent_file_id:
+            where, args = "file_id = ?", (lineage.parent_file_id,)
+        elif lineage.key:
+            where, args = "lineage_key = ?", (lineage.key,)
+        else:
+            return None
+        with self._lock:
+            row = self._conn.execute(
+                f"""
+                SELECT file_id, fingerprints, result FROM revisions
+                WHERE {where} AND shop = ? AND document_type = ? AND product_category = ? AND prompt_version = ?
+                ORDER BY created_at DESC LIMIT 1
+                """,
+                args + (lineage.shop, document_type, product_category or "general", prompt_version)
+            ).fetchone()
+        if row is None:
+            return None
+        return {"file_id": row[0], "fingerprints": json.loads(row[1]), "result": json.loads(row[2])}
@@ -0,0 +1,92 @@
+import base64
+import hashlib
+import hmac
+import json
+import re
+import time
+from typing import Mapping, Optional
+from urllib.parse import urlparse
+
+SHOPIFY_SHOP = re.compile(r'^[a-zA-Z0-9\-]+\.myshopify\.com$')
+# Signed query strings are accepted for this long after their timestamp
+SIGNED_QUERY_MAX_AGE = 300
+# Clock skew tolerated on session token exp/nbf
+SESSION_TOKEN_LEEWAY = 10
+
+
+class ShopAuthError(Exception):
+    """The request does not prove which shop it is made for"""
+
+
+def is_valid_shopify_shop(shop):
+    return bool(shop) and bool(SHOPIFY_SHOP.match(shop))
+
+
+def _b64decode(segment: str) -> bytes:
+    return base64.urlsafe_b64decode(segment + "=" * (-len(segment) % 4))
+
+
+def verify_session_token(token: str, secret: str, api_key: Optional[str] = None) -> str:
+    """Shop of a Shopify App Bridge session token (an HS256 JWT signed with the app secret)"""
+    try:
+        header_segment, payload_segment, signature_segment = token.split(".")
+        header = json.loads(_b64decode(header_segment))
+        payload = json.loads(_b64decode(payload_segment))
+        signature = _b64decode(signature_segment)
+    except (ValueError, TypeError):
+        raise ShopAuthError("Malformed session token")
+    if header.get("alg") != "HS256":
+        raise ShopAuthError("Unsupported session token algorithm")
+    expected = hmac.new(secret.encode("utf-8"), f"{header_segment}.{payload_segment}".encode("ascii"),
+                        hashlib.sha256).digest()
+    if not hmac.compare_digest(signature, expected):
+        raise ShopAuthError("Invalid session token signature")
+
+    now = time.time()
+    if not isinstance(payload.get("exp"), (int, float)) or payload["exp"] < now - SESSION_TOKEN_LEEWAY:
+        raise ShopAuthError("Session token expired")
+    if payload.get("nbf", 0) > now + SESSION_TOKEN_LEEWAY:
+        raise ShopAuthError("Session token not yet valid")
+    if api_key and payload.get("aud") != api_key:
+        raise ShopAuthError("Session token was issued for another app")
+    shop = urlparse(payload.get("dest", "")).hostname
+    if not is_valid_shopify_shop(shop):
+        raise ShopAuthError("Session token names no shop")
+    return shop
+
+
+def verify_signed_query(args: Mapping[str, str], secret: str) -> str:
+    """
+    Shop of a query string signed the way Shopify signs app URLs: an `hmac` parameter
+    holding the hex HMAC-SHA256 of the other parameters, sorted and joined as k=v&k=v
+    """
+    signature = args.get("hmac")
+    if not signature:
+        raise ShopAuthError("Request is not signed")
+    message = "&".join(f"{key}={value}" for key, value in sorted(args.items()) if key != "hmac")
+    expected = hmac.new(secret.encode("utf-8"), message.encode("utf-8"), hashlib.sha256).hexdigest()
+    if not hmac.compare_digest(signature, expected):
+        raise ShopAuthError("Invalid request signature")
+    timestamp = args.get("timestamp", "")
+    if not timestamp.isdigit() or abs(time.time() - int(timestamp)) > SIGNED_QUERY_MAX_AGE:
+        raise ShopAuthError("Request signature expired")
+    shop = args.get("shop")
+    if not is_valid_shopify_shop(shop):
+        raise ShopAuthError("Invalid shop")
+    return shop
+
+
+def authenticated_shop(args: Mapping[str, str], authorization: Optional[str], secret: Optional[str],
+                       api_key: Optional[str] = None) -> str:
+    """
+    Shop proven by a `Bearer` session token or by a signed query string. Unsigned
+    requests, and every request when no app secret is configured, are refused.
+    """
+    if not secret:
+        raise ShopAuthError("Shop verification is not configured")
+    if authorization and authorization.startswith("Bearer "):
+        shop = verify_session_token(authorization[len("Bearer "):].strip(), secret, api_key)
+        if args.get("shop") and args.get("shop") != shop:
+            raise ShopAuthError("Shop does not match the session token")
+        return shop
+    return verify_signed_query(args, secret)
@@ -0,0 +1,188 @@
+import json
+import os
+import re
+from typing import Dict, List, Any, Optional, Tuple
+
+# "none" keeps the schema in the prompt only; "json_object"/"json_schema" also
+# constrain decoding on models that support it
+GPT_RESPONSE_FORMAT = os.getenv("GPT_RESPONSE_FORMAT", "none")
+
+RISK_LEVELS = ["LOW", "MODERATE", "HIGH", "CRITICAL"]
+GAP_SEVERITIES = ["LOW", "MEDIUM", "HIGH", "CRITICAL"]
+
+CE_ANALYSIS_SCHEMA = {
+    "type": "object",
+    "additionalProperties": False,
+    "required": [
+        "risk_level", "confidence_score", "applicable_directives", "compliance_gaps",
+        "strengths", "next_steps", "estimated_cost", "estimated_timeline", "summary"
+    ],
+    "properties": {
+        "risk_level": {"type": "string", "enum": RISK_LEVELS},
+        "confidence_score": {"type": "number"},
+        "applicable_directives": {"type": "array", "items": {"type": "string"}},
+        "compliance_gaps": {
+            "type": "array",
+            "items": {
+                "type": "object",
+                "additionalProperties": False,
+                "required": ["severity", "issue", "requirement", "solution"],
+                "properties": {
+                    "severity": {"type": "string", "enum": GAP_SEVERITIES},
+                    "issue": {"type": "string"},
+                    "requirement": {"type": "string"},
+                    "solution": {"type": "string"},
+                },
+            },
+        },
+        "strengths": {"type": "array", "items": {"type": "string"}},
+        "next_steps": {"type": "array", "items": {"type": "string"}},
+        "estimated_cost": {"type": "string"},
+        "estimated_timeline": {"type": "string"},
+        "summary": {"type": "string"},
+    },
+}
+
+JSON_OUTPUT_INSTRUCTIONS = """
+OUTPUT FORMAT:
+Respond with a single JSON object and nothing else, matching this JSON schema.
+Put the most important fields first: risk_level, then compliance_gaps.
+""" + json.dumps(CE_ANALYSIS_SCHEMA, separators=(",", ":")) + "\n"
+
+
+def response_format_kwargs() -> Dict[str, Any]:
+    """Extra chat.completions arguments that constrain the model to the schema"""
+    if GPT_RESPONSE_FORMAT == "json_schema":
+        return {"response_format": {
+            "type": "json_schema",
+            "json_schema": {"name": "ce_analysis", "strict": True, "schema": CE_ANALYSIS_SCHEMA},
+        }}
+    if GPT_RESPONSE_FORMAT == "json_object":
+        return {"response_format": {"type": "json_object"}}
+    return {}
+
+
+def repair_truncated_json(text: str) -> Tuple[Optional[str], bool]:
+    """
+    Cut a truncated JSON document back to its last complete element and close every
+    open container, in one pass over the text. Returns (json, closed): closed is True
+    only when containers had to be closed, not when a complete object was merely
+    found inside surrounding prose. json is None if nothing is salvageable.
+    """
+    start = text.find("{")
+    if start < 0:
+        return None, False
+
+    stack: List[str] = []
+    in_string = escaped = False
+    # Whether the next string is a value (after ':' or inside an array) rather than a key
+    value_next = string_is_value = False
+    safe_end, safe_stack = None, None
+    for i in range(start, len(text)):
+        ch = text[i]
+        if in_string:
+            if escaped:
+                escaped = False
+            elif ch == "\\":
+                escaped = True
+            elif ch == '"':
+                in_string = False
+                if string_is_value:
+                    safe_end, safe_stack = i + 1, list(stack)
+            continue
+        if ch == '"':
+            in_string = True
+            string_is_value = value_next
+            value_next = False
+        elif ch == ":":
+            value_next = True
+        elif ch in "{[":
+            stack.append("}" if ch == "{" else "]")
+            value_next = ch == "["
+            safe_end, safe_stack = i + 1, list(stack)
+        elif ch in "}]":
+            if not stack:
+                break
+            stack.pop()
+            if not stack:
+                return text[start:i + 1], False
+            safe_end, safe_stack = i + 1, list(stack)
+        elif ch == ",":
+            value_next = stack[-1] == "]" if stack else False
+            safe_end, safe_stack = i, list(stack)
+
+    if safe_end is None:
+        return None, False
+    return text[start:safe_end] + "".join(reversed(safe_stack)), True
+
+
+def parse_json_response(text: str) -> Tuple[Optional[Any], bool]:
+    """
+    Parse model output as JSON. Returns (value, truncated); value is None when the
+    output is not JSON at all.
+    """
+    body = text.strip()
+    if body.startswith("```"):
+        body = re.sub(r"^```(?:json)?\s*|\s*```$", "", body)
+    try:
+        return json.loads(body), False
+    except ValueError:
+        pass
+
+    repaired, closed = repair_truncated_json(body)
+    if repaired is None:
+        return None, False
+    try:
+        return json.loads(repaired), closed
+    except ValueError:
+        return None, False
+
+
+def _string_list(value: Any) -> List[str]:
+    if not isinstance(value, list):
+        return []
+    return [str(item).strip() for item in value if isinstance(item, (str, int, float)) and str(item).strip()]
+
+
+def validate_ce_analysis(data: Any) -> Optional[Dict[str, Any]]:
+    """
+    Check a parsed response against CE_ANALYSIS_SCHEMA, coercing what can be coerced
+    and dropping what cannot. Returns None if the value is unusable.
+    """
+    if not isinstance(data, dict):
+        return None
+
+    risk_level = str(data.get("risk_level", "")).strip().upper()
+    if risk_level == "MEDIUM":
+        risk_level = "MODERATE"
+
+    try:
+        confidence = float(data.get("confidence_score"))
+        confidence = min(max(confidence, 0.0), 1.0)
+    except (TypeError, ValueError):
+        confidence = None
+
+    gaps = []
+    raw_gaps = data.get("compliance_gaps")
+    for gap in raw_gaps if isinstance(raw_gaps, list) else []:
+        if not isinstance(gap, dict) or not str(gap.get("issue", "")).strip():
+            continue
+        severity = str(gap.get("severity", "")).strip().upper()
+        gaps.append({
+            "severity": severity if severity in GAP_SEVERITIES else "MEDIUM",
+            "issue": str(gap.get("issue", "")).strip(),
+            "requirement": str(gap.get("requirement", "")).strip(),
+            "solution": str(gap.get("solution", "")).strip(),
+        })
+
+    return {
+        "risk_level": risk_level if risk_level in RISK_LEVELS else None,
+        "confidence_score": confidence,
+        "applicable_directives": _string_list(data.get("applicable_directives")),
+        "compliance_gaps": gaps,
+        "strengths": _string_list(data.get("strengths")),
+        "next_steps": _string_list(data.get("next_steps")),
+        "estimated_cost": str(data.get("estimated_cost") or "").strip() or None,
+        "estimated_timeline": str(data.get("estimated_timeline") or "").strip() or None,
+        "summary": str(data.get("summary") or "").strip() or None,
+    }
@@ -0,0 +1,245 @@
+import asyncio
+import hashlib
+import hmac
+import json
+import os
+import random
+import sqlite3
+import threading
+import time
+from functools import partial
+from typing import Any, Dict, List, Optional
+
+from .gpt_analyzer import Completion, OpenAITransport, estimate_tokens
+from .revisions import document_stem
+
+# Only uploads are recorded; job ids, file ids and report queries do not exist in a replay
+RECORDED_ENDPOINTS = ("upload.upload_file", "upload.upload_batch", "upload.upload_stream")
+# Form fields kept as they are; anything naming a supplier or document is pseudonymized or dropped
+PLAIN_FIELDS = ("document_type", "document_types", "product_category", "async")
+
+_recorder = None
+
+
+def prompt_key(messages: List[Dict[str, str]], model: str, max_tokens: int, options: Dict[str, Any]) -> str:
+    """Identity of one model call: same prompt and settings, same key"""
+    raw = json.dumps([model, max_tokens, messages, options], sort_keys=True, default=str)
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()[:32]
+
+
+def shape_key(messages: List[Dict[str, str]], model: str, max_tokens: int) -> str:
+    """Kind of model call (system prompt and settings), shared by calls on different documents"""
+    system = "".join(m["content"] for m in messages if m.get("role") == "system")
+    raw = json.dumps([model, max_tokens, system])
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()[:16]
+
+
+class RecordedRequest:
+    """Metadata of one request being recorded, filled in as the upload is read"""
+
+    def __init__(self, method: str, endpoint: str, shop: Optional[str], params: Dict[str, Any]):
+        self.started_at = time.time()
+        self.method = method
+        self.endpoint = endpoint
+        self.shop = shop
+        self.params = params
+        self.files: List[Dict[str, Any]] = []
+
+
+class TrafficRecorder:
+    """
+    Records a sample of upload traffic for offline replay (benchmarks/replay.py):
+    when each upload arrived, its endpoint and form settings, the hash and size of
+    every PDF, the response status and latency, and the latency and token counts
+    of every model call. Shops, suppliers and file names are replaced by keyed
+    pseudonyms that keep their grouping; PDF contents and prompt texts are never
+    stored. The model's answers can quote a document, so their text is only kept
+    when capture_llm_text is set.
+    """
+
+    def __init__(self, path: str, salt: Optional[str], sample_rate: float = 1.0, capture_llm: bool = True,
+                 capture_llm_text: bool = False):
+        # A per-process random key would break pseudonym grouping across restarts and workers
+        if not salt:
+            raise ValueError("Traffic recording needs a salt for pseudonyms (set RECORD_SALT)")
+        self.path = path
+        self.salt = salt.encode("utf-8")
+        self.sample_rate = sample_rate
+        self.capture_llm = capture_llm
+        self.capture_llm_text = capture_llm_text
+        self._lock = threading.Lock()
+
+        if path != ":memory:":
+            os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS requests (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                started_at REAL NOT NULL,
+                method TEXT NOT NULL,
+                endpoint TEXT NOT NULL,
+                shop TEXT,
+                params TEXT NOT NULL,
+                files TEXT NOT NULL,
+                status INTEGER NOT NULL,
+                duration_ms REAL NOT NULL
+            )
+        """)
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_requests_started ON requests (started_at)")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS documents (sha256 TEXT PRIMARY KEY, size INTEGER NOT NULL, pages INTEGER)"
+        )
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS llm_calls (
+                prompt_key TEXT PRIMARY KEY,
+                shape_key TEXT NOT NULL,
+                model TEXT NOT NULL,
+                text TEXT,
+                prompt_tokens INTEGER NOT NULL,
+                completion_tokens INTEGER NOT NULL,
+                finish_reason TEXT,
+                latency_ms REAL NOT NULL,
+                created_at REAL NOT NULL
+            )
+        """)
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_llm_calls_shape ON llm_calls (shape_key)")
+        self._conn.commit()
+
+    @classmethod
+    def from_config(cls, config) -> "TrafficRecorder":
+        return cls(
+            path=config["RECORD_PATH"],
+            salt=config["RECORD_SALT"],
+            sample_rate=config["RECORD_SAMPLE_RATE"],
+            capture_llm=config["RECORD_LLM"],
+            capture_llm_text=config["RECORD_LLM_TEXT"],
+        )
+
+    def pseudonym(self, value: Optional[str]) -> Optional[str]:
+        if not value:
+            return None
+        return hmac.new(self.salt, value.strip().lower().encode("utf-8"), hashlib.sha256).hexdigest()[:16]
+
+    def begin(self, method: str, endpoint: str, shop: Optional[str], form) -> Optional[RecordedRequest]:
+        """Start recording a request, or None if it is not an upload or not sampled"""
+        if endpoint not in RECORDED_ENDPOINTS or random.random() >= self.sample_rate:
+            return None
+        params = {name: form.getlist(name) for name in PLAIN_FIELDS if name in form}
+        if form.get("supplier"):
+            params["supplier"] = [self.pseudonym(form.get("supplier"))]
+        return RecordedRequest(method, endpoint, self.pseudonym(shop), params)
+
+    def add_upload(self, entry: RecordedRequest, filename: Optional[str], sha256: str, size: int) -> None:
+        # The pseudonym covers the stem without revision markers, so revisions still share a lineage
+        entry.files.append({"name": self.pseudonym(document_stem(filename)), "sha256": sha256, "size": size})
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR IGNORE INTO documents (sha256, size) VALUES (?, ?)", (sha256, size)
+            )
+            self._conn.commit()
+
+    def finish(self, entry: RecordedRequest, status: int, duration: float) -> None:
+        with self._lock:
+            self._conn.execute(
+                "INSERT INTO requests (started_at, method, endpoint, shop, params, files, status, duration_ms) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                (entry.started_at, entry.method, entry.endpoint, entry.shop, json.dumps(entry.params),
+                 json.dumps(entry.files), status, round(duration * 1000, 1))
+            )
+            self._conn.commit()
+
+    def note_pages(self, sha256: str, pages: int) -> None:
+        with self._lock:
+            self._conn.execute("UPDATE documents SET pages = ? WHERE sha256 = ?", (pages, sha256))
+            self._conn.commit()
+
+    def record_llm(self, messages: List[Dict[str, str]], model: str, max_tokens: int, options: Dict[str, Any],
+                   completion: Completion, latency: float) -> None:
+        if not self.capture_llm:
+            return
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR IGNORE INTO llm_calls VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (prompt_key(messages, model, max_tokens, options), shape_key(messages, model, max_tokens), model,
+                 completion.text if self.capture_llm_text else None, completion.prompt_tokens, completion.completion_tokens, completion.finish_reason,
+                 round(latency * 1000, 1), time.time())
+            )
+            self._conn.commit()
+
+
+class RecordingTransport:
+    """LLM transport that passes calls through to the real one and records each answer"""
+
+    def __init__(self, recorder: TrafficRecorder, factory=OpenAITransport):
+        self.recorder = recorder
+        self._factory = factory
+        self._inner = None
+
+    def _transport(self):
+        # Created on first use, on the client's loop like any other transport
+        if self._inner is None:
+            self._inner = self._factory()
+        return self._inner
+
+    def _save(self, messages, model, max_tokens, options, completion: Completion, latency: float) -> None:
+        # SQLite writes stay off the client's event loop
+        asyncio.get_running_loop().run_in_executor(
+            None, partial(self.recorder.record_llm, messages, model, max_tokens, options, completion, latency)
+        )
+
+    async def complete(self, messages: List[Dict[str, str]], model: str, temperature: float,
+                       max_tokens: int, timeout: float, **kwargs) -> Completion:
+        started = time.monotonic()
+        completion = await self._transport().complete(messages, model, temperature, max_tokens, timeout, **kwargs)
+        self._save(messages, model, max_tokens, kwargs, completion, time.monotonic() - started)
+        return completion
+
+    async def stream(self, messages: List[Dict[str, str]], model: str, temperature: float,
+                     max_tokens: int, timeout: float, **kwargs):
+        started = time.monotonic()
+        deltas = []
+        async for delta in self._transport().stream(messages, model, temperature, max_tokens, timeout, **kwargs):
+            deltas.append(delta)
+            yield delta
+        text = "".join(deltas)
+        prompt_tokens = sum(estimate_tokens(m["content"]) for m in messages)
+        completion = Completion(text, prompt_tokens, estimate_tokens(text), "stop")
+        self._save(messages, model, max_tokens, kwargs, completion, time.monotonic() - started)
+
+
+class TrafficRecording:
+    """Read side of a recording, as used by the replay driver"""
+
+    def __init__(self, path: str):
+        if not os.path.exists(path):
+            raise FileNotFoundError(path)
+        self.path = path
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.row_factory = sqlite3.Row
+
+    def requests(self, limit: Optional[int] = None) -> List[Dict[str, Any]]:
+        rows = self._conn.execute(
+            "SELECT * FROM requests ORDER BY started_at LIMIT ?", (limit if limit else -1,)
+        ).fetchall()
+        return [{**dict(row), "params": json.loads(row["params"]), "files": json.loads(row["files"])}
+                for row in rows]
+
+    def documents(self) -> Dict[str, Dict[str, Any]]:
+        rows = self._conn.execute("SELECT sha256, size, pages FROM documents").fetchall()
+        return {row["sha256"]: {"size": row["size"], "pages": row["pages"]} for row in rows}
+
+    def llm_calls(self) -> List[Dict[str, Any]]:
+        return [dict(row) for row in self._conn.execute("SELECT * FROM llm_calls ORDER BY prompt_key")]
+
+
+def install_recorder(recorder: Optional[TrafficRecorder]) -> None:
+    """Make recorder the process-wide one that pipeline code reports to"""
+    global _recorder
+    _recorder = recorder
+
+
+def note_pages(pdf_hash: Optional[str], pages: int) -> None:
+    """Page count of an extracted PDF, so replays can stand in a document of the same length"""
+    if _recorder is not None and pdf_hash:
+        _recorder.note_pages(pdf_hash, pages)
@@ -0,0 +1,162 @@
+import hashlib
+import io
+import os
+import tempfile
+import threading
+import time
+from typing import BinaryIO, Callable, Iterable, Optional, Set, Union
+
+READ_CHUNK = 1024 * 1024
+
+
+class UploadBuffer:
+    """
+    An uploaded PDF held in memory, or spooled to a temp file once it passes the
+    size threshold. In memory the upload is one bytes object, the only stream type
+    fitz opens without copying. A multipart part Werkzeug already holds in a
+    BytesIO (see app.UploadRequest) is taken over as it is: BytesIO.getvalue()
+    returns its buffer without a copy. Other streams are hashed while they are
+    read into a BytesIO of our own. Use as a context manager; any spool file is
+    removed on exit.
+    """
+
+    def __init__(self, data: Optional[bytes], path: Optional[str], size: int, sha256: str):
+        self._data = data
+        self.path = path
+        self.size = size
+        self.sha256 = sha256
+
+    @classmethod
+    def from_stream(cls, stream: BinaryIO, spool_threshold: int, spool_dir: str) -> "UploadBuffer":
+        if isinstance(stream, io.BytesIO) and stream.tell() == 0:
+            data = stream.getvalue()
+            if len(data) <= spool_threshold:
+                return cls.from_bytes(data)
+        digest = hashlib.sha256()
+        buffer = io.BytesIO()
+        spool = None
+        path = None
+        size = 0
+        try:
+            while True:
+                chunk = stream.read(READ_CHUNK)
+                if not chunk:
+                    break
+                digest.update(chunk)
+                size += len(chunk)
+                if spool is None and size > spool_threshold:
+                    os.makedirs(spool_dir, exist_ok=True)
+                    fd, path = tempfile.mkstemp(suffix=".pdf", dir=spool_dir)
+                    spool = os.fdopen(fd, "wb")
+                    spool.write(buffer.getbuffer())
+                    buffer = None
+                if spool is not None:
+                    spool.write(chunk)
+                else:
+                    buffer.write(chunk)
+        except BaseException:
+            if spool is not None:
+                spool.close()
+                os.remove(path)
+            raise
+        if spool is not None:
+            spool.close()
+            return cls(None, path, size, digest.hexdigest())
+        return cls(buffer.getvalue(), None, size, digest.hexdigest())
+
+    @classmethod
+    def from_bytes(cls, data: bytes) -> "UploadBuffer":
+        return cls(data, None, len(data), hashlib.sha256(data).hexdigest())
+
+    @property
+    def spooled(self) -> bool:
+        return self.path is not None
+
+    @property
+    def source(self) -> Union[bytes, str]:
+        """What PDFParser should open: the bytes themselves or the spool file path"""
+        return self.path if self.spooled else self._data
+
+    def persist(self, directory: str, name: str) -> str:
+        """
+        Hand the upload to another process: move the spool file, or write the bytes
+        once. The file is still removed on close() unless detach() is called.
+        """
+        os.makedirs(directory, exist_ok=True)
+        target = os.path.join(directory, name)
+        if self.spooled:
+            os.replace(self.path, target)
+        else:
+            with open(target, "wb") as f:
+                f.write(self._data)
+        self.path = target
+        self._data = None
+        return target
+
+    def close(self) -> None:
+        if self.path is not None:
+            try:
+                os.remove(self.path)
+            except FileNotFoundError:
+                pass
+            self.path = None
+        self._data = None
+
+    def detach(self) -> None:
+        """Keep the file on disk after close(); used once it belongs to a queued job"""
+        self.path = None
+
+    def __enter__(self) -> "UploadBuffer":
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+
+class SpoolJanitor:
+    """
+    Background thread that deletes abandoned upload files older than max_age. Files
+    whose absolute path is in keep(), such as those of queued jobs, are left alone
+    however old they are.
+    """
+
+    def __init__(self, directories: Iterable[str], max_age: float = 3600, interval: float = 300,
+                 keep: Optional[Callable[[], Set[str]]] = None):
+        self.directories = list(directories)
+        self.max_age = max_age
+        self.interval = interval
+        self.keep = keep
+        self._stopping = threading.Event()
+        self._thread = None
+
+    def sweep(self) -> int:
+        removed = 0
+        cutoff = time.time() - self.max_age
+        keep = self.keep() if self.keep is not None else set()
+        for directory in self.directories:
+            if not os.path.isdir(directory):
+                continue
+            for entry in os.scandir(directory):
+                if os.path.abspath(entry.path) in keep:
+                    continue
+                try:
+                    if entry.is_file() and entry.stat().st_mtime < cutoff:
+                        os.remove(entry.path)
+                        removed += 1
+                except FileNotFoundError:
+                    pass
+        return removed
+
+    def start(self) -> None:
+        if self._thread is not None:
+            return
+        self._thread = threading.Thread(target=self._run, name="spool-janitor", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stopping.set()
+
+    def _run(self) -> None:
+        while not self._stopping.is_set():
+            self.sweep()
+            self._stopping.wait(self.interval)
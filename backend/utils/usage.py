@@ -0,0 +1,68 @@
+import os
+import sqlite3
+import threading
+import time
+from typing import Any, Dict, List, Optional
+
+# Per shop and UTC day; every column is a running total
+USAGE_COUNTERS = ("documents", "cached", "failed", "pages", "llm_tokens", "upload_bytes", "rejected")
+
+
+def usage_day(timestamp: Optional[float] = None) -> str:
+    return time.strftime("%Y-%m-%d", time.gmtime(timestamp if timestamp is not None else time.time()))
+
+
+class UsageMeter:
+    """Daily per-shop usage counters in SQLite, the source for billing"""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+
+        if path != ":memory:":
+            os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.row_factory = sqlite3.Row
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        columns = ", ".join(f"{name} INTEGER NOT NULL DEFAULT 0" for name in USAGE_COUNTERS)
+        self._conn.execute(
+            f"CREATE TABLE IF NOT EXISTS usage (shop TEXT NOT NULL, day TEXT NOT NULL, {columns}, "
+            "PRIMARY KEY (shop, day))"
+        )
+        self._conn.commit()
+
+    @classmethod
+    def from_config(cls, config) -> "UsageMeter":
+        return cls(path=config["USAGE_PATH"])
+
+    def record(self, shop: Optional[str], **counts: int) -> None:
+        """Add to today's counters of a shop; unknown counter names are ignored"""
+        counts = {name: int(amount) for name, amount in counts.items() if name in USAGE_COUNTERS and amount}
+        if not counts:
+            return
+        names = list(counts)
+        with self._lock:
+            self._conn.execute(
+                f"INSERT INTO usage (shop, day, {', '.join(names)}) VALUES (?, ?, {', '.join('?' for _ in names)}) "
+                f"ON CONFLICT (shop, day) DO UPDATE SET {', '.join(f'{n} = {n} + excluded.{n}' for n in names)}",
+                [shop or "", usage_day()] + [counts[name] for name in names]
+            )
+            self._conn.commit()
+
+    def report(self, shop: Optional[str], since: Optional[str] = None, until: Optional[str] = None) -> Dict[str, Any]:
+        """Daily rows between two YYYY-MM-DD days (inclusive) and their totals"""
+        where, args = ["shop = ?"], [shop or ""]
+        if since:
+            where.append("day >= ?")
+            args.append(since)
+        if until:
+            where.append("day <= ?")
+            args.append(until)
+        with self._lock:
+            rows = self._conn.execute(
+                f"SELECT day, {', '.join(USAGE_COUNTERS)} FROM usage WHERE {' AND '.join(where)} ORDER BY day",
+                args
+            ).fetchall()
+        days: List[Dict[str, Any]] = [dict(row) for row in rows]
+        totals = {name: sum(day[name] for day in days) for name in USAGE_COUNTERS}
+        return {"days": days, "totals": totals}
@@ -0,0 +1,34 @@
+import importlib
+import os
+import time
+from typing import Dict
+
+# Imported lazily by the request path; loading them up front moves the cost out of the first request
+HEAVY_MODULES = ("fitz", "httpx", "numpy", "openai")
+
+
+def preload_modules() -> Dict[str, float]:
+    """
+    Import the heavy third-party modules and report how long each took, in ms.
+    Safe to run in a pre-fork master: it only imports, it starts no threads.
+    """
+    timings = {}
+    for name in HEAVY_MODULES:
+        started = time.perf_counter()
+        try:
+            importlib.import_module(name)
+        except ImportError:
+            continue
+        timings[name] = round((time.perf_counter() - started) * 1000, 1)
+    return timings
+
+
+def warm_up_worker() -> Dict[str, float]:
+    """Per-process warm-up after fork: open the LLM client's loop and connection pool"""
+    timings = preload_modules()
+    if os.getenv("GPT_API_KEY"):
+        from .gpt_analyzer import get_llm_client
+        started = time.perf_counter()
+        get_llm_client().warm_up()
+        timings["llm_client"] = round((time.perf_counter() - started) * 1000, 1)
+    return timings
@@ -0,0 +1,49 @@
+"""Standalone worker process for queued upload analyses.
+
+Run alongside the web app with JOB_INPROCESS_WORKERS=false:
+
+    python worker.py
+"""
+from types import SimpleNamespace
+
+from config import load_config
+from utils.analysis_cache import AnalysisCache
+from utils.gpt_analyzer import LLMClient, set_llm_client
+from utils.job_queue import JobQueue, WorkerPool
+from utils.metrics import REGISTRY
+from utils.near_duplicates import NearDuplicateIndex
+from utils.pipeline import make_job_handlers
+from utils.results_store import results_store_from_config
+from utils.revisions import RevisionStore
+from utils.traffic import RecordingTransport, TrafficRecorder, install_recorder
+from utils.usage import UsageMeter
+
+
+def main():
+    settings = SimpleNamespace(config={})
+    load_config(settings)
+    if settings.config["METRICS_MULTIPROC_DIR"]:
+        # Job metrics reach /metrics through the web workers' scrape
+        REGISTRY.enable_multiprocess(settings.config["METRICS_MULTIPROC_DIR"])
+
+    queue = JobQueue.from_config(settings.config)
+    cache = AnalysisCache.from_config(settings.config)
+    revisions = RevisionStore.from_config(settings.config) if settings.config["REVISIONS_ENABLED"] else None
+    near_duplicates = NearDuplicateIndex.from_config(settings.config) if settings.config["NEAR_DUP_ENABLED"] else None
+    results = results_store_from_config(settings.config)
+    usage = UsageMeter.from_config(settings.config)
+    if settings.config["RECORD_TRAFFIC"]:
+        # Queued uploads are analyzed here, so their page counts and model calls are recorded here
+        recorder = TrafficRecorder.from_config(settings.config)
+        install_recorder(recorder)
+        set_llm_client(LLMClient(transport=RecordingTransport(recorder)))
+    pool = WorkerPool(queue, make_job_handlers(cache, revisions, near_duplicates, results, usage),
+                      workers=settings.config["JOB_WORKERS"],
+                      heartbeat_interval=settings.config["JOB_HEARTBEAT_INTERVAL"],
+                      heartbeat_timeout=settings.config["JOB_HEARTBEAT_TIMEOUT"])
+    print(f"Worker started with {pool.workers} threads on {queue.path}")
+    pool.run_forever()
+
+
+if __name__ == "__main__":
+    main()
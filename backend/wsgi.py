@@ -0,0 +1,29 @@
+"""Production entry point, served by a pre-forked gunicorn:
+
+    cd backend
+    gunicorn -c gunicorn.conf.py wsgi:app
+
+The master preloads the heavy imports once (see gunicorn.conf.py); each forked
+worker then builds its own app, since the app starts threads and opens SQLite
+connections that must not be shared across a fork.
+"""
+import os
+import time
+
+started = time.perf_counter()
+
+from app import create_app
+from utils.warmup import warm_up_worker
+
+app = create_app()
+app_ready = time.perf_counter()
+
+warm_up = warm_up_worker() if os.getenv("WARMUP_ON_START", "true").lower() in ("1", "true", "yes", "on") else {}
+ready = time.perf_counter()
+
+app.config["STARTUP_TIMINGS"] = {
+    "app_ms": round((app_ready - started) * 1000, 1),
+    "warm_up_ms": warm_up,
+    "total_ms": round((ready - started) * 1000, 1)
+}
+print(f"Worker {os.getpid()} ready in {app.config['STARTUP_TIMINGS']['total_ms']} ms: {app.config['STARTUP_TIMINGS']}", flush=True)